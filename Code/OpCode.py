@@ -56,4 +56,127 @@ class OpCode:
     op_txs = ['9a']
     op_tya = ['98']
 
+    # Addressing mode of each opcode above, in the same order.
+    am_adc = ['Immediate', 'ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX', 'AbsoluteY', 'IndirectX', 'IndirectY']
+    am_and = ['Immediate', 'ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX', 'AbsoluteY', 'IndirectX', 'IndirectY']
+    am_asl = ['Accumulator', 'ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX']
+    am_bcc = ['Relative']
+    am_bcs = ['Relative']
+    am_beq = ['Relative']
+    am_bit = ['ZeroPage', 'Absolute']
+    am_bmi = ['Relative']
+    am_bne = ['Relative']
+    am_bpl = ['Relative']
+    am_brk = ['Implicit']
+    am_bvc = ['Relative']
+    am_bvs = ['Relative']
+    am_clc = ['Implicit']
+    am_cld = ['Implicit']
+    am_cli = ['Implicit']
+    am_clv = ['Implicit']
+    am_cmp = ['Immediate', 'ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX', 'AbsoluteY', 'IndirectX', 'IndirectY']
+    am_cpx = ['Immediate', 'ZeroPage', 'Absolute']
+    am_cpy = ['Immediate', 'ZeroPage', 'Absolute']
+    am_dec = ['ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX']
+    am_dex = ['Implicit']
+    am_dey = ['Implicit']
+    am_eor = ['Immediate', 'ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX', 'AbsoluteY', 'IndirectX', 'IndirectY']
+    am_inc = ['ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX']
+    am_inx = ['Implicit']
+    am_iny = ['Implicit']
+    am_jmp = ['Absolute', 'Indirect']
+    am_jsr = ['Absolute']
+    am_lda = ['Immediate', 'ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX', 'AbsoluteY', 'IndirectX', 'IndirectY']
+    am_ldx = ['Immediate', 'ZeroPage', 'ZeroPageY', 'Absolute', 'AbsoluteY']
+    am_ldy = ['Immediate', 'ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX']
+    am_lsr = ['Accumulator', 'ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX']
+    am_nop = ['Implicit']
+    am_ora = ['Immediate', 'ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX', 'AbsoluteY', 'IndirectX', 'IndirectY']
+    am_pha = ['Implicit']
+    am_php = ['Implicit']
+    am_pla = ['Implicit']
+    am_plp = ['Implicit']
+    am_rol = ['Accumulator', 'ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX']
+    am_ror = ['Accumulator', 'ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX']
+    am_rti = ['Implicit']
+    am_rts = ['Implicit']
+    am_sbc = ['Immediate', 'ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX', 'AbsoluteY', 'IndirectX', 'IndirectY']
+    am_sec = ['Implicit']
+    am_sed = ['Implicit']
+    am_sei = ['Implicit']
+    am_sta = ['ZeroPage', 'ZeroPageX', 'Absolute', 'AbsoluteX', 'AbsoluteY', 'IndirectX', 'IndirectY']
+    am_stx = ['ZeroPage', 'ZeroPageY', 'Absolute']
+    am_sty = ['ZeroPage', 'ZeroPageX', 'Absolute']
+    am_tax = ['Implicit']
+    am_tay = ['Implicit']
+    am_tsx = ['Implicit']
+    am_txa = ['Implicit']
+    am_txs = ['Implicit']
+    am_tya = ['Implicit']
+
+    # Base clock cycles of each opcode above, in the same order.
+    # Reads through Absolute,X / Absolute,Y / (Indirect),Y take one more cycle when they cross a page,
+    # and a taken branch takes one more, or two if it lands on another page.
+    cy_adc = [2, 3, 4, 4, 4, 4, 6, 5]
+    cy_and = [2, 3, 4, 4, 4, 4, 6, 5]
+    cy_asl = [2, 5, 6, 6, 7]
+    cy_bcc = [2]
+    cy_bcs = [2]
+    cy_beq = [2]
+    cy_bit = [3, 4]
+    cy_bmi = [2]
+    cy_bne = [2]
+    cy_bpl = [2]
+    cy_brk = [7]
+    cy_bvc = [2]
+    cy_bvs = [2]
+    cy_clc = [2]
+    cy_cld = [2]
+    cy_cli = [2]
+    cy_clv = [2]
+    cy_cmp = [2, 3, 4, 4, 4, 4, 6, 5]
+    cy_cpx = [2, 3, 4]
+    cy_cpy = [2, 3, 4]
+    cy_dec = [5, 6, 6, 7]
+    cy_dex = [2]
+    cy_dey = [2]
+    cy_eor = [2, 3, 4, 4, 4, 4, 6, 5]
+    cy_inc = [5, 6, 6, 7]
+    cy_inx = [2]
+    cy_iny = [2]
+    cy_jmp = [3, 5]
+    cy_jsr = [6]
+    cy_lda = [2, 3, 4, 4, 4, 4, 6, 5]
+    cy_ldx = [2, 3, 4, 4, 4]
+    cy_ldy = [2, 3, 4, 4, 4]
+    cy_lsr = [2, 5, 6, 6, 7]
+    cy_nop = [2]
+    cy_ora = [2, 3, 4, 4, 4, 4, 6, 5]
+    cy_pha = [3]
+    cy_php = [3]
+    cy_pla = [4]
+    cy_plp = [4]
+    cy_rol = [2, 5, 6, 6, 7]
+    cy_ror = [2, 5, 6, 6, 7]
+    cy_rti = [6]
+    cy_rts = [6]
+    cy_sbc = [2, 3, 4, 4, 4, 4, 6, 5]
+    cy_sec = [2]
+    cy_sed = [2]
+    cy_sei = [2]
+    cy_sta = [3, 4, 4, 5, 5, 6, 6]
+    cy_stx = [3, 4, 4]
+    cy_sty = [3, 4, 4]
+    cy_tax = [2]
+    cy_tay = [2]
+    cy_tsx = [2]
+    cy_txa = [2]
+    cy_txs = [2]
+    cy_tya = [2]
+
+    # Number of operand bytes following the opcode for each addressing mode.
+    length = {'Implicit': 0, 'Accumulator': 0, 'Immediate': 1, 'ZeroPage': 1, 'ZeroPageX': 1,
+              'ZeroPageY': 1, 'Relative': 1, 'IndirectX': 1, 'IndirectY': 1, 'Absolute': 2,
+              'AbsoluteX': 2, 'AbsoluteY': 2, 'Indirect': 2}
+
     pass
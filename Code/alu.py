@@ -0,0 +1,71 @@
+"""
+
+This file, alu.py holds the status register layout and the tables flags are computed from.
+They are shared by the interpreter (cpu.py), the translated blocks (block.py) and the batch engine (batch.py).
+
+The status register P is one byte
+
+    7  6  5  4  3  2  1  0
+    N  V  1  B  D  I  Z  C
+
+Bit 5 always reads as 1, and B only exists in the copy pushed by PHP and BRK.
+Instructions update flags by masking the bits they change out of P and or-ing the new ones in,
+e.g. a load is P = P & 0x7d | NZ[value].
+
+Addition and subtraction are looked up whole, result and flags together:
+
+    Add[carry << 16 | a << 8 | operand]         flags << 8 | result of ADC, flags are NV....ZC
+    Subtract[carry << 16 | a << 8 | operand]    the same for SBC
+    Compare[register << 8 | operand]            N.....ZC of CMP, CPX and CPY
+
+The tables are built with NumPy, then kept as lists since indexing a list is the fastest lookup
+in Python. The NES CPU has no decimal mode, so D never changes the result.
+
+"""
+
+import numpy
+
+
+Negative = 0x80
+Overflow = 0x40
+Unused = 0x20
+Break = 0x10
+Decimal = 0x08
+Interrupt = 0x04
+Zero = 0x02
+Carry = 0x01
+
+# N and Z of every byte
+NZ = [(value & Negative) | (Zero if value == 0 else 0) for value in range(256)]
+
+
+def Arithmetic(subtract):
+    carry = numpy.arange(2).reshape(2, 1, 1)
+    a = numpy.arange(256).reshape(1, 256, 1)
+    operand = numpy.arange(256).reshape(1, 1, 256)
+
+    # Subtraction is addition of the complement
+    if subtract:
+        operand = operand ^ 0xff
+
+    total = a + operand + carry
+    result = total & 0xff
+
+    # Overflow when both inputs have the same sign and the result has the other
+    overflow = (~(a ^ operand) & (a ^ result) & 0x80) >> 1
+
+    flags = numpy.array(NZ)[result] | overflow | (total > 0xff)
+
+    return Share((flags << 8 | result).reshape(-1).tolist())
+
+
+# Equal entries share one int object, which keeps the tables at a few MB
+def Share(table):
+    values = {}
+
+    return [values.setdefault(value, value) for value in table]
+
+
+Add = Arithmetic(False)
+Subtract = Arithmetic(True)
+Compare = [entry >> 8 & (Negative | Zero | Carry) for entry in Subtract[0x10000:]]
@@ -0,0 +1,493 @@
+"""
+
+This file, batch.py runs many copies of the CPU 6502 in lock step with NumPy.
+
+Every register is an array with one element per instance, and memory is one (N, 65536) uint8 array.
+Each step, the instances are grouped by the opcode at their PC and every group executes
+its instruction in one vectorized pass, following the same semantics as Cpu.
+
+Memory is flat, so the bus layout of bus.py is folded into two tables:
+    Mirror      maps each address to the one actually holding the byte
+                (RAM mirrors to $0000-$07FF, PPU registers to $2000-$2007)
+    Writable    is False for ROM and open bus, where stores are dropped
+
+"""
+
+import numpy
+
+from OpCode import OpCode
+from alu import Unused, Break, Interrupt
+import alu
+from cartridge import Cartridge
+from cpu import Cpu
+
+
+Mirror = numpy.arange(0x10000)
+Mirror[0x0800:0x2000] &= 0x07ff
+Mirror[0x2000:0x4000] = 0x2000 + (Mirror[0x2000:0x4000] & 7)
+
+# Flag and arithmetic tables of alu.py
+NZ = numpy.array(alu.NZ)
+Add = numpy.array(alu.Add)
+Subtract = numpy.array(alu.Subtract)
+Compare = numpy.array(alu.Compare)
+
+Writable = numpy.ones(0x10000, dtype=bool)
+Writable[0x4020:0x6000] = False
+Writable[0x8000:] = False
+
+
+class Batch:
+    def __init__(self, count, rom = 'super-mario-bros.nes'):
+        cartridge = Cartridge(rom)
+
+        # Memory is flat, so banks cannot be switched
+        if cartridge.Descriptor.mapper != 0:
+            raise ValueError('only NROM cartridges can be run in a batch')
+
+        prg = numpy.frombuffer(cartridge.Prg, dtype=numpy.uint8)
+
+        self.Count = count
+
+        self.Memory = numpy.zeros((count, 0x10000), dtype=numpy.uint8)
+        self.Memory[:, 0x4020:0x6000] = 0xff
+        self.Memory[:, 0x8000:] = numpy.resize(prg, 0x8000)
+
+        # PPU status, always reporting vblank as there is no PPU here (see ppu.py)
+        self.Memory[:, 0x2002] = 0xf6
+        self.Memory[:, 2012] = 100
+
+        self.PC = (self.Memory[:, 0xfffc].astype(numpy.int64) | (self.Memory[:, 0xfffd].astype(numpy.int64) << 8))
+
+        self.A = numpy.zeros(count, dtype=numpy.int64)
+        self.X = numpy.zeros(count, dtype=numpy.int64)
+        self.Y = numpy.zeros(count, dtype=numpy.int64)
+
+        # Stack pointer into page $0100
+        self.S = numpy.full(count, 0xfd, dtype=numpy.int64)
+
+        # Process status NV1BDIZC (see alu.py)
+        self.P = numpy.full(count, Unused | Interrupt, dtype=numpy.int64)
+
+        self.Cycles = numpy.zeros(count, dtype=numpy.int64)
+
+        # Same dispatch table as Cpu, with vectorized handlers and resolvers
+        self.__Table = [(self.Illegal, None, 0, 2)] * 256
+
+        for name, codes in vars(OpCode).items():
+            if not name.startswith('op_'):
+                continue
+
+            mnemonic = name[3:].upper()
+            handler = getattr(self, mnemonic)
+            modes = getattr(OpCode, 'am' + name[2:])
+            cycles = getattr(OpCode, 'cy' + name[2:])
+
+            for code, mode, cycle in zip(codes, modes, cycles):
+                if mode == 'Implicit' or mode == 'Accumulator':
+                    resolver = None
+                elif mnemonic in Cpu.Reads:
+                    resolver = getattr(self, 'Read' + mode)
+                else:
+                    resolver = getattr(self, mode)
+
+                self.__Table[int(code, 16)] = (handler, resolver, OpCode.length[mode], cycle)
+
+    def ReadData(self, idx, address):
+        return self.Memory[idx, Mirror[address]].astype(numpy.int64)
+
+    def WriteData(self, idx, address, value):
+        address = Mirror[address]
+        keep = Writable[address]
+
+        self.Memory[idx[keep], address[keep]] = value[keep]
+
+    def ReadWord(self, idx, address):
+        return self.ReadData(idx, address) | (self.ReadData(idx, (address + 1) & 0xffff) << 8)
+
+    def Push(self, idx, value):
+        self.Memory[idx, 0x100 | self.S[idx]] = value
+        self.S[idx] = (self.S[idx] - 1) & 0xff
+
+    def Pull(self, idx):
+        self.S[idx] = (self.S[idx] + 1) & 0xff
+
+        return self.Memory[idx, 0x100 | self.S[idx]].astype(numpy.int64)
+
+    # Execute one instruction on every instance.
+    def step(self):
+        everyone = numpy.arange(self.Count)
+        instructions = self.ReadData(everyone, self.PC)
+
+        for instruction in numpy.unique(instructions):
+            idx = numpy.nonzero(instructions == instruction)[0]
+            handler, mode, length, cycles = self.__Table[instruction]
+            pc = self.PC[idx]
+
+            if length == 1:
+                data = self.ReadData(idx, (pc + 1) & 0xffff)
+            elif length == 2:
+                data = self.ReadWord(idx, (pc + 1) & 0xffff)
+            else:
+                data = None
+
+            self.PC[idx] = (pc + 1 + length) & 0xffff
+            self.Cycles[idx] += cycles
+
+            handler(idx, mode, data)
+
+    def run(self, max_instructions):
+        for i in range(max_instructions):
+            self.step()
+
+    ## Addressing Mode ##
+
+    def ZeroPage(self, idx, data):
+        return data
+
+    def ZeroPageX(self, idx, data):
+        return (data + self.X[idx]) & 0xff
+
+    def ZeroPageY(self, idx, data):
+        return (data + self.Y[idx]) & 0xff
+
+    def Absolute(self, idx, data):
+        return data
+
+    def AbsoluteX(self, idx, data):
+        return (data + self.X[idx]) & 0xffff
+
+    def AbsoluteY(self, idx, data):
+        return (data + self.Y[idx]) & 0xffff
+
+    # JMP ($xxFF) takes the high byte from $xx00, as in cpu.py
+    def Indirect(self, idx, data):
+        return self.ReadData(idx, data) | (self.ReadData(idx, (data & 0xff00) | ((data + 1) & 0xff)) << 8)
+
+    def IndirectX(self, idx, data):
+        address = (data + self.X[idx]) & 0xff
+
+        return self.ReadData(idx, address) | (self.ReadData(idx, (address + 1) & 0xff) << 8)
+
+    def IndirectY(self, idx, data):
+        base = self.ReadData(idx, data) | (self.ReadData(idx, (data + 1) & 0xff) << 8)
+
+        return (base + self.Y[idx]) & 0xffff
+
+    def Relative(self, idx, data):
+        return (self.PC[idx] + data - ((data >= 128) << 8)) & 0xffff
+
+    def ReadImmediate(self, idx, data):
+        return data
+
+    def ReadZeroPage(self, idx, data):
+        return self.ReadData(idx, self.ZeroPage(idx, data))
+
+    def ReadZeroPageX(self, idx, data):
+        return self.ReadData(idx, self.ZeroPageX(idx, data))
+
+    def ReadZeroPageY(self, idx, data):
+        return self.ReadData(idx, self.ZeroPageY(idx, data))
+
+    def ReadAbsolute(self, idx, data):
+        return self.ReadData(idx, self.Absolute(idx, data))
+
+    def ReadAbsoluteX(self, idx, data):
+        address = (data + self.X[idx]) & 0xffff
+        self.Cycles[idx] += ((address ^ data) & 0xff00) != 0
+
+        return self.ReadData(idx, address)
+
+    def ReadAbsoluteY(self, idx, data):
+        address = (data + self.Y[idx]) & 0xffff
+        self.Cycles[idx] += ((address ^ data) & 0xff00) != 0
+
+        return self.ReadData(idx, address)
+
+    def ReadIndirectX(self, idx, data):
+        return self.ReadData(idx, self.IndirectX(idx, data))
+
+    def ReadIndirectY(self, idx, data):
+        base = self.ReadData(idx, data) | (self.ReadData(idx, (data + 1) & 0xff) << 8)
+        address = (base + self.Y[idx]) & 0xffff
+        self.Cycles[idx] += ((address ^ base) & 0xff00) != 0
+
+        return self.ReadData(idx, address)
+
+    ## Addressing Mode ##
+
+    def Branch(self, idx, taken, mode, data):
+        idx = idx[taken]
+        address = mode(idx, data[taken])
+
+        self.Cycles[idx] += numpy.where((address ^ self.PC[idx]) & 0xff00, 2, 1)
+        self.PC[idx] = address
+
+    def SetNZ(self, idx, value):
+        self.P[idx] = self.P[idx] & 0x7d | NZ[value]
+
+    # Instances whose status has any of flags set
+    def Flag(self, idx, flags):
+        return (self.P[idx] & flags) != 0
+
+    # Operand of a read-modify-write instruction; the accumulator when mode is None
+    def Modify(self, idx, mode, data):
+        if mode is None:
+            return None, self.A[idx]
+
+        address = mode(idx, data)
+
+        return address, self.ReadData(idx, address)
+
+    def Store(self, idx, address, value):
+        if address is None:
+            self.A[idx] = value
+        else:
+            self.WriteData(idx, address, value)
+
+        self.SetNZ(idx, value)
+
+    def Illegal(self, idx, mode, data):
+        pass
+
+    def Arithmetic(self, idx, table, value):
+        value = table[(self.P[idx] & 0x01) << 16 | self.A[idx] << 8 | value]
+
+        self.A[idx] = value & 0xff
+        self.P[idx] = self.P[idx] & 0x3c | value >> 8
+
+    def ADC(self, idx, mode, data):
+        self.Arithmetic(idx, Add, mode(idx, data))
+
+    def AND(self, idx, mode, data):
+        self.A[idx] &= mode(idx, data)
+
+        self.SetNZ(idx, self.A[idx])
+
+    def ASL(self, idx, mode, data):
+        address, value = self.Modify(idx, mode, data)
+
+        self.P[idx] = self.P[idx] & 0xfe | (value >> 7)
+
+        self.Store(idx, address, (value << 1) & 0xff)
+
+    def BCC(self, idx, mode, data):
+        self.Branch(idx, ~self.Flag(idx, 0x01), mode, data)
+
+    def BCS(self, idx, mode, data):
+        self.Branch(idx, self.Flag(idx, 0x01), mode, data)
+
+    def BEQ(self, idx, mode, data):
+        self.Branch(idx, self.Flag(idx, 0x02), mode, data)
+
+    def BIT(self, idx, mode, data):
+        value = mode(idx, data)
+
+        self.P[idx] = self.P[idx] & 0x3d | (value & 0xc0) | numpy.where(self.A[idx] & value, 0, 0x02)
+
+    def BMI(self, idx, mode, data):
+        self.Branch(idx, self.Flag(idx, 0x80), mode, data)
+
+    def BNE(self, idx, mode, data):
+        self.Branch(idx, ~self.Flag(idx, 0x02), mode, data)
+
+    def BPL(self, idx, mode, data):
+        self.Branch(idx, ~self.Flag(idx, 0x80), mode, data)
+
+    def BRK(self, idx, mode, data):
+        self.Push(idx, (self.PC[idx] + 1) >> 8 & 0xff)
+        self.Push(idx, (self.PC[idx] + 1) & 0xff)
+        self.Push(idx, self.P[idx] | Break | Unused)
+
+        self.P[idx] |= Interrupt
+        self.PC[idx] = self.ReadWord(idx, numpy.full(len(idx), 0xfffe))
+
+    def BVC(self, idx, mode, data):
+        self.Branch(idx, ~self.Flag(idx, 0x40), mode, data)
+
+    def BVS(self, idx, mode, data):
+        self.Branch(idx, self.Flag(idx, 0x40), mode, data)
+
+    def CLC(self, idx, mode, data):
+        self.P[idx] &= 0xfe
+
+    def CLD(self, idx, mode, data):
+        self.P[idx] &= 0xf7
+
+    def CLI(self, idx, mode, data):
+        self.P[idx] &= 0xfb
+
+    def CLV(self, idx, mode, data):
+        self.P[idx] &= 0xbf
+
+    def Compare(self, idx, register, value):
+        self.P[idx] = self.P[idx] & 0x7c | Compare[register << 8 | value]
+
+    def CMP(self, idx, mode, data):
+        self.Compare(idx, self.A[idx], mode(idx, data))
+
+    def CPX(self, idx, mode, data):
+        self.Compare(idx, self.X[idx], mode(idx, data))
+
+    def CPY(self, idx, mode, data):
+        self.Compare(idx, self.Y[idx], mode(idx, data))
+
+    def DEC(self, idx, mode, data):
+        address, value = self.Modify(idx, mode, data)
+
+        self.Store(idx, address, (value - 1) & 0xff)
+
+    def DEX(self, idx, mode, data):
+        self.X[idx] = (self.X[idx] - 1) & 0xff
+
+        self.SetNZ(idx, self.X[idx])
+
+    def DEY(self, idx, mode, data):
+        self.Y[idx] = (self.Y[idx] - 1) & 0xff
+
+        self.SetNZ(idx, self.Y[idx])
+
+    def EOR(self, idx, mode, data):
+        self.A[idx] ^= mode(idx, data)
+
+        self.SetNZ(idx, self.A[idx])
+
+    def INC(self, idx, mode, data):
+        address, value = self.Modify(idx, mode, data)
+
+        self.Store(idx, address, (value + 1) & 0xff)
+
+    def INX(self, idx, mode, data):
+        self.X[idx] = (self.X[idx] + 1) & 0xff
+
+        self.SetNZ(idx, self.X[idx])
+
+    def INY(self, idx, mode, data):
+        self.Y[idx] = (self.Y[idx] + 1) & 0xff
+
+        self.SetNZ(idx, self.Y[idx])
+
+    def JMP(self, idx, mode, data):
+        self.PC[idx] = mode(idx, data)
+
+    def JSR(self, idx, mode, data):
+        self.Push(idx, (self.PC[idx] - 1) >> 8 & 0xff)
+        self.Push(idx, (self.PC[idx] - 1) & 0xff)
+        self.PC[idx] = mode(idx, data)
+
+    def LDA(self, idx, mode, data):
+        self.A[idx] = mode(idx, data)
+
+        self.SetNZ(idx, self.A[idx])
+
+    def LDX(self, idx, mode, data):
+        self.X[idx] = mode(idx, data)
+
+        self.SetNZ(idx, self.X[idx])
+
+    def LDY(self, idx, mode, data):
+        self.Y[idx] = mode(idx, data)
+
+        self.SetNZ(idx, self.Y[idx])
+
+    def LSR(self, idx, mode, data):
+        address, value = self.Modify(idx, mode, data)
+
+        self.P[idx] = self.P[idx] & 0xfe | (value & 1)
+
+        self.Store(idx, address, value >> 1)
+
+    def NOP(self, idx, mode, data):
+        pass
+
+    def ORA(self, idx, mode, data):
+        self.A[idx] |= mode(idx, data)
+
+        self.SetNZ(idx, self.A[idx])
+
+    def PHA(self, idx, mode, data):
+        self.Push(idx, self.A[idx])
+
+    def PHP(self, idx, mode, data):
+        self.Push(idx, self.P[idx] | Break | Unused)
+
+    def PLA(self, idx, mode, data):
+        self.A[idx] = self.Pull(idx)
+
+        self.SetNZ(idx, self.A[idx])
+
+    def PLP(self, idx, mode, data):
+        self.P[idx] = self.Pull(idx) & ~Break | Unused
+
+    # Rotates go through the carry
+    def ROL(self, idx, mode, data):
+        address, value = self.Modify(idx, mode, data)
+        carry = self.P[idx] & 0x01
+
+        self.P[idx] = self.P[idx] & 0xfe | (value >> 7)
+
+        self.Store(idx, address, ((value << 1) & 0xff) | carry)
+
+    def ROR(self, idx, mode, data):
+        address, value = self.Modify(idx, mode, data)
+        carry = self.P[idx] & 0x01
+
+        self.P[idx] = self.P[idx] & 0xfe | (value & 1)
+
+        self.Store(idx, address, (carry << 7) | (value >> 1))
+
+    def RTI(self, idx, mode, data):
+        self.P[idx] = self.Pull(idx) & ~Break | Unused
+        self.PC[idx] = self.Pull(idx) | (self.Pull(idx) << 8)
+
+    def RTS(self, idx, mode, data):
+        self.PC[idx] = ((self.Pull(idx) | (self.Pull(idx) << 8)) + 1) & 0xffff
+
+    def SBC(self, idx, mode, data):
+        self.Arithmetic(idx, Subtract, mode(idx, data))
+
+    def SEC(self, idx, mode, data):
+        self.P[idx] |= 0x01
+
+    def SED(self, idx, mode, data):
+        self.P[idx] |= 0x08
+
+    def SEI(self, idx, mode, data):
+        self.P[idx] |= 0x04
+
+    def STA(self, idx, mode, data):
+        self.WriteData(idx, mode(idx, data), self.A[idx])
+
+    def STX(self, idx, mode, data):
+        self.WriteData(idx, mode(idx, data), self.X[idx])
+
+    def STY(self, idx, mode, data):
+        self.WriteData(idx, mode(idx, data), self.Y[idx])
+
+    def TAX(self, idx, mode, data):
+        self.X[idx] = self.A[idx]
+
+        self.SetNZ(idx, self.X[idx])
+
+    def TAY(self, idx, mode, data):
+        self.Y[idx] = self.A[idx]
+
+        self.SetNZ(idx, self.Y[idx])
+
+    def TSX(self, idx, mode, data):
+        self.X[idx] = self.S[idx]
+
+        self.SetNZ(idx, self.X[idx])
+
+    def TXA(self, idx, mode, data):
+        self.A[idx] = self.X[idx]
+
+        self.SetNZ(idx, self.A[idx])
+
+    def TXS(self, idx, mode, data):
+        self.S[idx] = self.X[idx]
+
+    def TYA(self, idx, mode, data):
+        self.A[idx] = self.Y[idx]
+
+        self.SetNZ(idx, self.A[idx])
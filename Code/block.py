@@ -0,0 +1,387 @@
+"""
+
+This file, block.py translates straight-line 6502 code into Python functions.
+
+A basic block starts at some address and runs until the first branch, JMP, JSR or RTS.
+Instructions which cannot be translated (BRK, RTI, PHP, PLP, CLI, SEI and illegal opcodes)
+end the block before them and are left to the interpreter.
+
+So are accesses to the PPU and APU registers, which must see Cpu.Cycles as it is at that instruction
+and may raise an interrupt right after it, and writes to the mapper registers ($8000-$FFFF),
+which may switch out the bank the block runs from. An instruction with a fixed address there is not translated,
+and one whose address is only known when it runs (indexed or indirect) checks it first,
+leaving the block before it with the instructions executed so far.
+
+Translate() takes Cpu.Decode, so it works from the same dispatch table as the interpreter,
+and turns the block into the source of one function
+
+    def block(A, X, Y, P, S, read, write, NZ, Add, Subtract, Compare):
+        ...
+        return A, X, Y, P, S, pc, cycles, count
+
+which is compiled once with compile(). Registers, the status byte P and the stack pointer S are plain locals inside,
+and a flag is only computed where a later instruction in the block does not overwrite it.
+
+"""
+
+from alu import NZ, Add, Subtract, Compare
+
+
+# Longest block, in instructions
+Limit = 64
+
+# Shorter blocks cost more to enter than to interpret
+Minimum = 2
+
+# Flags an instruction reads, so they must be computed before it
+Uses = {'ADC': 'C', 'SBC': 'C', 'ROL': 'C', 'ROR': 'C'}
+
+# Instructions which end a block
+Terminators = ('BCC', 'BCS', 'BEQ', 'BMI', 'BNE', 'BPL', 'BVC', 'BVS', 'JMP', 'JSR', 'RTS')
+
+# Addresses of the PPU and APU registers, and the first of the mapper registers, written over ROM
+Io = (0x2000, 0x4020)
+Mapper = 0x8000
+
+Branches = {
+    'BCC': 'not P & 0x01', 'BCS': 'P & 0x01', 'BEQ': 'P & 0x02', 'BMI': 'P & 0x80',
+    'BNE': 'not P & 0x02', 'BPL': 'not P & 0x80', 'BVC': 'not P & 0x40', 'BVS': 'P & 0x40',
+}
+
+
+# Lines computing the effective address of an operand, and the expression holding it.
+# Where it may be an I/O register, or a mapper register for a write (modes without Read),
+# the lines leave the block first (see Translate).
+def Address(mode, data):
+    if mode in ('ZeroPage', 'Absolute', 'ReadZeroPage', 'ReadAbsolute'):
+        return [], '%d' % data
+    elif mode in ('ZeroPageX', 'ReadZeroPageX'):
+        return [], '((%d + X) & 0xff)' % data
+    elif mode in ('ZeroPageY', 'ReadZeroPageY'):
+        return [], '((%d + Y) & 0xff)' % data
+    elif mode in ('AbsoluteX', 'AbsoluteY', 'ReadAbsoluteX', 'ReadAbsoluteY'):
+        index = mode[-1]
+        write = not mode.startswith('Read')
+        lines, address = [], '((%d + %s) & 0xffff)' % (data, index)
+
+        if data + 0xff >= Io[0] and data < Io[1] or write and data + 0xff >= Mapper:
+            lines, address = ['t = %s' % address, Exit('t', write)], 't'
+
+        if not write:
+            lines.append('if %d + %s > 0xff: cycles += 1' % (data & 0xff, index))
+
+        return lines, address
+    elif mode in ('IndirectX', 'ReadIndirectX'):
+        return ['t = (%d + X) & 0xff' % data,
+                't = read(t) | (read((t + 1) & 0xff) << 8)', Exit('t', mode == 'IndirectX')], 't'
+    elif mode in ('IndirectY', 'ReadIndirectY'):
+        lines = ['t = read(%d) | (read(%d) << 8)' % (data, (data + 1) & 0xff),
+                 'k = (t & 0xff) + Y',
+                 't = (t + Y) & 0xffff', Exit('t', mode == 'IndirectY')]
+
+        if mode == 'ReadIndirectY':
+            lines.append('if k > 0xff: cycles += 1')
+
+        return lines, 't'
+
+    raise KeyError(mode)
+
+
+# Line leaving the block when address is an I/O register, or a mapper register for a write,
+# which may switch the bank the block runs from; Translate fills in the return.
+def Exit(address, write):
+    if write:
+        return 'if %d <= %s < %d or %s >= %d: exit' % (Io[0], address, Io[1], address, Mapper)
+
+    return 'if %d <= %s < %d: exit' % (Io[0], address, Io[1])
+
+
+# Whether an instruction with a fixed address reaches the I/O registers, or writes a mapper register,
+# so is left to the interpreter.
+def Fixed(name, mode, data):
+    if name not in Generators:
+        return False
+
+    return mode in ('Absolute', 'ReadAbsolute') and Io[0] <= data < Io[1] or mode == 'Absolute' and data >= Mapper
+
+
+# Lines loading the operand of a read instruction, and the expression holding it.
+def Value(mode, data):
+    if mode == 'ReadImmediate':
+        return [], '%d' % data
+
+    lines, address = Address(mode, data)
+    lines.append('v = read(%s)' % address)
+
+    return lines, 'v'
+
+
+# Each generator returns a list of (flags, line). A line with flags only updates those bits of P.
+
+def SetNZ(register):
+    return [('NZ', 'P = P & 0x7d | NZ[%s]' % register)]
+
+
+def Load(register):
+    def Generate(mode, data):
+        lines, value = Value(mode, data)
+
+        return [(None, line) for line in lines] + [(None, '%s = %s' % (register, value))] + SetNZ(register)
+
+    return Generate
+
+
+def Store(register):
+    def Generate(mode, data):
+        lines, address = Address(mode, data)
+
+        return [(None, line) for line in lines] + [(None, 'write(%s, %s)' % (address, register))]
+
+    return Generate
+
+
+def Logic(operator):
+    def Generate(mode, data):
+        lines, value = Value(mode, data)
+
+        return [(None, line) for line in lines] + [(None, 'A %s= %s' % (operator, value))] + SetNZ('A')
+
+    return Generate
+
+
+def Comparison(register):
+    def Generate(mode, data):
+        lines, value = Value(mode, data)
+
+        return [(None, line) for line in lines] + [('NZC', 'P = P & 0x7c | Compare[%s << 8 | %s]' % (register, value))]
+
+    return Generate
+
+
+def Step(register, delta):
+    def Generate(mode, data):
+        return [(None, '%s = (%s %s) & 0xff' % (register, register, delta))] + SetNZ(register)
+
+    return Generate
+
+
+def Memory(delta):
+    def Generate(mode, data):
+        lines, address = Address(mode, data)
+
+        return [(None, line) for line in lines] + [
+            (None, 'a = %s' % address),
+            (None, 'u = (read(a) %s) & 0xff' % delta),
+            (None, 'write(a, u)'),
+        ] + SetNZ('u')
+
+    return Generate
+
+
+# Shifts and rotates; body turns u into the result, reading the old carry from P (rotates),
+# and carry is the new one, taken from u first.
+def Shift(carry, body):
+    def Generate(mode, data):
+        if mode is None:
+            lines = [(None, 'u = A')]
+        else:
+            setup, address = Address(mode, data)
+            lines = [(None, line) for line in setup] + [(None, 'a = %s' % address), (None, 'u = read(a)')]
+
+        lines += [(None, 'c = %s' % carry), (None, body)]
+
+        if mode is None:
+            lines.append((None, 'A = u'))
+        else:
+            lines.append((None, 'write(a, u)'))
+
+        return lines + [('C', 'P = P & 0xfe | c')] + SetNZ('u')
+
+    return Generate
+
+
+def Test(mode, data):
+    lines, value = Value(mode, data)
+
+    return [(None, line) for line in lines] + [('NVZ', 'P = P & 0x3d | (%s & 0xc0) | (0 if A & %s else 0x02)' % (value, value))]
+
+
+def Transfer(source, target):
+    def Generate(mode, data):
+        return [(None, '%s = %s' % (target, source))] + SetNZ(target)
+
+    return Generate
+
+
+def Statement(line):
+    def Generate(mode, data):
+        return [(None, line)]
+
+    return Generate
+
+
+# The stack is page $0100, S wraps around inside it
+def Push(value):
+    def Generate(mode, data):
+        return [(None, 'write(0x100 | S, %s)' % value), (None, 'S = (S - 1) & 0xff')]
+
+    return Generate
+
+
+def Pull(register):
+    def Generate(mode, data):
+        return [(None, 'S = (S + 1) & 0xff'), (None, '%s = read(0x100 | S)' % register)] + SetNZ(register)
+
+    return Generate
+
+
+def Constant(flag, line):
+    def Generate(mode, data):
+        return [(flag, line)]
+
+    return Generate
+
+
+# ADC and SBC, looked up in table (see alu.py)
+def Arithmetic(table):
+    def Generate(mode, data):
+        lines, value = Value(mode, data)
+
+        return [(None, line) for line in lines] + [
+            (None, 'u = %s[(P & 0x01) << 16 | A << 8 | %s]' % (table, value)),
+            (None, 'A = u & 0xff'),
+            ('NVZC', 'P = P & 0x3c | u >> 8'),
+        ]
+
+    return Generate
+
+
+def Nothing(mode, data):
+    return []
+
+
+Generators = {
+    'ADC': Arithmetic('Add'), 'SBC': Arithmetic('Subtract'),
+    'AND': Logic('&'), 'EOR': Logic('^'), 'ORA': Logic('|'),
+    'ASL': Shift('(u >> 7)', 'u = (u << 1) & 0xff'),
+    'LSR': Shift('(u & 1)', 'u >>= 1'),
+    'ROL': Shift('(u >> 7)', 'u = ((u << 1) & 0xff) | (P & 0x01)'),
+    'ROR': Shift('(u & 1)', 'u = ((P & 0x01) << 7) | (u >> 1)'),
+    'CMP': Comparison('A'), 'CPX': Comparison('X'), 'CPY': Comparison('Y'),
+    'DEC': Memory('- 1'), 'INC': Memory('+ 1'),
+    'DEX': Step('X', '- 1'), 'DEY': Step('Y', '- 1'),
+    'INX': Step('X', '+ 1'), 'INY': Step('Y', '+ 1'),
+    'LDA': Load('A'), 'LDX': Load('X'), 'LDY': Load('Y'),
+    'STA': Store('A'), 'STX': Store('X'), 'STY': Store('Y'),
+    'TAX': Transfer('A', 'X'), 'TAY': Transfer('A', 'Y'),
+    'TXA': Transfer('X', 'A'), 'TYA': Transfer('Y', 'A'),
+    'TSX': Transfer('S', 'X'), 'TXS': Statement('S = X'),
+    'PHA': Push('A'), 'PLA': Pull('A'),
+    'CLC': Constant('C', 'P &= 0xfe'), 'SEC': Constant('C', 'P |= 0x01'),
+    'CLD': Constant('D', 'P &= 0xf7'), 'SED': Constant('D', 'P |= 0x08'),
+    'CLV': Constant('V', 'P &= 0xbf'),
+    'BIT': Test, 'NOP': Nothing,
+}
+
+
+# Lines of the instruction ending a block; pc holds the fall-through address on entry.
+def Terminate(name, mode, data, next):
+    if name in Branches:
+        target = (next + data - 256 if data >= 128 else next + data) & 0xffff
+        penalty = 2 if (target ^ next) & 0xff00 else 1
+
+        return ['if %s:' % Branches[name],
+                '    pc = %d' % target,
+                '    cycles += %d' % penalty]
+    elif name == 'JMP' and mode == 'Absolute':
+        return ['pc = %d' % data]
+    elif name == 'JMP':
+        # The pointer does not carry into the next page
+        return ['pc = read(%d) | (read(%d) << 8)' % (data, (data & 0xff00) | ((data + 1) & 0xff))]
+    elif name == 'JSR':
+        # The address of the last byte of JSR, high byte first
+        return ['write(0x100 | S, %d)' % ((next - 1) >> 8 & 0xff), 'S = (S - 1) & 0xff',
+                'write(0x100 | S, %d)' % ((next - 1) & 0xff), 'S = (S - 1) & 0xff',
+                'pc = %d' % data]
+    elif name == 'RTS':
+        return ['S = (S + 1) & 0xff', 'pc = read(0x100 | S)',
+                'S = (S + 1) & 0xff', 'pc = ((pc | (read(0x100 | S) << 8)) + 1) & 0xffff']
+
+    raise KeyError(name)
+
+
+# Translate the block starting at pc, without going past end.
+# Returns (function, instruction count, first address, last address + 1),
+# or None when fewer than Minimum instructions can be translated.
+def Translate(decode, pc, read, write, end = 0x10000):
+    instructions = []
+    address = pc
+
+    while len(instructions) < Limit and address < end:
+        handler, mode, data, size, cycles, instruction = decode(address)
+        name = handler.__name__
+
+        if name not in Generators and name not in Terminators or address + size > end:
+            break
+
+        if Fixed(name, mode.__name__ if mode else None, data):
+            break
+
+        instructions.append((name, mode.__name__ if mode else None, data, cycles, address, address + size))
+        address += size
+
+        if name in Terminators:
+            break
+
+    if len(instructions) < Minimum:
+        return None
+
+    # Flags are live at the end of the block; walking backwards,
+    # a flag update is only kept when something after it does not update the same flags again.
+    # Leaving the block before an instruction makes them all live there.
+    live = set('NVDIZC')
+    bodies = []
+    later = 0
+
+    for count in range(len(instructions) - 1, -1, -1):
+        name, mode, data, cycles, start, next = instructions[count]
+        later += cycles
+
+        if name in Terminators:
+            bodies.append(Terminate(name, mode, data, next))
+            continue
+
+        # The cycles of this instruction and the ones after it are not taken when leaving before it
+        exit = 'return A, X, Y, P, S, %d, cycles - %d, %d' % (start, later, count)
+        lines = []
+
+        for flags, line in reversed(Generators[name](mode, data)):
+            if flags is None:
+                lines.append(line)
+            elif live.intersection(flags):
+                lines.append(line)
+                live.difference_update(flags)
+
+        lines.reverse()
+        bodies.append([line.replace(': exit', ': ' + exit) for line in lines])
+
+        live.update(Uses.get(name, ''))
+
+        if any(line.endswith(': exit') for line in lines):
+            live.update('NVDIZC')
+
+    bodies.reverse()
+
+    source = ['def block(A, X, Y, P, S, read=read, write=write, NZ=NZ, Add=Add, Subtract=Subtract, Compare=Compare):',
+              '    cycles = %d' % later,
+              '    pc = %d' % (instructions[-1][5] & 0xffff)]
+
+    for lines in bodies:
+        source += ['    ' + line for line in lines]
+
+    source.append('    return A, X, Y, P, S, pc, cycles, %d' % len(instructions))
+
+    namespace = {'read': read, 'write': write, 'NZ': NZ, 'Add': Add, 'Subtract': Subtract, 'Compare': Compare}
+    exec(compile('\n'.join(source), '<block %04x>' % pc, 'exec'), namespace)
+
+    return (namespace['block'], len(instructions), pc, address)
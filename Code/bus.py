@@ -0,0 +1,127 @@
+"""
+
+This file, bus.py is made for representation of the CPU memory bus in NES.
+
+The 64kB address space is split into 256 pages of 256 bytes.
+Each page has a read handler and a write handler, looked up by the high byte of the address.
+Internal RAM is checked first, so ordinary RAM access never goes through the table.
+
+Writable memory is also seen as 40 pages (Pages), 0-7 internal RAM and 8-39 cartridge RAM,
+and every write marks its page in Dirty until Clean() is called (see rewind.py).
+
+--------------------------------------- $10000
+    Cartridge ROM, two 16kB windows switched by the mapper (see mapper.py)
+--------------------------------------- $8000
+    Cartridge RAM
+--------------------------------------- $6000
+    Expansion Modules (open bus)
+--------------------------------------- $4020
+    APU and I/O registers
+--------------------------------------- $4000
+    PPU registers, mirrored every 8 bytes (mapped by Cpu to its Ppu, see ppu.py)
+--------------------------------------- $2000
+    2kB Internal RAM, mirrored 4 times
+--------------------------------------- $0000
+
+"""
+
+
+class Bus:
+    def __init__(self, mapper):
+        # 2kB internal RAM
+        self.Ram = bytearray(0x800)
+
+        # APU and I/O registers $4000 - $401F
+        self.Io = bytearray(0x20)
+
+        # Cartridge RAM $6000 - $7FFF
+        self.CartRam = bytearray(0x2000)
+
+        # Cartridge ROM $8000 - $FFFF, the mapper's list of windows (rebound in place on a bank switch)
+        self.Mapper = mapper
+        self.Prg = mapper.Prg
+
+        # Writable pages, and which of them were written since Clean()
+        self.Pages = ([memoryview(self.Ram)[i:i + 0x100] for i in range(0, 0x800, 0x100)] +
+                      [memoryview(self.CartRam)[i:i + 0x100] for i in range(0, 0x2000, 0x100)])
+        self.Dirty = bytearray(len(self.Pages))
+
+        self.Readers = [self.ReadOpen] * 256
+        self.Writers = [self.WriteOpen] * 256
+
+        self.Map(0x00, 0x20, self.ReadRam, self.WriteRam)
+        self.Map(0x40, 0x41, self.ReadIo, self.WriteIo)
+        self.Map(0x60, 0x80, self.ReadCartRam, self.WriteCartRam)
+        self.Map(0x80, 0x100, self.ReadRom, mapper.Write)
+
+    def Map(self, first, last, reader, writer):
+        for page in range(first, last):
+            self.Readers[page] = reader
+            self.Writers[page] = writer
+
+    def Clean(self):
+        self.Dirty[:] = bytes(len(self.Dirty))
+
+    def Read(self, address):
+        if address < 0x2000:
+            return self.Ram[address & 0x7ff]
+
+        return self.Readers[address >> 8](address)
+
+    def Write(self, address, value):
+        if address < 0x2000:
+            self.Ram[address & 0x7ff] = value
+            self.Dirty[(address >> 8) & 7] = 1
+        else:
+            self.Writers[address >> 8](address, value)
+
+    # The memory behind count bytes from address, for reading or writing them as one slice:
+    # (buffer, offset, pages to mark dirty), or None unless they are all in RAM (without crossing a mirror),
+    # cartridge RAM or one ROM window. ROM has no pages, as writes to it go to the mapper.
+    def Span(self, address, count):
+        last = address + count - 1
+
+        if last < 0x2000 and address >> 11 == last >> 11:
+            return self.Ram, address & 0x7ff, range((address >> 8) & 7, ((last >> 8) & 7) + 1)
+
+        if address >= 0x6000 and last < 0x8000:
+            return self.CartRam, address & 0x1fff, range(8 + ((address >> 8) & 0x1f), 9 + ((last >> 8) & 0x1f))
+
+        if address >= 0x8000 and last < 0x10000 and address >> 14 == last >> 14:
+            return self.Prg[(address >> 14) & 1], address & 0x3fff, None
+
+        return None
+
+    def ReadRam(self, address):
+        return self.Ram[address & 0x7ff]
+
+    def WriteRam(self, address, value):
+        self.Ram[address & 0x7ff] = value
+        self.Dirty[(address >> 8) & 7] = 1
+
+    def ReadIo(self, address):
+        if address < 0x4020:
+            return self.Io[address & 0x1f]
+
+        return self.ReadOpen(address)
+
+    def WriteIo(self, address, value):
+        if address < 0x4020:
+            self.Io[address & 0x1f] = value
+
+    def ReadCartRam(self, address):
+        return self.CartRam[address & 0x1fff]
+
+    def WriteCartRam(self, address, value):
+        self.CartRam[address & 0x1fff] = value
+        self.Dirty[8 + ((address >> 8) & 0x1f)] = 1
+
+    def ReadRom(self, address):
+        return self.Prg[(address >> 14) & 1][address & 0x3fff]
+
+    # Nothing is connected; reads float high and writes are lost.
+    def ReadOpen(self, address):
+        return 0xff
+
+    def WriteOpen(self, address, value):
+        pass
@@ -0,0 +1,123 @@
+"""
+
+This file, cartridge.py opens iNES ROM images.
+
+A file is mapped with mmap instead of being read, and the PRG and CHR banks are
+memoryview slices of the mapping. Nothing is copied, a page of the file is only read
+from disk when it is first executed or drawn, and every instance opening the same file
+shares the same page cache pages.
+
+iNES layout
+
+    header      16 bytes, "NES^Z", number of 16kB PRG banks, number of 8kB CHR banks, flags...
+    trainer     512 bytes, only when bit 2 of flags 6 is set
+    PRG ROM     16kB banks
+    CHR ROM     8kB banks
+
+NES 2.0 headers (flags 7 bits 2-3 == 2) extend the mapper number and ROM sizes,
+and give the RAM sizes and timing; Parse() reads both into a Descriptor.
+
+"""
+
+import mmap
+import os
+from collections import namedtuple
+
+
+# What the header says about the cartridge. Sizes are in bytes.
+Descriptor = namedtuple('Descriptor', [
+    'format', 'mapper', 'submapper',
+    'prg_rom', 'chr_rom', 'prg_ram', 'prg_nvram', 'chr_ram', 'chr_nvram',
+    'mirroring', 'battery', 'trainer', 'timing',
+])
+
+
+def Parse(header):
+    if header[0:4] != b'NES\x1a':
+        raise ValueError('not an iNES image')
+
+    if header[6] & 0x08:
+        mirroring = 'four-screen'
+    elif header[6] & 0x01:
+        mirroring = 'vertical'
+    else:
+        mirroring = 'horizontal'
+
+    battery = bool(header[6] & 0x02)
+    trainer = bool(header[6] & 0x04)
+
+    if header[7] & 0x0c == 0x08:
+        return Descriptor(
+            format='NES 2.0',
+            mapper=(header[6] >> 4) | (header[7] & 0xf0) | ((header[8] & 0x0f) << 8),
+            submapper=header[8] >> 4,
+            prg_rom=RomSize(header[4], header[9] & 0x0f, 0x4000),
+            chr_rom=RomSize(header[5], header[9] >> 4, 0x2000),
+            prg_ram=RamSize(header[10] & 0x0f),
+            prg_nvram=RamSize(header[10] >> 4),
+            chr_ram=RamSize(header[11] & 0x0f),
+            chr_nvram=RamSize(header[11] >> 4),
+            mirroring=mirroring, battery=battery, trainer=trainer,
+            timing=('NTSC', 'PAL', 'multiple', 'Dendy')[header[12] & 0x03],
+        )
+
+    mapper = header[6] >> 4
+
+    # Old dumps have garbage (e.g. "DiskDude!") from byte 7 on, then only the low nibble is valid
+    if not any(header[12:16]):
+        mapper |= header[7] & 0xf0
+
+    chr_rom = header[5] * 0x2000
+
+    return Descriptor(
+        format='iNES', mapper=mapper, submapper=0,
+        prg_rom=header[4] * 0x4000,
+        chr_rom=chr_rom,
+        prg_ram=(header[8] or 1) * 0x2000,
+        prg_nvram=0,
+        chr_ram=0 if chr_rom else 0x2000,
+        chr_nvram=0,
+        mirroring=mirroring, battery=battery, trainer=trainer,
+        timing='PAL' if header[9] & 0x01 else 'NTSC',
+    )
+
+
+# NES 2.0 ROM size: in units, or exponent-multiplier notation when the high nibble is $F
+def RomSize(low, high, unit):
+    if high == 0x0f:
+        return (1 << (low >> 2)) * ((low & 0x03) * 2 + 1)
+
+    return ((high << 8) | low) * unit
+
+
+# NES 2.0 RAM size: 64 << shift bytes, 0 for none
+def RamSize(shift):
+    return 64 << shift if shift else 0
+
+
+class Cartridge:
+    # rom is the path of an iNES file, or the image itself as any bytes-like object.
+    def __init__(self, rom):
+        if isinstance(rom, (str, os.PathLike)):
+            with open(rom, 'rb') as file:
+                self.Image = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+        else:
+            self.Image = memoryview(rom)
+
+        self.Header = bytes(self.Image[0:16])
+        self.Descriptor = Parse(self.Header)
+
+        prg = self.Descriptor.prg_rom
+        chr = self.Descriptor.chr_rom
+
+        start = 16 + (512 if self.Descriptor.trainer else 0)
+
+        if len(self.Image) < start + prg + chr:
+            raise ValueError('iNES image is truncated')
+
+        self.Prg = self.Image[start:start + prg]
+        self.Chr = self.Image[start + prg:start + prg + chr]
+
+        # 16kB PRG and 8kB CHR banks
+        self.PrgBanks = [self.Prg[i:i + 0x4000] for i in range(0, prg, 0x4000)]
+        self.ChrBanks = [self.Chr[i:i + 0x2000] for i in range(0, chr, 0x2000)]
@@ -91,246 +91,250 @@ In smaller cartridges, which only have 16kB ROM, it takes place at $C000 - $FFFF
 
 """
 
+import hashlib
+import struct
+import time
+import zlib
+from collections import namedtuple
+
 from OpCode import OpCode
+from alu import NZ, Add, Subtract, Compare, Negative, Overflow, Unused, Break, Decimal, Interrupt, Zero, Carry
+from block import Translate
+from bus import Bus
+from cartridge import Cartridge
+from ppu import Ppu
+from scheduler import Scheduler, Never
+import mapper
+
+
+# Returned by Cpu.run: why it stopped, how many instructions and clock cycles it executed,
+# the PC it stopped at and how long it took.
+Stop = namedtuple('Stop', ['reason', 'instructions', 'cycles', 'pc', 'seconds'])
 
 
 class Cpu:
-    def __init__(self):
-        file = open('super-mario-bros.nes', 'rb')
-        print('String NES^Z : ' + file.read(4).decode('ascii'))
-        print('Number of 16kB ROM banks : ' + file.read(1).hex())
-        print('Number of 8kB VROM banks : ' + file.read(1).hex())
-        print(file.read(1).hex())
-        print(file.read(1).hex())
-        print('Number of 8kB RAM banks : ' + file.read(1).hex())
-        print('1 for PAL cartridges, otherwise assume NTSC : ' + file.read(1).hex())
-        print(file.read(6).hex())
-        print()
+    # rom is the path of an iNES file, or the image itself as any bytes-like object.
+    def __init__(self, trace = None, translate = False, rom = 'super-mario-bros.nes'):
+        # ROM banks are views of the file, read from disk as they are used
+        self.Cartridge = Cartridge(rom)
 
-        # HEX
-        self.__Rom = []
-        for i in range(32768):
-            self.__Rom.append(file.read(1).hex())
+        self.__Rom = self.Cartridge.Prg
 
-        # DEC
-        self.__Ram = []
-        for i in range(20480):
-            self.__Ram.append(0)
+        # Snapshots only restore into the ROM they were taken from, see Crc()
+        self.__Crc = None
 
-        self.__Ram[8194] = -10
-        self.__Ram[2012] = 100
+        print(self.Cartridge.Descriptor)
+        print()
 
-        # 24576
-        # 8192
-        self.__PC = 0
+        # Decoded ROM instructions by address, see Decode()
+        self.__Decoded = {}
 
-        # Accumulator
-        self.__A = 0
+        # Translated basic blocks by entry address (see block.py), None to only interpret.
+        # False marks an address where no block could be translated.
+        self.__Blocks = {} if translate else None
 
-        # General purpose registers
-        self.__X = 0
-        self.__Y = 0
+        # The addresses of a block interpreted instead of run, as it did not fit in a chunk of run()
+        # or left before an access to the I/O registers.
+        # They are not translated on the way through, which would only make more blocks overlapping it.
+        self.__Through = range(0)
 
-        # Stack pointer
-        self.__S = []
-        # Push: self.__S.append(Something)
-        # Pop: self.__S.pop()
+        # The same two caches for each PRG bank, by (window, bank), and those of the mapped banks.
+        # A bank switch takes the old bank's entries out of the caches above and puts the new bank's in,
+        # so nothing is decoded or translated again when a bank comes back.
+        self.__Banks = {}
+        self.__Mapped = [None, None]
 
-        ## Process Status ##
+        self.Mapper = mapper.Create(self.Cartridge, self.Switch)
 
-        # Negative
-        self.N = False
+        for window, bank in enumerate(self.Mapper.PrgBank):
+            self.Switch(window, bank)
 
-        # Overflow
-        self.V = False
+        self.Bus = Bus(self.Mapper)
 
-        # BRK Command
-        self.B = False
+        # Every load and store goes straight to the bus.
+        self.ReadData = self.Bus.Read
+        self.WriteData = self.Bus.Write
 
-        # Decimal
-        self.D = False
+        # The stack page is always RAM, so pushes and pulls skip the bus
+        self.__Ram = self.Bus.Ram
+        self.__Dirty = self.Bus.Dirty
 
-        # IRQ Disable
-        self.D = False
+        self.WriteData(2012, 100)
 
-        # Zero
-        self.Z = False
+        # Start from the reset vector at $FFFC
+        self.__PC = self.ReadWord(0xfffc)
 
-        # Carry
-        self.C = False
+        # Instruction trace sink (see tracer.py), None to disable tracing
+        self.Trace = trace
 
-        ## Process Status ##
+        # Skip the passes of idle loops instead of running them (see Loop())
+        self.SkipIdle = True
 
-    def FetchInstruction(self):
-        instruction = self.__Rom[self.__PC]
+        # Instructions loop idioms may still run in this chunk of run(), and those they ran (see Idiom())
+        self.__Left = 0
+        self.__Extra = 0
 
-        self.__PC += 1
+        # Clock cycles executed since power on
+        self.Cycles = 0
 
-        return instruction
+        # Device events by cycle (see scheduler.py), checked by run() between instructions
+        self.Events = Scheduler()
 
-    def FetchData(self, bytes):
-        data = []
+        # A requested NMI not taken yet, and the sources holding the IRQ line, one bit each
+        self.__Nmi = False
+        self.Irq = 0
 
-        for i in range(bytes, 0, -1):
-            data.append(self.__Rom[self.__PC + i - 1])
+        # The PPU keeps its own time from Cycles and Events, so it comes after them
+        self.Ppu = Ppu(self)
+        self.Bus.Map(0x20, 0x40, self.Ppu.Read, self.Ppu.Write)
+        self.Bus.Map(0x40, 0x41, self.Bus.ReadIo, self.WriteIo)
 
-        self.__PC += bytes
+        # Accumulator
+        self.__A = 0
 
-        return ''.join(data)
+        # General purpose registers
+        self.__X = 0
+        self.__Y = 0
 
-    def Branch(self, data):
-        value = int(data, 16)
+        # Stack pointer; the stack is page $0100 of RAM and grows down from $01FF.
+        # Push: self.Push(Something)
+        # Pull: self.Pull()
+        self.__S = 0xfd
 
-        if value < 128:
-            self.__PC += value
-        else:
-            self.__PC += (value - 256)
+        # Process status NV1BDIZC, one byte (see alu.py). IRQs are disabled at power on.
+        self.P = Unused | Interrupt
 
-    def ReadData(self, address):
-        dec = int(address, 16)
-        returnValue = -1
+        # Opcode dispatch table.
+        # Each of the 256 opcode bytes maps to (handler, addressing mode, operand bytes, cycles),
+        # so decoding an instruction is a single index operation.
+        # Instructions which read their operand get a resolver returning the value,
+        # the others get one returning the effective address.
+        self.__Table = [(self.Illegal, None, 0, 2)] * 256
 
-        if 0 <= dec < 20480:
-            returnValue = self.__Ram[dec]
-        elif 32768 <= dec < 65536:
-            returnValue = int(self.__Rom[dec - 32768], 16)
+        for name, codes in vars(OpCode).items():
+            if not name.startswith('op_'):
+                continue
 
-        if returnValue > 127:
-            returnValue -= 256
+            mnemonic = name[3:].upper()
+            handler = getattr(self, mnemonic)
 
-        return returnValue
+            modes = getattr(OpCode, 'am' + name[2:])
+            cycles = getattr(OpCode, 'cy' + name[2:])
 
-    def ReadDataDec(self, address):
-        returnValue = -1
+            for code, mode, cycle in zip(codes, modes, cycles):
+                if mode == 'Implicit' or mode == 'Accumulator':
+                    resolver = None
+                elif mnemonic in self.Reads:
+                    resolver = getattr(self, 'Read' + mode)
+                else:
+                    resolver = getattr(self, mode)
 
-        if 0 <= address < 20480:
-            returnValue = self.__Ram[address]
-        elif 32768 <= address < 65536:
-            returnValue = int(self.__Rom[address - 32768], 16)
+                self.__Table[int(code, 16)] = (handler, resolver, OpCode.length[mode], cycle)
 
-        if returnValue > 127:
-            returnValue -= 256
+    # Instructions whose operand is a value rather than an address.
+    Reads = ('ADC', 'AND', 'BIT', 'CMP', 'CPX', 'CPY', 'EOR', 'LDA', 'LDX', 'LDY', 'ORA', 'SBC')
 
-        return returnValue
+    def ReadWord(self, address):
+        return self.ReadData(address) | (self.ReadData((address + 1) & 0xffff) << 8)
 
-    def Indirect(self, address):
-        returnValue = 0
-        tmp = 0
-        second = self.FetchData(1)
-        dec = int(second, 16)
+    ## Addressing Mode ##
+    # Each resolver takes the operand fetched by run() and returns the effective address.
 
-        if 0 <= dec < 20480:
-            if self.__Ram[dec] < 0:
-                tmp = self.__Ram[dec] + 256
-            else:
-                tmp = self.__Ram[dec]
+    def ZeroPage(self, data):
+        return data
 
-            returnValue += tmp * 16 *16
-        elif 32768 <= dec < 65536:
-            returnValue += int(self.__Rom[dec - 23768], 16) * 16 * 16
+    def ZeroPageX(self, data):
+        return (data + self.__X) & 0xff
 
-        dec = int(address, 16)
+    def ZeroPageY(self, data):
+        return (data + self.__Y) & 0xff
 
-        if 0 <= dec < 20480:
-            if self.__Ram[dec] < 0:
-                tmp = self.__Ram[dec] + 256
-            else:
-                tmp = self.__Ram[dec]
+    def Absolute(self, data):
+        return data
 
-            returnValue += tmp
-        elif 32768 <= dec < 65536:
-            returnValue += int(self.__Rom[dec - 23768], 16)
+    def AbsoluteX(self, data):
+        return (data + self.__X) & 0xffff
 
-        return returnValue
+    def AbsoluteY(self, data):
+        return (data + self.__Y) & 0xffff
 
-    def IndirectX(self, address):
-        tmp = 0
-        if self.__X < 0:
-            tmp = self.__X + 256
-        else:
-            tmp = self.__X
+    # JMP ($xxFF) takes the high byte from $xx00, the pointer does not carry into the next page.
+    def Indirect(self, data):
+        return self.ReadData(data) | (self.ReadData((data & 0xff00) | ((data + 1) & 0xff)) << 8)
 
-        data = int(address, 16) + tmp
+    def IndirectX(self, data):
+        address = (data + self.__X) & 0xff
 
-        return self.ReadDataDec(data)
+        return self.ReadData(address) | (self.ReadData((address + 1) & 0xff) << 8)
 
-    def IndirectY(self, address):
-        tmp = 0
-        if self.__Y < 0:
-            tmp = self.__Y + 256
+    def IndirectY(self, data):
+        base = self.ReadData(data) | (self.ReadData((data + 1) & 0xff) << 8)
+
+        return (base + self.__Y) & 0xffff
+
+    def Relative(self, data):
+        if data < 128:
+            return (self.__PC + data) & 0xffff
         else:
-            tmp = self.__Y
+            return (self.__PC + data - 256) & 0xffff
 
-        data = self.ReadData(address) + tmp
+    # Same as above, but return the value found at the effective address.
 
+    def ReadImmediate(self, data):
         return data
 
-    def ZeroPageX(self, data):
-        tmp = 0
-        if self.__X < 0:
-            tmp = self.__X + 256
-        else:
-            tmp = self.__X
+    def ReadZeroPage(self, data):
+        return self.ReadData(self.ZeroPage(data))
 
-        index = int(data, 16) + tmp
+    def ReadZeroPageX(self, data):
+        return self.ReadData(self.ZeroPageX(data))
 
-        return self.__Ram[index]
+    def ReadZeroPageY(self, data):
+        return self.ReadData(self.ZeroPageY(data))
 
-    def ZeroPageY(self, data):
-        tmp = 0
-        if self.__Y < 0:
-            tmp = self.__Y + 256
-        else:
-            tmp = self.__Y
+    def ReadAbsolute(self, data):
+        return self.ReadData(self.Absolute(data))
 
-        index = int(data, 16) + tmp
+    # Indexed reads take one more cycle when the index carries into the next page.
 
-        return self.__Ram[index]
+    def ReadAbsoluteX(self, data):
+        address = (data + self.__X) & 0xffff
 
-    def AbsoluteX(self, data):
-        tmp = 0
-        if self.__X < 0:
-            tmp = self.__X + 256
-        else:
-            tmp = self.__X
-
-        address = int(data, 16) + tmp
-        returnValue = self.ReadDataDec(address)
+        if (address ^ data) & 0xff00:
+            self.Cycles += 1
 
-        return returnValue
+        return self.ReadData(address)
 
-    def AbsoluteY(self, data):
-        tmp = 0
-        if self.__Y < 0:
-            tmp = self.__Y + 256
-        else:
-            tmp = self.__Y
+    def ReadAbsoluteY(self, data):
+        address = (data + self.__Y) & 0xffff
 
-        address = int(data, 16) + tmp
-        returnValue = self.ReadDataDec(address)
+        if (address ^ data) & 0xff00:
+            self.Cycles += 1
 
-        return returnValue
+        return self.ReadData(address)
 
-    def rotl(self, num, bits = 8):
-        bit = num & (1 << (bits-1))
-        num <<= 1
+    def ReadIndirectX(self, data):
+        return self.ReadData(self.IndirectX(data))
 
-        if(bit):
-            num |= 1
+    def ReadIndirectY(self, data):
+        base = self.ReadData(data) | (self.ReadData((data + 1) & 0xff) << 8)
+        address = (base + self.__Y) & 0xffff
 
-        num &= (2**bits-1)
+        if (address ^ base) & 0xff00:
+            self.Cycles += 1
 
-        return num
+        return self.ReadData(address)
 
-    def rotr(self, num, bits = 8):
-        num &= (2**bits-1)
-        bit = num & 1
-        num >>= 1
+    ## Addressing Mode ##
 
-        if(bit):
-            num |= (1 << (bits-1))
+    # Taken branch; one more cycle, or two if it lands on another page.
+    def Branch(self, address):
+        if (address ^ self.__PC) & 0xff00:
+            self.Cycles += 2
+        else:
+            self.Cycles += 1
 
-        return num
+        self.__PC = address
 
     def debug(self):
         print('A: ' + str(self.__A), end=' ')
@@ -338,2359 +342,1016 @@ class Cpu:
         print('Y: ' + str(self.__Y), end=' ')
         print()
 
-        print('Z: ' + str(self.Z), end=' ')
-        print('C: ' + str(self.C), end=' ')
-        print('N: ' + str(self.N), end=' ')
+        print('Z: ' + str(bool(self.P & Zero)), end=' ')
+        print('C: ' + str(bool(self.P & Carry)), end=' ')
+        print('N: ' + str(bool(self.P & Negative)), end=' ')
         print()
         print()
 
     def PrintMem(self):
-        for i in range(20480):
-            if self.__Ram[i] != 0:
-                print(str(i) + ': ' + str(self.__Ram[i]))
-
-    def run(self):
-        for i in range(19500):
-            instruction = self.FetchInstruction()
-
-            if instruction in OpCode.op_adc:
-                self.ADC(instruction)
-            elif instruction in OpCode.op_and:
-                self.AND(instruction)
-            elif instruction in OpCode.op_asl:
-                self.ASL(instruction)
-            elif instruction in OpCode.op_bcc:
-                self.BCC(instruction)
-            elif instruction in OpCode.op_bcs:
-                self.BCS(instruction)
-            elif instruction in OpCode.op_beq:
-                self.BEQ(instruction)
-            elif instruction in OpCode.op_bit:
-                self.BIT(instruction)
-            elif instruction in OpCode.op_bmi:
-                self.BMI(instruction)
-            elif instruction in OpCode.op_bne:
-                self.BNE(instruction)
-            elif instruction in OpCode.op_bpl:
-                self.BPL(instruction)
-            elif instruction in OpCode.op_brk:
-                self.BRK(instruction)
-            elif instruction in OpCode.op_bvc:
-                self.BVC(instruction)
-            elif instruction in OpCode.op_bvs:
-                self.BVS(instruction)
-            elif instruction in OpCode.op_clc:
-                self.CLC(instruction)
-            elif instruction in OpCode.op_cld:
-                self.CLD(instruction)
-            elif instruction in OpCode.op_cli:
-                self.CLI(instruction)
-            elif instruction in OpCode.op_clv:
-                self.CLV(instruction)
-            elif instruction in OpCode.op_cmp:
-                self.CMP(instruction)
-            elif instruction in OpCode.op_cpx:
-                self.CPX(instruction)
-            elif instruction in OpCode.op_cpy:
-                self.CPY(instruction)
-            elif instruction in OpCode.op_dec:
-                self.DEC(instruction)
-            elif instruction in OpCode.op_dex:
-                self.DEX(instruction)
-            elif instruction in OpCode.op_dey:
-                self.DEY(instruction)
-            elif instruction in OpCode.op_eor:
-                self.EOR(instruction)
-            elif instruction in OpCode.op_inc:
-                self.INC(instruction)
-            elif instruction in OpCode.op_inx:
-                self.INX(instruction)
-            elif instruction in OpCode.op_iny:
-                self.INY(instruction)
-            elif instruction in OpCode.op_jmp:
-                self.JMP(instruction)
-            elif instruction in OpCode.op_jsr:
-                self.JSR(instruction)
-            elif instruction in OpCode.op_lda:
-                self.LDA(instruction)
-            elif instruction in OpCode.op_ldx:
-                self.LDX(instruction)
-            elif instruction in OpCode.op_ldy:
-                self.LDY(instruction)
-            elif instruction in OpCode.op_lsr:
-                self.LSR(instruction)
-            elif instruction in OpCode.op_nop:
-                self.NOP(instruction)
-            elif instruction in OpCode.op_ora:
-                self.ORA(instruction)
-            elif instruction in OpCode.op_pha:
-                self.PHA(instruction)
-            elif instruction in OpCode.op_php:
-                self.PHP(instruction)
-            elif instruction in OpCode.op_pla:
-                self.PLA(instruction)
-            elif instruction in OpCode.op_plp:
-                self.PLP(instruction)
-            elif instruction in OpCode.op_rol:
-                self.ROL(instruction)
-            elif instruction in OpCode.op_ror:
-                self.ROR(instruction)
-            elif instruction in OpCode.op_rti:
-                self.RTI(instruction)
-            elif instruction in OpCode.op_rts:
-                self.RTS(instruction)
-            elif instruction in OpCode.op_sbc:
-                self.SBC(instruction)
-            elif instruction in OpCode.op_sec:
-                self.SEC(instruction)
-            elif instruction in OpCode.op_sed:
-                self.SED(instruction)
-            elif instruction in OpCode.op_sei:
-                self.SEI(instruction)
-            elif instruction in OpCode.op_sta:
-                self.STA(instruction)
-            elif instruction in OpCode.op_stx:
-                self.STX(instruction)
-            elif instruction in OpCode.op_sty:
-                self.STY(instruction)
-            elif instruction in OpCode.op_tax:
-                self.TAX(instruction)
-            elif instruction in OpCode.op_tay:
-                self.TAY(instruction)
-            elif instruction in OpCode.op_tsx:
-                self.TSX(instruction)
-            elif instruction in OpCode.op_txa:
-                self.TXA(instruction)
-            elif instruction in OpCode.op_txs:
-                self.TXS(instruction)
-            elif instruction in OpCode.op_tya:
-                self.TYA(instruction)
-            else:
-                print('error')
-
-        self.PrintMem()
-            #self.debug()
-
-    def ADC(self, instruction):
-        # Immediate
-        if instruction == OpCode.op_adc[0]:
-            data = self.FetchData(1)
-
-            value = int(data, 16)
-            if value > 127:
-                value -= 256
-
-            self.__A += value
-
-            print('ADC : ' + instruction + ' ' + data)
-
-        # Zero Page
-        elif instruction == OpCode.op_adc[1]:
-            data = self.FetchData(1)
-            value = self.__Ram[int(data, 16)]
-
-            self.__A += value
-            
-            print('ADC : ' + instruction + ' ' + data)
-
-        # Zero Page, X
-        elif instruction == OpCode.op_adc[2]:
-            data = self.FetchData(1)
-            value = self.ZeroPageX(data)
-
-            self.__A += value
-            
-            print('ADC : ' + instruction + ' ' + data)
-
-        # Absolute
-        elif instruction == OpCode.op_adc[3]:
-            data = self.FetchData(2)
-            value = self.ReadData(data)
-
-            self.__A += value
-            
-            print('ADC : ' + instruction + ' ' + data)
-
-        # Absolute, X
-        elif instruction == OpCode.op_adc[4]:
-            data = self.FetchData(2)
-            
-            value = self.AbsoluteX(data)
-
-            self.__A += value
-
-            print('ADC : ' + instruction + ' ' + data)
-
-        # Absolute, Y
-        elif instruction == OpCode.op_adc[5]:
-            data = self.FetchData(2)
-            
-            value = self.AbsoluteY(data)
-
-            self.__A += value
-
-            print('ADC : ' + instruction + ' ' + data)
-
-        # Indirect, X
-        elif instruction == OpCode.op_adc[6]:
-            data = self.FetchData(1)
-
-            self.__A += self.IndirectX(data)
-
-            print('ADC : ' + instruction + ' ' + data)
-
-        # Indirect, Y
-        elif instruction == OpCode.op_adc[7]:
-            data = self.FetchData(1)
-
-            self.__A += self.IndirectY(data)
-
-            print('ADC : ' + instruction + ' ' + data)
-
-        if self.__A > 255:
-            self.__A = 255
-            self.C = True
-        else:
-            self.C = False
-        
-        if self.__A < 0:
-            self.N = True
-        else:
-            self.N = False
+        for i, value in enumerate(self.Bus.Ram):
+            if value != 0:
+                print(str(i) + ': ' + str(value))
 
-    def AND(self, instruction):
-        # Immediate
-        if instruction == OpCode.op_and[0]:
-            data = self.FetchData(1)
-            tmp = self.__A
+        for i, value in enumerate(self.Bus.CartRam):
+            if value != 0:
+                print(str(i + 0x6000) + ': ' + str(value))
 
-            if tmp < 0:
-                tmp += 256
+    # CRC32 of the PRG ROM, computed on first use so the whole ROM is not read at start up.
+    def Crc(self):
+        if self.__Crc is None:
+            self.__Crc = zlib.crc32(self.__Rom)
 
-            value = int(data, 16)
+        return self.__Crc
 
-            value &= tmp
+    # Snapshot layout, all little endian:
+    #   header      'NESS', version, CRC32 of the PRG ROM,
+    #               A, X, Y, status, stack pointer, PC, cycles, NMI not taken yet, IRQ sources
+    #   mapper      length byte and mapper registers (Mapper.State())
+    #   PPU         registers, VRAM, OAM, palette and CHR RAM (Ppu.State())
+    #   registers   I/O registers
+    #   memory      internal RAM, cartridge RAM
+    Header = struct.Struct('<4sBIBBBBBHQBI')
+    Version = 4
 
-            if value > 127:
-                value -= 256
+    # Capture the machine state as bytes, to be passed to restore() later.
+    # With memory=False the RAM, VRAM and CHR RAM are left out, for callers keeping track of them
+    # themselves (see rewind.py).
+    def snapshot(self, memory = True):
+        bus = self.Bus
+        state = self.Mapper.State()
 
-            self.__A = value
+        parts = [
+            self.Header.pack(b'NESS', self.Version, self.Crc(), self.__A, self.__X, self.__Y,
+                             self.P, self.__S, self.__PC, self.Cycles, self.__Nmi, self.Irq),
+            bytes([len(state)]), state,
+            self.Ppu.State(memory), bus.Io,
+        ]
 
-            print('AND : ' + instruction + ' ' + data)
+        if memory:
+            parts += [bus.Ram, bus.CartRam]
 
-        # Zero Page
-        elif instruction == OpCode.op_and[1]:
-            data = self.FetchData(1)
-            tmp = self.__A
+        return b''.join(parts)
 
-            if tmp < 0:
-                tmp += 256
+    # Takes either kind of snapshot; without memory, the RAM, VRAM and CHR RAM are left as they are.
+    def restore(self, snapshot):
+        snapshot = memoryview(snapshot)
+        bus = self.Bus
 
-            value = self.__Ram[int(data, 16)]
-            if value < 0:
-                value += 256
+        magic, version, crc, a, x, y, status, stack, pc, cycles, nmi, irq = self.Header.unpack_from(snapshot)
 
-            value &= tmp
+        if magic != b'NESS' or version != self.Version:
+            raise ValueError('not a version %d snapshot' % self.Version)
 
-            if value > 127:
-                value -= 256
+        if crc != self.Crc():
+            raise ValueError('snapshot was taken with another ROM')
 
-            self.__A = value
+        offset = self.Header.size
 
-            print('AND : ' + instruction + ' ' + data)
+        state = bytes(snapshot[offset + 1:offset + 1 + snapshot[offset]])
+        offset += 1 + len(state)
 
-        # Zero Page, X
-        elif instruction == OpCode.op_and[2]:
-            data = self.FetchData(1)
-            tmp = self.__A
+        memory = len(snapshot) != offset + self.Ppu.Size(False) + len(bus.Io)
 
-            if tmp < 0:
-                tmp += 256
+        ppu = bytes(snapshot[offset:offset + self.Ppu.Size(memory)])
+        offset += len(ppu)
 
-            value = self.ZeroPageX(data)
-            if value < 0:
-                value += 256
+        memories = [bus.Io] + ([bus.Ram, bus.CartRam] if memory else [])
+        size = offset + sum(len(part) for part in memories)
 
-            value &= tmp
+        # Checked first, as assigning a short slice would shrink the memory
+        if len(snapshot) != size:
+            raise ValueError('snapshot has the wrong size')
 
-            if value > 127:
-                value -= 256
+        for part in memories:
+            part[:] = snapshot[offset:offset + len(part)]
+            offset += len(part)
 
-            self.__A = value
+        if memory:
+            # Every page may have changed
+            bus.Dirty[:] = b'\x01' * len(bus.Dirty)
 
-            print('AND : ' + instruction + ' ' + data)
+        self.Mapper.SetState(state)
 
-        # Absolute
-        elif instruction == OpCode.op_and[3]:
-            data = self.FetchData(2)
-            value = self.ReadData(data)
+        self.__A, self.__X, self.__Y, self.__S, self.__PC = a, x, y, stack, pc
+        self.Cycles = cycles
+        self.P = status
 
-            if value < 0:
-                value += 256
+        # Interrupts of the state left behind are dropped, and those of the snapshot polled for again
+        self.Events.CancelAll(self.Poll)
+        self.__Nmi = bool(nmi)
+        self.Irq = irq
 
-            tmp = self.__A
+        if nmi or irq:
+            self.Events.Add(cycles, self.Poll)
 
-            if tmp < 0:
-                tmp += 256
+        # The PPU schedules its events from the restored cycle count
+        self.Ppu.SetState(ppu, memory)
 
-            value &= tmp
+    # The stack pointer wraps around within page $0100, so the stack never leaves it.
+    def Push(self, value):
+        self.__Ram[0x100 | self.__S] = value
+        self.__Dirty[1] = 1
+        self.__S = (self.__S - 1) & 0xff
 
-            if value > 127:
-                value -= 256
+    def Pull(self):
+        self.__S = (self.__S + 1) & 0xff
 
-            self.__A = value
-        
-            print('AND : ' + instruction + ' ' + data)
-
-        # Absolute, X
-        elif instruction == OpCode.op_and[4]:
-            data = self.FetchData(2)
-            value = self.AbsoluteX(data)
-
-            if value < 0:
-                value += 256
+        return self.__Ram[0x100 | self.__S]
 
-            tmp = self.__A
+    # Writing a page number to $4014 copies the page into OAM in one go, from the OAM address on.
+    # The CPU is halted meanwhile, for 513 cycles or 514 when the copy starts on an odd cycle.
+    # The other registers are the bus's.
+    def WriteIo(self, address, value):
+        if address != 0x4014:
+            self.Bus.WriteIo(address, value)
+            return
 
-            if tmp < 0:
-                tmp += 256
+        ppu = self.Ppu
 
-            value &= tmp
+        # The lines drawn so far used the old sprites
+        ppu.CatchUp()
 
-            if value > 127:
-                value -= 256
-
-            self.__A = value
+        span = self.Bus.Span(value << 8, 0x100)
 
-            print('AND : ' + instruction + ' ' + data)
-
-        # Absolute, Y
-        elif instruction == OpCode.op_and[5]:
-            data = self.FetchData(2)
-            value = self.AbsoluteY(data)
-
-            if value < 0:
-                value += 256
-
-            tmp = self.__A
-
-            if tmp < 0:
-                tmp += 256
-
-            value &= tmp
-
-            if value > 127:
-                value -= 256
-
-            self.__A = value
-
-            print('AND : ' + instruction + ' ' + data)
-
-        # Indirect, X
-        elif instruction == OpCode.op_and[6]:
-            data = self.FetchData(1)
-            value = self.IndirectX(data)
-
-            if value < 0:
-                value += 256
-
-            tmp = self.__A
-
-            if tmp < 0:
-                tmp += 256
-
-            value &= tmp
-
-            if value > 127:
-                value -= 256
-
-            self.__A = value
-
-            print('AND : ' + instruction + ' ' + data)
-
-        # Indirect, Y
-        elif instruction == OpCode.op_and[7]:
-            data = self.FetchData(1)
-            value = self.IndirectY(data)
-
-            if value < 0:
-                value += 256
-
-            tmp = self.__A
-
-            if tmp < 0:
-                tmp += 256
-
-            value &= tmp
-
-            if value > 127:
-                value -= 256
-
-            self.__A = value
-
-            print('AND : ' + instruction + ' ' + data)
-
-        if self.__A == 0:
-            self.Z = True
+        if span is not None:
+            buffer, offset, pages = span
+            page = buffer[offset:offset + 0x100]
         else:
-            self.Z = False
-        
-        if self.__A < 0:
-            self.N = True
+            page = bytes([self.ReadData((value << 8) | i) for i in range(0x100)])
+
+        first = ppu.OamAddress
+        ppu.Oam[first:] = page[:0x100 - first]
+        ppu.Oam[:first] = page[0x100 - first:]
+
+        # Cycles is the cycle after the write, as STA $4014 is always interpreted (see block.py)
+        self.Cycles += 513 + (self.Cycles & 1)
+
+    ## Interrupts ##
+    # Devices call these, usually from an event. The CPU looks at them when Poll() runs,
+    # at the next instruction boundary.
+
+    # NMI is edge triggered, each call is taken once whatever I is.
+    def Nmi(self):
+        self.__Nmi = True
+        self.Events.Add(self.Cycles, self.Poll)
+
+    # IRQ is level triggered and shared. A source, one bit, holds the line until it is acknowledged,
+    # and the CPU keeps taking it whenever I is clear.
+    def SetIrq(self, source, level = True):
+        if level:
+            self.Irq |= source
+            self.Events.Add(self.Cycles, self.Poll)
         else:
-            self.N = False
-
-    def ASL(self, instruction):
-        if self.__A >= 128:
-            self.C = True
-        else:
-            self.C = False
-        
-        # Accumulator
-        if instruction == OpCode.op_asl[0]:
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
-
-            tmp <<= 1
-
-            if tmp > 255:
-                tmp -= 256
-                self.V = True
-
-            if tmp > 127:
-                tmp -= 256
-
-            self.__A = tmp
-
-            print('ASL : ' + instruction)
-
-        # Zero Page
-        elif instruction == OpCode.op_asl[1]:
-            data = self.FetchData(1)
-            tmp = self.__Ram[int(data, 16)]
-            if tmp < 0:
-                tmp += 256
-
-            tmp <<= 1
-
-            if tmp > 255:
-                tmp -= 256
-                self.V = True
-
-            if tmp > 127:
-                tmp -= 256
-
-            self.__Ram[int(data, 16)] = tmp
-
-            print('ASL : ' + instruction + ' ' + data)
-
-        # Zero Page, X
-        elif instruction == OpCode.op_asl[2]:
-            data = self.FetchData(1)
-            x = self.__X
-            if x < 0:
-                x += 256
-
-            address = int(data, 16) + x
-            tmp = self.__Ram[address]
-            if tmp < 0:
-                tmp += 256
-
-            tmp <<= 1
-
-            if tmp > 255:
-                tmp -= 256
-                self.V = True
-
-            if tmp > 127:
-                tmp -= 256
-
-            self.__Ram[address] = tmp
-
-            print('ASL : ' + instruction + ' ' + data)
-
-        # Absolute
-        elif instruction == OpCode.op_asl[3]:
-            data = self.FetchData(2)
-            address = int(data, 16)
-            value = self.__Ram[address]
-
-            if value < 0:
-                value += 256
-
-            value <<= 1
-
-            if value > 255:
-                value -= 256
-                self.V = True
-
-            if value > 127:
-                value -= 256
-
-            self.__Ram[address] = value
-
-            print('ASL : ' + instruction + ' ' + data)
-
-        # Absolute, X
-        elif instruction == OpCode.op_asl[4]:
-            data = self.FetchData(2)
-            tmp = 0
-
-            if self.__X < 0:
-                tmp = self.__X + 256
-            else:
-                tmp = self.__X
-
-            address = int(data, 16) + tmp
-            value = self.__Ram[address]
-
-            if value < 0:
-                value += 256
-
-            value <<= 1
-
-            if value > 255:
-                value -= 256
-                self.V = True
-
-            if value > 127:
-                value -= 256
-
-            self.__Ram[address] = value
-
-            print('ASL : ' + instruction + ' ' + data)
-
-        if self.__A == 0:
-            self.Z = True
+            self.Irq &= ~source
+
+    def Poll(self, cycle):
+        if self.__Nmi:
+            self.__Nmi = False
+            self.Interrupt(0xfffa)
+        elif self.Irq and not self.P & Interrupt:
+            self.Interrupt(0xfffe)
+
+    # Same as BRK, but with B clear in the pushed status and the PC of the next instruction.
+    def Interrupt(self, vector):
+        self.Push(self.__PC >> 8)
+        self.Push(self.__PC & 0xff)
+        self.Push(self.P & ~Break | Unused)
+
+        self.P |= Interrupt
+        self.__PC = self.ReadWord(vector)
+        self.Cycles += 7
+
+    ## Interrupts ##
+
+    # Hash of the whole machine state, for comparing runs.
+    def Digest(self):
+        return hashlib.sha1(self.snapshot()).hexdigest()
+
+    # Fetch and decode the instruction at pc into
+    # (handler, addressing mode, operand, instruction size, cycles, opcode).
+    # Instructions in ROM never change, so they are decoded once and kept in self.__Decoded,
+    # unless they straddle two PRG windows.
+    def Decode(self, pc):
+        instruction = self.ReadData(pc)
+        handler, mode, length, cycles = self.__Table[instruction]
+
+        if length == 1:
+            data = self.ReadData((pc + 1) & 0xffff)
+        elif length == 2:
+            data = self.ReadData((pc + 1) & 0xffff) | (self.ReadData((pc + 2) & 0xffff) << 8)
         else:
-            self.Z = False
-
-        if self.__A < 0:
-            self.N = True
+            data = None
+
+        entry = (handler, mode, data, length + 1, cycles, instruction)
+
+        if pc >= 0x8000 and not (pc ^ (pc + length)) & 0xc000:
+            if length == 2 and (instruction == 0x9d or instruction == 0x99 or
+                                instruction == 0xbd or instruction == 0xb9):
+                entry = self.Idiom(pc, entry) or entry
+
+            self.__Decoded[pc] = entry
+            self.__Mapped[(pc >> 14) & 1][0][pc] = entry
+
+        return entry
+
+    # Loops clearing or copying memory, run as one slice operation instead of pass by pass:
+    #   fill    STA base,X / INX / BNE fill
+    #   copy    LDA from,X / STA to,X / INX / BNE copy
+    # with X or Y, counting up or down. The first instruction is decoded to an entry whose handler
+    # runs the whole loop (see __Idiom()), or only that instruction when it cannot.
+    # Returns the entry, or None when pc does not start an idiom.
+    def Idiom(self, pc, entry):
+        handler, mode, data, size, cycles, instruction = entry
+        loop = [entry]
+        address = pc + size
+
+        while len(loop) < 4 and not (address ^ pc) & 0xc000:
+            loop.append(self.Decode(address))
+            address += loop[-1][3]
+
+        names = [step[0].__name__ for step in loop]
+        register = mode.__name__[-1]
+
+        if names[:3] == ['STA', 'IN' + register, 'BNE'] or names[:3] == ['STA', 'DE' + register, 'BNE']:
+            loop = loop[:3]
+            source = None
+        elif (names == ['LDA', 'STA', 'IN' + register, 'BNE'] or names == ['LDA', 'STA', 'DE' + register, 'BNE']) \
+                and loop[1][1].__name__ == mode.__name__[4:]:
+            source = data
         else:
-            self.N = False
-
-    def BCC(self, instruction):
-        # Relative
-        if instruction == OpCode.op_bcc[0]:
-            data = self.FetchData(1)
-            
-            if self.C == False:
-                self.Branch(data)
-
-            print('BCC : ' + instruction + ' ' + data)
-
-    def BCS(self, instruction):
-        if instruction == OpCode.op_bcs[0]:
-            data = self.FetchData(1)
-
-            if self.C == True:
-                self.Branch(data)
-            
-            print('BCS : ' + instruction + ' ' + data)
-
-    def BEQ(self, instruction):
-        if instruction == OpCode.op_beq[0]:
-            data = self.FetchData(1)
-
-            if self.Z == True:
-                self.Branch(data)
-            
-            print('BEQ : ' + instruction + ' ' + data)
-
-    # TODO
-    def BIT(self, instruction):
-        if instruction == OpCode.op_bit[0]:
-            data = self.FetchData(1)
-            print('BIT : ' + instruction + ' ' + data)
-        elif instruction == OpCode.op_bit[1]:
-            data = self.FetchData(2)
-            print('BIT : ' + instruction + ' ' + data)
-
-    def BMI(self, instruction):
-        if instruction == OpCode.op_bmi[0]:
-            data = self.FetchData(1)
-
-            if self.N == True:
-                self.Branch(data)
-            
-            print('BMI : ' + instruction + ' ' + data)
-
-    def BNE(self, instruction):
-        if instruction == OpCode.op_bne[0]:
-            data = self.FetchData(1)
-
-            if self.Z == False:
-                self.Branch(data)
-            
-            print('BNE : ' + instruction + ' ' + data)
-
-    def BPL(self, instruction):
-        if instruction == OpCode.op_bpl[0]:
-            data = self.FetchData(1)
-
-            if self.N == False:
-                self.Branch(data)
-            
-            print('BPL : ' + instruction + ' ' + data)
-
-    # TODO
-    def BRK(self, instruction):
-        if instruction == OpCode.op_brk[0]:
-            print('BRK : ' + instruction)
-
-    def BVC(self, instruction):
-        if instruction == OpCode.op_bvc[0]:
-            data = self.FetchData(1)
-
-            if self.V == False:
-                self.Branch(data)
-            
-            print('BVC : ' + instruction + ' ' + data)
-
-    def BVS(self, instruction):
-        if instruction == OpCode.op_bvs[0]:
-            data = self.FetchData(1)
-
-            if self.V == True:
-                self.Branch(data)
-            
-            print('BVS : ' + instruction + ' ' + data)
-
-    def CLC(self, instruction):
-        if instruction == OpCode.op_clc[0]:
-
-            self.C = False
-
-            print('CLC : ' + instruction)
-
-    def CLD(self, instruction):
-        if instruction == OpCode.op_cld[0]:
-
-            self.D = False
-
-            print('CLD : ' + instruction)
-
-    # TODO
-    def CLI(self, instruction):
-        if instruction == OpCode.op_cli[0]:
-            print('CLI : ' + instruction)
+            return None
 
-    def CLV(self, instruction):
-        if instruction == OpCode.op_clv[0]:
+        store = loop[-3][2]
+        up = names[len(loop) - 2][:2] == 'IN'
 
-            self.V = False
+        # Only RAM and cartridge memory can be gone through at once (see Bus.Span())
+        if not (store + 0xff < 0x2000 or 0x6000 <= store <= 0x7f00):
+            return None
 
-            print('CLV : ' + instruction)
+        if source is not None and not (source + 0xff < 0x2000 or source >= 0x6000):
+            return None
+        next = (pc + sum(step[3] for step in loop)) & 0xffff
+        branch = loop[-1][2]
 
-    def CMP(self, instruction):
-        value = 0
+        # Back to the first instruction
+        if (next + branch - (branch & 0x80) * 2) & 0xffff != pc:
+            return None
 
-        # Immediate
-        if instruction == OpCode.op_cmp[0]:
-            data = self.FetchData(1)
+        # Cycles of a pass without the branch taken, and what taking it adds
+        period = sum(step[4] for step in loop)
+        taken = 2 if (next ^ pc) & 0xff00 else 1
 
-            value = int(data, 16)
-            if value > 127:
-                value -= 256
+        def Idiom(mode, data):
+            if not self.__Idiom(register, up, store, source, len(loop), next, period, taken, cycles):
+                handler(mode, data)
 
-            print('CMP : ' + instruction + ' ' + data)
+        return (Idiom, mode, data, size, cycles, instruction)
 
-        # Zero Page
-        elif instruction == OpCode.op_cmp[1]:
-            data = self.FetchData(1)
+    # Run a loop idiom to its end, when it stays within plain memory and the budgets of run().
+    # The passes go over index, index + 1, ... 255 counting up and index, index - 1, ... 1 counting down,
+    # covering one range of addresses either way. first is the cycles of the first instruction, already counted.
+    def __Idiom(self, register, up, store, source, length, next, period, taken, first):
+        index = self.__X if register == 'X' else self.__Y
 
-            value = self.__Ram[int(data, 16)]
-
-            print('CMP : ' + instruction + ' ' + data)
-
-        # Zero Page, X
-        elif instruction == OpCode.op_cmp[2]:
-            data = self.FetchData(1)
-
-            tmp = self.__X
-            if tmp < 0:
-                tmp += 256
-
-            value = self.__Ram[int(data, 16) + tmp]
-
-            print('CMP : ' + instruction + ' ' + data)
-
-        # Absolute
-        elif instruction == OpCode.op_cmp[3]:
-            data = self.FetchData(2)
-            value = self.ReadData(data)
-
-            print('CMP : ' + instruction + ' ' + data)
-
-        # Absolute, X
-        elif instruction == OpCode.op_cmp[4]:
-            data = self.FetchData(2)
-            value = self.AbsoluteX(data)
-
-            print('CMP : ' + instruction + ' ' + data)
-
-        # Absolute, Y
-        elif instruction == OpCode.op_cmp[5]:
-            data = self.FetchData(2)
-            value = self.AbsoluteY(data)
-
-            print('CMP : ' + instruction + ' ' + data)
-
-        # Indirect, X
-        elif instruction == OpCode.op_cmp[6]:
-            data = self.FetchData(1)
-            value = self.IndirectX(data)
-
-            print('CMP : ' + instruction + ' ' + data)
-
-        # Indirect, Y
-        elif instruction == OpCode.op_cmp[7]:
-            data = self.FetchData(1)
-            value = self.IndirectY(data)
-
-            print('CMP : ' + instruction + ' ' + data)
-
-        if self.__A >= value:
-            self.C = True
+        if up:
+            indices = range(index, 256)
         else:
-            self.C = False
+            indices = range(1, index + 1) if index else range(256)
 
-        if self.__A == value:
-            self.Z = True
-        else:
-            self.Z = False
+        count = len(indices)
+        cycles = count * period + (count - 1) * taken - first
 
-    def CPX(self, instruction):
-        value = 0
+        # Reads crossing a page take a cycle more
+        if source is not None and source & 0xff:
+            cycles += len(range(max(indices.start, 256 - (source & 0xff)), indices.stop))
 
-        # Immediate
-        if instruction == OpCode.op_cpx[0]:
-            data = self.FetchData(1)
-            
-            value = int(data, 16)
-            if value > 127:
-                value -= 256
+        if count * length - 1 > self.__Left or self.Cycles + cycles > self.Events.Next:
+            return False
 
-            print('CPX : ' + instruction + ' ' + data)
+        bus = self.Bus
+        target = bus.Span(store + indices.start, count)
 
-        # Zero Page
-        elif instruction == OpCode.op_cpx[1]:
-            data = self.FetchData(1)
-            value = self.__Ram[int(data, 16)]
+        if target is None or target[2] is None:
+            return False
 
-            print('CPX : ' + instruction + ' ' + data)
+        memory, offset, pages = target
 
-        # Absolute
-        elif instruction == OpCode.op_cpx[2]:
-            data = self.FetchData(2)
-            value = self.ReadData(data)
-
-            print('CPX : ' + instruction + ' ' + data)
-
-        if self.__X >= value:
-            self.C = True
+        if source is None:
+            memory[offset:offset + count] = bytes((self.__A,)) * count
         else:
-            self.C = False
-
-        if self.__X == value:
-            self.Z = True
-        else:
-            self.Z = False
-
-    def CPY(self, instruction):
-        value = 0
+            span = bus.Span(source + indices.start, count)
 
-        # Immediate
-        if instruction == OpCode.op_cpy[0]:
-            data = self.FetchData(1)
-            
-            value = int(data, 16)
-            if value > 127:
-                value -= 256
+            if span is None:
+                return False
 
-            print('CPY : ' + instruction + ' ' + data)
+            buffer, position, ignored = span
 
-        # Zero Page
-        elif instruction == OpCode.op_cpy[1]:
-            data = self.FetchData(1)
-            value = self.__Ram[int(data, 16)]
+            # Overlapping, the result would depend on the order of the passes
+            if buffer is memory and position < offset + count and offset < position + count:
+                return False
 
-            print('CPY : ' + instruction + ' ' + data)
+            memory[offset:offset + count] = buffer[position:position + count]
+            # The last pass reads index 255 counting up and index 1 counting down, even when starting from 0
+            self.__A = buffer[position + count - 1] if up else buffer[position + 1 - indices.start]
 
-        # Absolute
-        elif instruction == OpCode.op_cpy[2]:
-            data = self.FetchData(2)
-            value = self.ReadData(data)
+        for page in pages:
+            bus.Dirty[page] = 1
 
-            print('CPY : ' + instruction + ' ' + data)
-
-        if self.__Y >= value:
-            self.C = True
-        else:
-            self.C = False
-
-        if self.__Y == value:
-            self.Z = True
+        if register == 'X':
+            self.__X = 0
         else:
-            self.Z = False
-
-    def DEC(self, instruction):
-        # Zero Page
-        if instruction == OpCode.op_dec[0]:
-            data = self.FetchData(1)
-
-            if self.__Ram[int(data, 16)] == -128:
-                self.__Ram[int(data, 16)] = 127
-            else:
-                self.__Ram[int(data, 16)] -= 1
-
-            if self.__Ram[int(data, 16)] == 0:
-                self.Z = True
-            else:
-                self.Z = False
-            
-            if self.__Ram[int(data, 16)] < 0:
-                self.N = True
-            else:
-                self.N = False
-            
-            print('DEC : ' + instruction + ' ' + data)
-
-        # Zero Page, X
-        elif instruction == OpCode.op_dec[1]:
-            data = self.FetchData(1)
-
-            tmp = self.__X
-            if tmp < 0:
-                tmp += 256
-
-            index = int(data, 16) + tmp
-
-            if self.__Ram[index] == -128:
-                self.__Ram[index] = 127
-            else:
-                self.__Ram[index] -= 1
-
-            if self.__Ram[index] == 0:
-                self.Z = True
-            else:
-                self.Z = False
-
-            if self.__Ram[index] < 0:
-                self.N = True
-            else:
-                self.N = False
-            
-            print('DEC : ' + instruction + ' ' + data)
-
-        # Absolute
-        elif instruction == OpCode.op_dec[2]:
-            data = self.FetchData(2)
-
-            if self.__Ram[int(data, 16)] == -128:
-                self.__Ram[int(data, 16)] = 127
-            else:
-                self.__Ram[int(data, 16)] -= 1
-
-            if self.__Ram[int(data, 16)] == 0:
-                self.Z = True
-            else:
-                self.Z = False
-
-            if self.__Ram[int(data, 16)] < 0:
-                self.N = True
-            else:
-                self.N = False
-            
-            print('DEC : ' + instruction + ' ' + data)
-
-        # Absolute, X
-        elif instruction == OpCode.op_dec[3]:
-            data = self.FetchData(2)
-            tmp = 0
-
-            if self.__X < 0:
-                tmp = self.__X + 256
-            else:
-                tmp = self.__X
-
-            index = int(data, 16) + tmp
-
-            if self.__Ram[index] == -128:
-                self.__Ram[index] = 127
-            else:
-                self.__Ram[index] -= 1
-
-            if self.__Ram[index] == 0:
-                self.Z = True
-            else:
-                self.Z = False
-
-            if self.__Ram[index] < 0:
-                self.N = True
-            else:
-                self.N = False
-            
-            print('DEC : ' + instruction + ' ' + data)
-
-    def DEX(self, instruction):
-        if instruction == OpCode.op_dex[0]:
-            if self.__X == -128:
-                self.__X = 127
-            else:
-                self.__X -= 1
-
-            if self.__X == 0:
-                self.Z = True
-            else:
-                self.Z = False
-
-            if self.__X < 0:
-                self.N = True
-            else:
-                self.N = False
-            
-            print('DEX : ' + instruction)
-
-    def DEY(self, instruction):
-        if instruction == OpCode.op_dey[0]:
-            if self.__Y == -128:
-                self.__Y = 127
-            else:
-                self.__Y -= 1
-
-            if self.__Y == 0:
-                self.Z = True
-            else:
-                self.Z = False
-
-            if self.__Y < 0:
-                self.N = True
-            else:
-                self.N = False
-            
-            print('DEY : ' + instruction)
-
-    def EOR(self, instruction):
-        # Immediate
-        if instruction == OpCode.op_eor[0]:
-            data = self.FetchData(1)
-
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
-
-            tmp ^= int(data, 16)
-
-            if tmp > 127:
-                tmp -= 256
-
-            self.__A = tmp
-
-            print('EOR : ' + instruction + ' ' + data)
-
-        # Zero Page
-        elif instruction == OpCode.op_eor[1]:
-            data = self.FetchData(1)
-
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
-
-            value = self.__Ram[int(data, 16)]
-            if value < 0:
-                value += 256
-
-            value ^= tmp
-
-            if value > 127:
-                value -= 256
-
-            self.__A = value
-            
-            print('EOR : ' + instruction + ' ' + data)
-
-        # Zero Page, X
-        elif instruction == OpCode.op_eor[2]:
-            data = self.FetchData(1)
-
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
-
-            x = self.__X
-            if x < 0:
-                x += 256
-
-            value = self.__Ram[int(data, 16) + x]
-            if value < 0:
-                value += 256
-
-            value ^= tmp
-
-            if value > 127:
-                value -= 256
+            self.__Y = 0
 
-            self.__A = value
-
-            print('EOR : ' + instruction + ' ' + data)
-
-        # Absolute
-        elif instruction == OpCode.op_eor[3]:
-            data = self.FetchData(2)
-            value = self.ReadData(data)
-            tmp = 0
+        # Left by the increment or decrement reaching 0
+        self.P = self.P & 0x7d | Zero
+        self.__PC = next
+        self.Cycles += cycles
 
-            if self.__A < 0:
-                tmp = self.__A + 256
-            else:
-                tmp = self.__A
+        self.__Left -= count * length - 1
+        self.__Extra += count * length - 1
 
-            if value < 0:
-                value += 256
-            
-            value ^= tmp
+        # The chunk was sized for the cycles before the loop, so end it here like an event would
+        self.Events.Due(self.Cycles)
 
-            if value > 127:
-                value -= 256
+        return True
 
-            self.__A = value
-
-            print('EOR : ' + instruction + ' ' + data)
+    # Called by the mapper when bank is switched into PRG window 0 ($8000) or 1 ($C000).
+    def Switch(self, window, bank):
+        old = self.__Mapped[window]
 
-        # Absolute, X
-        elif instruction == OpCode.op_eor[4]:
-            data = self.FetchData(2)
-            value = self.AbsoluteX(data)
-            tmp = 0
+        if old is not None:
+            for pc in old[0]:
+                del self.__Decoded[pc]
 
-            if self.__A < 0:
-                tmp = self.__A + 256
-            else:
-                tmp = self.__A
+            if self.__Blocks is not None:
+                for pc in old[1]:
+                    del self.__Blocks[pc]
 
-            if value < 0:
-                value += 256
-            
-            value ^= tmp
+        new = self.__Banks.setdefault((window, bank), ({}, {}))
+        self.__Through = range(0)
 
-            if value > 127:
-                value -= 256
+        self.__Decoded.update(new[0])
 
-            self.__A = value
+        if self.__Blocks is not None:
+            self.__Blocks.update(new[1])
 
-            print('EOR : ' + instruction + ' ' + data)
+        self.__Mapped[window] = new
 
-        # Absolute, Y
-        elif instruction == OpCode.op_eor[5]:
-            data = self.FetchData(2)
-            value = self.AbsoluteY(data)
-            tmp = 0
-
-            if self.__A < 0:
-                tmp = self.__A + 256
-            else:
-                tmp = self.__A
-
-            if value < 0:
-                value += 256
-            
-            value ^= tmp
-
-            if value > 127:
-                value -= 256
-
-            self.__A = value
+    # Run until one of the budgets is used up and return a Stop.
+    #   max_instructions:   number of instructions to execute
+    #   max_cycles:         number of clock cycles to execute, may overshoot by the last instruction
+    #   until_pc:           stop once the PC reaches this address
+    #   deadline:           wall-clock seconds, checked between chunks of instructions
+    # Without any budget it runs until interrupted.
+    def run(self, max_instructions = None, max_cycles = None, until_pc = None, deadline = None):
+        trace = self.Trace
 
-            print('EOR : ' + instruction + ' ' + data)
-
-        # Indirect, X
-        elif instruction == OpCode.op_eor[6]:
-            data = self.FetchData(1)
-
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
-
-            value = self.IndirectX(data)
-            if value < 0:
-                value += 256
-
-            value ^= tmp
-
-            if value > 127:
-                value -= 256
-
-            self.__A = value
-
-            print('EOR : ' + instruction + ' ' + data)
-
-        # Indirect, Y
-        elif instruction == OpCode.op_eor[7]:
-            data = self.FetchData(1)
-
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
-
-            value = self.IndirectY(data)
-            if value < 0:
-                value += 256
-
-            value ^= tmp
-
-            if value > 127:
-                value -= 256
-
-            self.__A = value
-
-            print('EOR : ' + instruction + ' ' + data)
-
-        if self.__A == 0:
-            self.Z = True
+        # Blocks run many instructions at once, so tracing always interprets
+        if self.__Blocks is not None and trace is None:
+            engine = self.__Execute
         else:
-            self.Z = False
+            engine = self.__Interpret
 
-        if self.__A < 0:
-            self.N = True
-        else:
-            self.N = False
-
-    def INC(self, instruction):
-        # Zero Page
-        if instruction == OpCode.op_inc[0]:
-            data = self.FetchData(1)
-
-            if self.__Ram[int(data)] == 127:
-                self.__Ram[int(data)] = -128
-            else:
-                self.__Ram[int(data)] += 1
-
-            if self.__Ram[int(data)] == 0:
-                self.Z = True
-            else:
-                self.Z = False
-
-            if self.__Ram[int(data)] < 0:
-                self.N = True
-            else:
-                self.N = False
-
-            print('INC : ' + instruction + ' ' + data)
-
-        # Zero Page, X
-        elif instruction == OpCode.op_inc[1]:
-            data = self.FetchData(1)
-
-            x = self.__X
-            if x < 0:
-                x += 256
-
-            index = int(data, 16) + x
-
-            if self.__Ram[index] == 127:
-                self.__Ram[index] = -128
-            else:
-                self.__Ram[index] += 1
-
-            if self.__Ram[index] == 0:
-                self.Z = True
-            else:
-                self.Z = False
-
-            if self.__Ram[index] < 0:
-                self.N = True
-            else:
-                self.N = False
-            
-            print('INC : ' + instruction + ' ' + data)
-
-        # Absolute
-        elif instruction == OpCode.op_inc[2]:
-            data = self.FetchData(2)
-
-            if self.__Ram[int(data)] == 127:
-                self.__Ram[int(data)] = -128
-            else:
-                self.__Ram[int(data)] += 1
-
-            if self.__Ram[int(data)] == 0:
-                self.Z = True
-            else:
-                self.Z = False
-
-            if self.__Ram[int(data)] < 0:
-                self.N = True
-            else:
-                self.N = False
-                        
-            print('INC : ' + instruction + ' ' + data)
-        
-        # Absolute, X
-        elif instruction == OpCode.op_inc[3]:
-            data = self.FetchData(2)
-            tmp = 0
-
-            if self.__X < 0:
-                tmp = self.__X + 256
-            else:
-                tmp = self
-
-            index = int(data, 16) + tmp
-
-            if self.__Ram[index] == 127:
-                self.__Ram[index] = -128
-            else:
-                self.__Ram[index] += 1
-
-            if self.__Ram[index] == 0:
-                self.Z = True
-            else:
-                self.Z = False
-
-            if self.__Ram[index] < 0:
-                self.N = True
-            else:
-                self.N = False
-            
-            print('INC : ' + instruction + ' ' + data)
-
-    def INX(self, instruction):
-        if instruction == OpCode.op_inx[0]:
-
-            if self.__X == 127:
-                self.__X = -128
-            else:
-                self.__X += 1
-
-            if self.__X == 0:
-                self.Z = True
-            else:
-                self.Z = False
-
-            if self.__X < 0:
-                self.N = True
-            else:
-                self.N = False
-
-            print('INX : ' + instruction)
-
-    def INY(self, instruction):
-        if instruction == OpCode.op_iny[0]:
-
-            if self.__Y == 127:
-                self.__Y = -128
-            else:
-                self.__Y += 1
-
-            if self.__Y == 0:
-                self.Z = True
-            else:
-                self.Z = False
-
-            if self.__Y < 0:
-                self.N = True
-            else:
-                self.N = False
-
-            print('INY : ' + instruction)
-
-    def JMP(self, instruction):
-        # Absolute
-        if instruction == OpCode.op_jmp[0]:
-            data = self.FetchData(2)
-            self.__PC = int(data, 16) - 32768
-
-            print('JMP : ' + instruction + ' ' + data)
-
-        # Indirect
-        elif instruction == OpCode.op_jmp[1]:
-            data = self.FetchData(2)
-            self.__PC = self.Indirect(data)
-            print('JMP : ' + instruction + ' ' + data)
-
-    def JSR(self, instruction):
-        # Absolute
-        if instruction == OpCode.op_jsr[0]:
-            data = self.FetchData(2)
-
-            self.__S.append(self.__PC)
-            self.__PC = int(data, 16) - 32768
-
-            print('JSR : ' + instruction + ' ' + data)
-
-    def LDA(self, instruction):
-        # Absolute
-        if instruction == OpCode.op_lda[0]:
-            data = self.FetchData(1)
-            value = int(data, 16)
-
-            if value > 127:
-                value -= 256
+        if until_pc is None:
+            until_pc = -1
 
-            self.__A = value
+        start = time.perf_counter()
 
-            print('LDA : ' + instruction + ' ' + data)
+        if deadline is not None:
+            deadline += start
 
-        # Zero Page
-        elif instruction == OpCode.op_lda[1]:
-            data = self.FetchData(1)
+        events = self.Events
 
-            self.__A = self.__Ram[int(data, 16)]
+        # An event without callback, so no instruction runs past it
+        if max_cycles is not None:
+            max_cycles += self.Cycles
+            stop = events.Add(max_cycles, None)
 
-            print('LDA : ' + instruction + ' ' + data)
+        first = self.Cycles
+        count = 0
+        reason = None
 
-        # Zero Page, X
-        elif instruction == OpCode.op_lda[2]:
-            data = self.FetchData(1)
+        # Loops may be skipped or run at once (see Loop() and Idiom()) unless every instruction is watched,
+        # by the trace or for until_pc.
+        fast = trace is None and until_pc < 0
+        idle = fast and self.SkipIdle
 
-            self.__A = self.ZeroPageX(data)
+        try:
+            while reason is None:
+                if max_instructions is not None and count >= max_instructions:
+                    reason = 'instructions'
+                    break
 
-            print('LDA : ' + instruction + ' ' + data)
+                if max_cycles is not None and self.Cycles >= max_cycles:
+                    reason = 'cycles'
+                    break
 
-        # Absolute
-        elif instruction == OpCode.op_lda[3]:
-            data = self.FetchData(2)
+                if self.Cycles >= events.Next:
+                    events.Run(self.Cycles)
 
-            self.__A = self.ReadData(data)
+                # Spinning in a loop only an event can end, jump to the event or the end of the budget.
+                # This comes right after the events, as they often end one loop and start the next.
+                if idle:
+                    left = Never if max_instructions is None else max_instructions - count
 
-            print('LDA : ' + instruction + ' ' + data)
+                    if events.Next < Never or left < Never:
+                        executed, skipped = self.__Idle(events.Next, left)
+                        count += executed
 
-        # Absolute, X
-        elif instruction == OpCode.op_lda[4]:
-            data = self.FetchData(2)
+                        # Back to the budgets and events, when passes were skipped or the passes run made an event due
+                        if skipped or executed and self.Cycles >= events.Next:
+                            continue
 
-            self.__A = self.AbsoluteX(data)
+                if max_instructions is None:
+                    chunk = self.Chunk
+                else:
+                    chunk = min(max_instructions - count, self.Chunk)
 
-            print('LDA : ' + instruction + ' ' + data)
+                # No instruction takes more than 8 cycles, so this many can run without passing the next event
+                chunk = max(min(chunk, (events.Next - self.Cycles) >> 3), 1)
 
-        # Absolute, Y
-        elif instruction == OpCode.op_lda[5]:
-            data = self.FetchData(2)
+                # Instructions loop idioms may run on top of the chunk
+                if fast:
+                    self.__Left = (Never if max_instructions is None else max_instructions - count) - chunk
 
-            self.__A = self.AbsoluteY(data)
+                executed, hit = engine(chunk, until_pc)
+                count += executed + self.__Extra
+                self.__Extra = 0
 
-            print('LDA : ' + instruction + ' ' + data)
+                if hit:
+                    reason = 'pc'
+                    break
 
-        # Indirect, X
-        elif instruction == OpCode.op_lda[6]:
-            data = self.FetchData(1)
+                if deadline is not None and time.perf_counter() >= deadline:
+                    reason = 'deadline'
+        finally:
+            self.__Left = 0
 
-            self.__A = self.IndirectX(data)
+            if max_cycles is not None:
+                events.Cancel(stop)
 
-            print('LDA : ' + instruction + ' ' + data)
+            if trace is not None:
+                trace.Flush()
 
-        # Indirect, Y
-        elif instruction == OpCode.op_lda[7]:
-            data = self.FetchData(1)
+        return Stop(reason, count, self.Cycles - first, self.__PC, time.perf_counter() - start)
 
-            self.__A = self.IndirectY(data)
+    # Number of instructions between two wall-clock checks in run()
+    Chunk = 4096
 
-            print('LDA : ' + instruction + ' ' + data)
+    # Execute a single instruction.
+    def step(self):
+        return self.run(max_instructions=1)
 
-        if self.__A == 0:
-            self.Z = True
-        else:
-            self.Z = False
+    # Instructions an idle loop may be made of, besides the JMP or branch back to its start.
+    # They only read registers and memory, so if a pass leaves the registers as they were,
+    # every following pass does the same until an event changes something.
+    Idle = Reads + ('CLC', 'CLD', 'CLV', 'NOP', 'SEC', 'SED', 'TAX', 'TAY', 'TSX', 'TXA', 'TYA')
 
-        if self.__A < 0:
-            self.N = True
-        else:
-            self.N = False
+    # Find the idle loop pc is in, e.g. JMP to itself or LDA $2002 / BPL polling for vblank.
+    # Returns (start, instructions per pass), or None when pc is not in one.
+    def Loop(self, pc):
+        decoded = self.__Decoded
+        address = pc
+        start = None
 
-    def LDX(self, instruction):
-        # Immediate
-        if instruction == OpCode.op_ldx[0]:
-            data = self.FetchData(1)
+        # Look ahead for the jump back
+        for i in range(self.LoopLength):
+            entry = decoded.get(address) or self.Decode(address)
+            handler, mode, data, size, cycles, instruction = entry
+            name = handler.__name__
 
-            value = int(data, 16)
-            if value > 127:
-                value -= 256
+            if name == 'JMP' and mode.__name__ == 'Absolute':
+                start = data
+                break
 
-            self.__X = value
+            if mode is not None and mode.__name__ == 'Relative':
+                start = (address + 2 + data - (data & 0x80) * 2) & 0xffff
+                break
 
-            print('LDX : ' + instruction + ' ' + data)
+            if not self.Quiet(entry):
+                return None
 
-        # Zero Page
-        elif instruction == OpCode.op_ldx[1]:
-            data = self.FetchData(1)
+            address = (address + size) & 0xffff
 
-            self.__X = self.__Ram[int(data, 16)]
+        if start is None or not start <= pc <= address:
+            return None
 
-            print('LDX : ' + instruction + ' ' + data)
+        # Then check the instructions from the start, which must lead to pc and the jump
+        end = address
+        address = start
+        found = False
 
-        # Zero Page, Y
-        elif instruction == OpCode.op_ldx[2]:
-            data = self.FetchData(1)
+        for i in range(self.LoopLength):
+            found |= address == pc
 
-            self.__X = self.ZeroPageY(data)
+            if address == end:
+                return (start, i + 1) if found else None
 
-            print('LDX : ' + instruction + ' ' + data)
+            entry = decoded.get(address) or self.Decode(address)
 
-        # Absolute
-        elif instruction == OpCode.op_ldx[3]:
-            data = self.FetchData(2)
+            if not self.Quiet(entry):
+                return None
 
-            self.__X = self.ReadData(data)
+            address = (address + entry[3]) & 0xffff
 
-            print('LDX : ' + instruction + ' ' + data)
+        return None
 
-        # Absolute, Y
-        elif instruction == OpCode.op_ldx[4]:
-            data = self.FetchData(2)
+    # Most instructions in an idle loop
+    LoopLength = 8
 
-            self._X = self.AbsoluteY(data)
+    # Whether an instruction is one of Idle, reading only memory that changes from events:
+    # RAM, PPU status and cartridge memory. Reading other PPU and I/O registers has side effects.
+    def Quiet(self, entry):
+        handler, mode, data, size, cycles, instruction = entry
 
-            print('LDX : ' + instruction + ' ' + data)
+        if handler.__name__ not in self.Idle:
+            return False
 
-        if self.__X == 0:
-            self.Z = True
-        else:
-            self.Z = False
+        if mode is None:
+            return True
 
-        if self.__X < 0:
-            self.N = True
-        else:
-            self.N = False
+        name = mode.__name__
 
-    def LDY(self, instruction):
-        # Immediate
-        if instruction == OpCode.op_ldy[0]:
-            data = self.FetchData(1)
+        if name in ('ReadImmediate', 'ReadZeroPage', 'ReadZeroPageX', 'ReadZeroPageY'):
+            return True
 
-            value = int(data, 16)
-            if value > 127:
-                value -= 256
+        if name == 'ReadAbsolute':
+            return data < 0x2000 or data >= 0x6000 or (data < 0x4000 and data & 7 == 2)
 
-            self.__Y = value
+        # Whatever the index, the address must be in RAM or cartridge memory
+        if name in ('ReadAbsoluteX', 'ReadAbsoluteY'):
+            return data + 0xff < 0x2000 or data >= 0x6000
 
-            print('LDY : ' + instruction + ' ' + data)
+        return False
 
-        # Zero Page
-        elif instruction == OpCode.op_ldy[1]:
-            data = self.FetchData(1)
+    # Skip whole passes of the idle loop the PC is in, as long as they end before the cycle until
+    # and within the given number of instructions. Cycles stay exact, as every pass takes the same time.
+    # A pass is run (up to three, to get to the start first and to settle) to check that it changes nothing.
+    # Returns the number of instructions run and skipped, and whether any pass was skipped.
+    def __Idle(self, until, instructions):
+        if until - self.Cycles < 256 or instructions < 32:
+            return 0, False
 
-            self.__Y = self.__Ram[int(data, 16)]
+        loop = self.Loop(self.__PC)
 
-            print('LDY : ' + instruction + ' ' + data)
+        if loop is None:
+            return 0, False
 
-        # Zero Page, X
-        elif instruction == OpCode.op_ldy[2]:
-            data = self.FetchData(1)
+        start, length = loop
+        executed = 0
 
-            self.__Y = self.ZeroPageX(data)
+        if self.__PC != start:
+            executed, hit = self.__Interpret(length, start)
 
-            print('LDY : ' + instruction + ' ' + data)
+            if not hit:
+                return executed, False
 
-        # Absolute
-        elif instruction == OpCode.op_ldy[3]:
-            data = self.FetchData(2)
+        # The first pass may still change something left by the code before the loop, e.g. flags
+        for check in range(2):
+            registers = self.__A, self.__X, self.__Y, self.__S, self.P
+            first = self.Cycles
 
-            self.__Y = self.ReadData(data)
+            count, hit = self.__Interpret(length, start)
+            executed += count
 
-            print('LDY : ' + instruction + ' ' + data)
+            if not hit or count != length:
+                return executed, False
 
-        # Absolute, X
-        elif instruction == OpCode.op_ldy[4]:
-            data = self.FetchData(2)
-
-            self.__Y = self.AbsoluteX(data)
-
-            print('LDY : ' + instruction + ' ' + data)
-
-        if self.__Y == 0:
-            self.Z = True
+            if registers == (self.__A, self.__X, self.__Y, self.__S, self.P):
+                break
         else:
-            self.Z = False
-
-        if self.__Y < 0:
-            self.N = True
-        else:
-            self.N = False
-
-    def LSR(self, instruction):
-        # Accumulate
-        if instruction == OpCode.op_lsr[0]:
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
+            return executed, False
 
-            if tmp % 2 == 0:
-                self.C = False
-            else:
-                self.C = True
+        period = self.Cycles - first
+        passes = min((until - self.Cycles) // period, (instructions - executed) // length)
 
-            tmp >>= 1
+        self.Cycles += passes * period
 
-            if tmp > 127:
-                tmp -= 256
+        return executed + passes * length, passes > 0
 
-            self.__A = tmp
+    # Interpret up to chunk instructions, one at a time.
+    # Returns the number executed and whether the PC reached until_pc.
+    # Stops early when an instruction makes an event due, e.g. by requesting an NMI.
+    def __Interpret(self, chunk, until_pc):
+        decoded = self.__Decoded
+        events = self.Events
+        trace = self.Trace
 
-            print('LSR : ' + instruction)
+        for i in range(chunk):
+            pc = self.__PC
+            entry = decoded.get(pc)
 
-        # Zero Page
-        elif instruction == OpCode.op_lsr[1]:
-            data = self.FetchData(1)
-            dec = int(data, 16)
-            value = self.__Ram[dec]
-            if value < 0:
-                value += 256
+            if entry is None:
+                entry = self.Decode(pc)
 
-            if value % 2 == 0:
-                self.C = False
-            else:
-                self.C = True
+            handler, mode, data, size, cycles, instruction = entry
 
-            value >>= 1
+            self.__PC = (pc + size) & 0xffff
+            self.Cycles += cycles
 
-            if value > 127:
-                value -= 256
+            if trace is not None:
+                trace.Record(pc, instruction, data, self.__A, self.__X, self.__Y)
 
-            self.__Ram[dec] = value
+            handler(mode, data)
 
-            print('LSR : ' + instruction + ' ' + data)
+            if self.__PC == until_pc:
+                return i + 1, True
 
-        # Zero Page, X
-        elif instruction == OpCode.op_lsr[2]:
-            data = self.FetchData(1)
-            value = self.ZeroPageX(data)
-            if value < 0:
-                value += 256
+            if self.Cycles >= events.Next:
+                return i + 1, False
 
-            if value % 2 == 0:
-                self.C = False
-            else:
-                self.C = True
+        return chunk, False
 
-            value >>= 1
+    # Same as __Interpret, but run whole translated blocks where possible.
+    # A block is only entered when it fits in the chunk and until_pc is not inside it.
+    def __Execute(self, chunk, until_pc):
+        blocks = self.__Blocks
+        decoded = self.__Decoded
+        events = self.Events
+        executed = 0
 
-            if value > 127:
-                value -= 256
+        while executed < chunk:
+            pc = self.__PC
+            block = blocks.get(pc)
 
-            x = self.__X
-            if x < 0:
-                x += 256
+            if block is None:
+                block = False
 
-            self.__Ram[int(data, 16) + x] = value
+                # Only ROM is translated; code in RAM may be overwritten at any time.
+                # A block stays within one PRG window, so it belongs to a single bank.
+                # Neither are the addresses of a block being interpreted (see self.__Through).
+                if pc >= 0x8000 and pc not in self.__Through:
+                    block = Translate(self.Decode, pc, self.ReadData, self.WriteData, (pc | 0x3fff) + 1) or False
+                    blocks[pc] = block
+                    self.__Mapped[(pc >> 14) & 1][1][pc] = block
+                    self.__Through = range(0)
 
-            print('LSR : ' + instruction + ' ' + data)
+            if block and executed + block[1] <= chunk and not block[2] < until_pc < block[3]:
+                self.__A, self.__X, self.__Y, self.P, self.__S, self.__PC, cycles, count = block[0](
+                    self.__A, self.__X, self.__Y, self.P, self.__S)
 
-        # Absolute
-        elif instruction == OpCode.op_lsr[3]:
-            data = self.FetchData(2)
-            value = self.ReadData(data)
-            if value < 0:
-                value += 256
+                self.Cycles += cycles
+                executed += count
 
-            if value % 2 == 0:
-                self.C = False
-            else:
-                self.C = True
+                if self.__PC == until_pc:
+                    return executed, True
 
-            value >>= 1
+                if self.Cycles >= events.Next:
+                    return executed, False
 
-            if value > 127:
-                value -= 256
+                if count == block[1]:
+                    continue
 
-            self.__Ram[int(data, 16)] = value
+                # The block left before an access to the I/O registers, which is interpreted next
+                # along with the rest of the block.
+                pc = self.__PC
 
-            print('LSR : ' + instruction + ' ' + data)
+            if block:
+                self.__Through = range(block[2], block[3])
 
-        # Absolute, X
-        elif instruction == OpCode.op_lsr[4]:
-            data = self.FetchData(2)
-            value = self.AbsoluteX(data)
-            if value < 0:
-                value += 256
+            entry = decoded.get(pc)
 
-            if value % 2 == 0:
-                self.C = False
-            else:
-                self.C = True
+            if entry is None:
+                entry = self.Decode(pc)
 
-            value >>= 1
+            handler, mode, data, size, cycles, instruction = entry
 
-            if value > 127:
-                value -= 256
+            self.__PC = (pc + size) & 0xffff
+            self.Cycles += cycles
 
-            x = self.__X
-            if x < 0:
-                x += 256
+            handler(mode, data)
+            executed += 1
 
-            self.__Ram[int(data, 16) + x] = value
+            if self.__PC == until_pc:
+                return executed, True
 
-            print('LSR : ' + instruction + ' ' + data)
+            if self.Cycles >= events.Next:
+                return executed, False
 
-    def NOP(self, instruction):
-        if instruction == OpCode.op_nop[0]:
-            print('NOP : ' + instruction)
+        return executed, False
 
-    def ORA(self, instruction):
-        # Immediate
-        if instruction == OpCode.op_ora[0]:
-            data = self.FetchData(1)
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
+    def Illegal(self, mode, data):
+        print('error')
 
-            tmp |= int(data, 16)
+    def ADC(self, mode, data):
+        value = Add[(self.P & 0x01) << 16 | self.__A << 8 | mode(data)]
 
-            if tmp > 127:
-                tmp -= 256
+        self.__A = value & 0xff
+        self.P = self.P & 0x3c | value >> 8
 
-            self.__A = tmp
+    def AND(self, mode, data):
+        self.__A &= mode(data)
 
-            print('ORA : ' + instruction + ' ' + data)
+        self.P = self.P & 0x7d | NZ[self.__A]
 
-        # Zero Page
-        elif instruction == OpCode.op_ora[1]:
-            data = self.FetchData(1)
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
-
-            value = self.__Ram[int(data, 16)]
-            if value < 0:
-                value += 256
-
-            value |= tmp
+    def ASL(self, mode, data):
+        # Accumulator
+        if mode is None:
+            value = self.__A
+        else:
+            address = mode(data)
+            value = self.ReadData(address)
 
-            if value > 127:
-                value -= 256
+        carry = value >> 7
+        value = (value << 1) & 0xff
 
+        if mode is None:
             self.__A = value
+        else:
+            self.WriteData(address, value)
 
-            print('ORA : ' + instruction + ' ' + data)
-
-        # Zero Page, X
-        elif instruction == OpCode.op_ora[2]:
-            data = self.FetchData(1)
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
+        self.P = self.P & 0x7c | carry | NZ[value]
 
-            value = self.ZeroPageX(data)
-            if value < 0:
-                value += 256
+    def BCC(self, mode, data):
+        if not self.P & 0x01:
+            self.Branch(mode(data))
 
-            value |= tmp
+    def BCS(self, mode, data):
+        if self.P & 0x01:
+            self.Branch(mode(data))
 
-            if value > 127:
-                value -= 256
+    def BEQ(self, mode, data):
+        if self.P & 0x02:
+            self.Branch(mode(data))
 
-            self.__A = value
+    # N and V are bits 7 and 6 of the operand, Z is set when it has none of the bits of A.
+    def BIT(self, mode, data):
+        value = mode(data)
 
-            print('ORA : ' + instruction + ' ' + data)
+        self.P = self.P & 0x3d | (value & 0xc0) | (0 if self.__A & value else Zero)
 
-        # Absolute
-        elif instruction == OpCode.op_ora[3]:
-            data = self.FetchData(2)
-            tmp = 0
+    def BMI(self, mode, data):
+        if self.P & 0x80:
+            self.Branch(mode(data))
 
-            if self.__A < 0:
-                tmp = self.__A + 256
-            else:
-                tmp = self.__A
+    def BNE(self, mode, data):
+        if not self.P & 0x02:
+            self.Branch(mode(data))
 
-            value = self.ReadData(data)
+    def BPL(self, mode, data):
+        if not self.P & 0x80:
+            self.Branch(mode(data))
 
-            if value < 0:
-                value += 256
+    # Software interrupt; the byte after BRK is skipped, so it returns to PC + 2.
+    def BRK(self, mode, data):
+        self.Push((self.__PC + 1) >> 8 & 0xff)
+        self.Push((self.__PC + 1) & 0xff)
+        self.Push(self.P | Break | Unused)
 
-            value |= tmp
+        self.P |= Interrupt
+        self.__PC = self.ReadWord(0xfffe)
 
-            if value > 127:
-                value -= 256
+    def BVC(self, mode, data):
+        if not self.P & 0x40:
+            self.Branch(mode(data))
 
-            self.__A = value
+    def BVS(self, mode, data):
+        if self.P & 0x40:
+            self.Branch(mode(data))
 
-            print('ORA : ' + instruction + ' ' + data)
+    def CLC(self, mode, data):
+        self.P &= ~Carry
 
-        # Absolute, X
-        elif instruction == OpCode.op_ora[4]:
-            data = self.FetchData(2)
-            tmp = self.__A
+    def CLD(self, mode, data):
+        self.P &= ~Decimal
 
-            if tmp < 0:
-                tmp += 256
+    # The 6502 polls for interrupts before the flag changes, so a held IRQ waits one more instruction.
+    def CLI(self, mode, data):
+        self.P &= ~Interrupt
 
-            value = self.AbsoluteX(data)
+        if self.Irq:
+            self.Events.Add(self.Cycles + 1, self.Poll)
 
-            if value < 0:
-                value += 256
+    def CLV(self, mode, data):
+        self.P &= ~Overflow
 
-            value |= tmp
+    def CMP(self, mode, data):
+        self.P = self.P & 0x7c | Compare[self.__A << 8 | mode(data)]
 
-            if value > 127:
-                value -= 256
+    def CPX(self, mode, data):
+        self.P = self.P & 0x7c | Compare[self.__X << 8 | mode(data)]
 
-            self.__A = value
+    def CPY(self, mode, data):
+        self.P = self.P & 0x7c | Compare[self.__Y << 8 | mode(data)]
 
-            print('ORA : ' + instruction + ' ' + data)
+    def DEC(self, mode, data):
+        address = mode(data)
+        value = self.ReadData(address)
 
-        # Absolute, Y
-        elif instruction == OpCode.op_ora[5]:
-            data = self.FetchData(2)
-            tmp = self.__A
+        value = (value - 1) & 0xff
 
-            if tmp < 0:
-                tmp += 256
+        self.WriteData(address, value)
 
-            value = self.AbsoluteY(data)
+        self.P = self.P & 0x7d | NZ[value]
 
-            if value < 0:
-                value += 256
+    def DEX(self, mode, data):
+        self.__X = (self.__X - 1) & 0xff
 
-            value |= tmp
+        self.P = self.P & 0x7d | NZ[self.__X]
 
-            if value > 127:
-                value -= 256
+    def DEY(self, mode, data):
+        self.__Y = (self.__Y - 1) & 0xff
 
-            self.__A = value
+        self.P = self.P & 0x7d | NZ[self.__Y]
 
-            print('ORA : ' + instruction + ' ' + data)
+    def EOR(self, mode, data):
+        self.__A ^= mode(data)
 
-        # Indirect, X
-        elif instruction == OpCode.op_ora[6]:
-            data = self.FetchData(1)
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
+        self.P = self.P & 0x7d | NZ[self.__A]
 
-            value = self.IndirectX(data)
-            if value < 0:
-                value += 256
+    def INC(self, mode, data):
+        address = mode(data)
+        value = self.ReadData(address)
 
-            value |= tmp
+        value = (value + 1) & 0xff
 
-            if value > 127:
-                value -= 256
+        self.WriteData(address, value)
 
-            self.__A = value
+        self.P = self.P & 0x7d | NZ[value]
 
-            print('ORA : ' + instruction + ' ' + data)
+    def INX(self, mode, data):
+        self.__X = (self.__X + 1) & 0xff
 
-        # Indirect, Y
-        elif instruction == OpCode.op_ora[7]:
-            data = self.FetchData(1)
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
+        self.P = self.P & 0x7d | NZ[self.__X]
 
-            value = self.IndirectY(data)
-            if value < 0:
-                value += 256
+    def INY(self, mode, data):
+        self.__Y = (self.__Y + 1) & 0xff
 
-            value |= tmp
+        self.P = self.P & 0x7d | NZ[self.__Y]
 
-            if value > 127:
-                value -= 256
+    def JMP(self, mode, data):
+        self.__PC = mode(data)
 
-            self.__A = value
-
-            print('ORA : ' + instruction + ' ' + data)
+    # The address pushed is that of the last byte of JSR, RTS adds one.
+    def JSR(self, mode, data):
+        self.Push((self.__PC - 1) >> 8 & 0xff)
+        self.Push((self.__PC - 1) & 0xff)
+        self.__PC = mode(data)
 
-        if self.__A == 0:
-            self.Z = True
-        else:
-            self.Z = False
-
-        if self.__A < 0:
-            self.N = True
-        else:
-            self.N = False
+    def LDA(self, mode, data):
+        self.__A = mode(data)
 
-    def PHA(self, instruction):
-        if instruction == OpCode.op_pha[0]:
-            self.__S.append(self.__A)
+        self.P = self.P & 0x7d | NZ[self.__A]
 
-            print('PHA : ' + instruction)
+    def LDX(self, mode, data):
+        self.__X = mode(data)
 
-    # TODO
-    def PHP(self, instruction):
-        if instruction == OpCode.op_php[0]:
-            print('PHP : ' + instruction)
+        self.P = self.P & 0x7d | NZ[self.__X]
 
-    def PLA(self, instruction):
-        if instruction == OpCode.op_pla[0]:
-            self.__A = self.__S.pop()
+    def LDY(self, mode, data):
+        self.__Y = mode(data)
 
-            print('PLA : ' + instruction)
+        self.P = self.P & 0x7d | NZ[self.__Y]
 
-        if self.__A == 0:
-            self.Z = True
-        else:
-            self.Z = False
-
-        if self.__A < 0:
-            self.N = True
-        else:
-            self.N = False
-
-    # TODO
-    def PLP(self, instruction):
-        if instruction == OpCode.op_plp[0]:
-            print('PLP : ' + instruction)
-
-    def ROL(self, instruction):
+    def LSR(self, mode, data):
         # Accumulator
-        if instruction == OpCode.op_rol[0]:
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
-
-            tmp = self.rotl(tmp)
-
-            if tmp > 127:
-                tmp -= 256
-
-            self.__A = tmp
-
-            print('ROL : ' + instruction)
-
-        # Zero Page
-        elif instruction == OpCode.op_rol[1]:
-            data = self.FetchData(1)
-            index = int(data, 16)
-
-            tmp = self.__Ram[index]
-            if tmp < 0:
-                tmp += 256
-
-            tmp = self.rotl(tmp)
-
-            if tmp > 127:
-                tmp -= 256
-
-            self.__Ram[index] = tmp
-
-            print('ROL : ' + instruction + ' ' + data)
-
-        # Zero Page, X
-        elif instruction == OpCode.op_rol[2]:
-            data = self.FetchData(1)
-            x = self.__X
-            if x < 0:
-                x += 256
-
-            index = int(data, 16) + x
-
-            tmp = self.__Ram[index]
-            if tmp < 0:
-                tmp += 256
-
-            tmp = self.rotl(tmp)
-
-            if tmp > 127:
-                tmp -= 256
-
-            self.__Ram[index] = tmp
-
-            print('ROL : ' + instruction + ' ' + data)
-
-        # Absolute
-        elif instruction == OpCode.op_rol[3]:
-            data = self.FetchData(2)
-            value = self.ReadData(data)
-
-            if value < 0:
-                value += 256
-
-            value = self.rotl(value)
-
-            if value > 127:
-                value -= 256
-            
-            self.__Ram[int(data, 16)] = value
-
-            print('ROL : ' + instruction + ' ' + data)
-
-        # Absolute, X
-        elif instruction == OpCode.op_rol[4]:
-            data = self.FetchData(2)
-            tmp = self.__X
-
-            if tmp < 0:
-                tmp += 256
-
-            address = int(data, 16) + tmp
-
-            value = self.__Ram[address]
-
-            if value < 0:
-                value += 256
-
-            value = self.rotl(value)
-
-            if value > 127:
-                value -= 256
-            
-            self.__Ram[address] = value
-
-            print('ROL : ' + instruction + ' ' + data)
-
-        if self.__A == 0:
-            self.Z = True
+        if mode is None:
+            value = self.__A
         else:
-            self.Z = False
-
-        if self.__A < 0:
-            self.N = True
-        else:
-            self.N = False
-
-    def ROR(self, instruction):
-        # Accumulator
-        if instruction == OpCode.op_ror[0]:
-            tmp = self.__A
-            if tmp < 0:
-                tmp += 256
-
-            tmp = self.rotr(tmp)
-
-            if tmp > 127:
-                tmp -= 256
-
-            self.__A = tmp
-
-            print('ROR : ' + instruction)
+            address = mode(data)
+            value = self.ReadData(address)
 
-        # Zero Page
-        elif instruction == OpCode.op_ror[1]:
-            data = self.FetchData(1)
-            index = int(data, 16)
+        carry = value & 1
+        value >>= 1
 
-            tmp = self.__Ram[index]
-            if tmp < 0:
-                tmp += 256
-
-            tmp = self.rotr(tmp)
-
-            if tmp > 127:
-                tmp -= 256
-
-            self.__Ram[index] = tmp
-
-            print('ROR : ' + instruction + ' ' + data)
-
-        # Zero Page, X
-        elif instruction == OpCode.op_ror[2]:
-            data = self.FetchData(1)
-
-            x = self.__X
-            if x < 0:
-                x += 256
-
-            index = int(data, 16) + x
-
-            tmp = self.__Ram[index]
-            if tmp < 0:
-                tmp += 256
-
-            tmp = self.rotr(tmp)
-
-            if tmp > 127:
-                tmp -= 256
-
-            self.__Ram[index] = tmp
-
-            print('ROR : ' + instruction + ' ' + data)
-
-        # Absolute
-        elif instruction == OpCode.op_ror[3]:
-            data = self.FetchData(2)
-            value = self.ReadData(data)
-
-            if value < 0:
-                value += 256
-
-            value = self.rotr(value)
-
-            if value > 127:
-                value -= 256
-            
-            self.__Ram[int(data, 16)] = value
-            
-            print('ROR : ' + instruction + ' ' + data)
-
-        # Absolute, X
-        elif instruction == OpCode.op_ror[4]:
-            data = self.FetchData(2)
-            tmp = self.__X
-
-            if tmp < 0:
-                tmp += 256
-
-            address = int(data, 16) + tmp
-
-            value = self.__Ram[address]
-
-            if value < 0:
-                value += 256
-
-            value = self.rotl(value)
-
-            if value > 127:
-                value -= 256
-            
-            self.__Ram[address] = value
-
-            print('ROR : ' + instruction + ' ' + data)
-
-        if self.__A == 0:
-            self.Z = True
-        else:
-            self.Z = False
-
-        if self.__A < 0:
-            self.N = True
+        if mode is None:
+            self.__A = value
         else:
-            self.N = False
-
-    # TODO
-    def RTI(self, instruction):
-        if instruction == OpCode.op_rti[0]:
-            print('RTI : ' + instruction)
-
-    def RTS(self, instruction):
-        if instruction == OpCode.op_rts[0]:
-            self.__PC = self.__S.pop()
-            
-            print('RTS : ' + instruction)
-
-    def SBC(self, instruction):
-        # Immediate
-        if instruction == OpCode.op_sbc[0]:
-            data = self.FetchData(1)
-            
-            value = int(data, 16)
-            if value > 127:
-                value -= 256
-
-            self.__A -= value
-          
-            print('SBC : ' + instruction + ' ' + data)
-
-        # Zero Page
-        elif instruction == OpCode.op_sbc[1]:
-            data = self.FetchData(1)
-            value = self.ReadData(data)
+            self.WriteData(address, value)
 
-            self.__A -= value
+        self.P = self.P & 0x7c | carry | NZ[value]
 
-            print('SBC : ' + instruction + ' ' + data)
+    def NOP(self, mode, data):
+        pass
 
-        # Zero Page, X
-        elif instruction == OpCode.op_sbc[2]:
-            data = self.FetchData(1)
-            value = self.ZeroPageX(data)
+    def ORA(self, mode, data):
+        self.__A |= mode(data)
 
-            self.__A -= value
+        self.P = self.P & 0x7d | NZ[self.__A]
 
-            print('SBC : ' + instruction + ' ' + data)
+    def PHA(self, mode, data):
+        self.Push(self.__A)
 
-        # Absolute
-        elif instruction == OpCode.op_sbc[3]:
-            data = self.FetchData(2)
-            value = self.ReadData(data)
+    def PHP(self, mode, data):
+        self.Push(self.P | Break | Unused)
 
-            self.__A -= value
+    def PLA(self, mode, data):
+        self.__A = self.Pull()
 
-            print('SBC : ' + instruction + ' ' + data)
-        
-        # Absolute, X
-        elif instruction == OpCode.op_sbc[4]:
-            data = self.FetchData(2)
-            value = self.AbsoluteX(data)
+        self.P = self.P & 0x7d | NZ[self.__A]
 
-            self.__A -= value
+    # B is not a real flag, so it is dropped when pulled
+    # Like CLI, a held IRQ is taken after the next instruction.
+    def PLP(self, mode, data):
+        self.P = self.Pull() & ~Break | Unused
 
-            print('SBC : ' + instruction + ' ' + data)
+        if self.Irq and not self.P & Interrupt:
+            self.Events.Add(self.Cycles + 1, self.Poll)
 
-        # Absolute, Y
-        elif instruction == OpCode.op_sbc[5]:
-            data = self.FetchData(2)
-            value = self.AbsoluteY(data)
-
-            self.__A -= value
-
-            print('SBC : ' + instruction + ' ' + data)
-
-        # Indirect, X
-        elif instruction == OpCode.op_sbc[6]:
-            data = self.FetchData(1)
-            value = self.IndirectX(data)
-
-            self.__A -= value
-
-            print('SBC : ' + instruction + ' ' + data)
-
-        # Indirect, Y
-        elif instruction == OpCode.op_sbc[7]:
-            data = self.FetchData(1)
-            value = self.IndirectY(data)
-
-            self.__A -= value
-
-            print('SBC : ' + instruction + ' ' + data)
-
-        if self.__A == 0:
-            self.Z = True
+    def ROL(self, mode, data):
+        # Accumulator
+        if mode is None:
+            value = self.__A
         else:
-            self.Z = False
+            address = mode(data)
+            value = self.ReadData(address)
 
-        if self.__A > 255:
-            self.C = False
-            self.V = True
-            self.__A = 255
-        else:
-            self.C = True
-            self.V = False
+        # Through the carry
+        carry = value >> 7
+        value = (value << 1) & 0xff | self.P & Carry
 
-        if self.__A < 0:
-            self.N = True
+        if mode is None:
+            self.__A = value
         else:
-            self.N = False
-
-    def SEC(self, instruction):
-        if instruction == OpCode.op_sec[0]:
-            self.C = True
-
-            print('SEC : ' + instruction)
-
-    def SED(self, instruction):
-        if instruction == OpCode.op_sed[0]:
-            self.D = True
-
-            print('SED : ' + instruction)
-
-    # TODO
-    def SEI(self, instruction):
-        if instruction == OpCode.op_sei[0]:
-            print('SEI : ' + instruction)
-
-    def STA(self, instruction):
-        # Zero Page
-        if instruction == OpCode.op_sta[0]:
-            data = self.FetchData(1)
-
-            self.__Ram[int(data, 16)] = self.__A
-
-            print('STA : ' + instruction + ' ' + data)
-
-        # Zero Page, X
-        elif instruction == OpCode.op_sta[1]:
-            data = self.FetchData(1)
-            x = self.__X
-            if x < 0:
-                x += 256
-
-            self.__Ram[(int(data, 16) + x)] = self.__A
-
-            print('STA : ' + instruction + ' ' + data)
-
-        # Absolute
-        elif instruction == OpCode.op_sta[2]:
-            data = self.FetchData(2)
-
-            self.__Ram[int(data, 16)] = self.__A
-
-            print('STA : ' + instruction + ' ' + data)
-
-        # Absolute, X
-        elif instruction == OpCode.op_sta[3]:
-            data = self.FetchData(2)
-            tmp = self.__X
-
-            if tmp < 0:
-                tmp += 256
-
-            self.__Ram[int(data, 16) + tmp] = self.__A
-
-            print('STA : ' + instruction + ' ' + data)
-
-        # Absolute, Y
-        elif instruction == OpCode.op_sta[4]:
-            data = self.FetchData(2)
-            tmp = self.__Y
-
-            if tmp < 0:
-                tmp += 256
-
-            self.__Ram[int(data, 16) + tmp] = self.__A
+            self.WriteData(address, value)
 
-            print('STA : ' + instruction + ' ' + data)
+        self.P = self.P & 0x7c | carry | NZ[value]
 
-        # Indirect, X
-        elif instruction == OpCode.op_sta[5]:
-            data = self.FetchData(1)
-            x = self.__X
-            if x < 0:
-                x += 256
-
-            address = int(data, 16) + x
-
-            self.__Ram[address] = self.__A
-
-            print('STA : ' + instruction + ' ' + data)
-
-        # Indirect, Y
-        elif instruction == OpCode.op_sta[6]:
-            data = self.FetchData(1)
-            y = self.__Y
-            if y < 0:
-                y += 256
-
-            address = self.ReadData(data) + y
-
-            self.__Ram[address] = self.__A
-
-            print('STA : ' + instruction + ' ' + data)
-
-    def STX(self, instruction):
-        # Zero Page
-        if instruction == OpCode.op_stx[0]:
-            data = self.FetchData(1)
-            self.__Ram[int(data, 16)] = self.__X
-
-            print('STX : ' + instruction + ' ' + data)
-
-        # Zero Page, Y
-        if instruction == OpCode.op_stx[1]:
-            data = self.FetchData(1)
-            y = self.__Y
-            if y < 0:
-                y += 256
-
-            self.__Ram[int(data, 16) + y] = self.__X
-
-            print('STX : ' + instruction + ' ' + data)
-
-        # Absolute
-        if instruction == OpCode.op_stx[2]:
-            data = self.FetchData(2)
-            self.__Ram[int(data, 16)] = self.__X
-
-            print('STX : ' + instruction + ' ' + data)
-
-    def STY(self, instruction):
-        # Zero Page
-        if instruction == OpCode.op_sty[0]:
-            data = self.FetchData(1)
-            self.__Ram[int(data, 16)] = self.__Y
-
-            print('STY : ' + instruction + ' ' + data)
-
-        # Zero Page, X
-        if instruction == OpCode.op_sty[1]:
-            data = self.FetchData(1)
-            x = self.__X
-            if x < 0:
-                x += 256
+    def ROR(self, mode, data):
+        # Accumulator
+        if mode is None:
+            value = self.__A
+        else:
+            address = mode(data)
+            value = self.ReadData(address)
 
-            self.__Ram[int(data, 16) + x] = self.__Y
+        # Through the carry
+        carry = value & 1
+        value = (self.P & Carry) << 7 | value >> 1
 
-            print('STY : ' + instruction + ' ' + data)
+        if mode is None:
+            self.__A = value
+        else:
+            self.WriteData(address, value)
 
-        # Absolute
-        if instruction == OpCode.op_sty[2]:
-            data = self.FetchData(2)
-            self.__Ram[int(data, 16)] = self.__Y
+        self.P = self.P & 0x7c | carry | NZ[value]
 
-            print('STY : ' + instruction + ' ' + data)
+    def RTI(self, mode, data):
+        self.P = self.Pull() & ~Break | Unused
+        self.__PC = self.Pull() | (self.Pull() << 8)
 
-    def TAX(self, instruction):     
-        if instruction == OpCode.op_tax[0]:
-            self.__X = self.__A
+        if self.Irq and not self.P & Interrupt:
+            self.Events.Add(self.Cycles, self.Poll)
 
-            print('TAX : ' + instruction)
+    def RTS(self, mode, data):
+        self.__PC = ((self.Pull() | (self.Pull() << 8)) + 1) & 0xffff
 
-            if self.__X == 0:
-                self.Z = True
-            else:
-                self.Z = False
+    # Carry is clear when a borrow is needed
+    def SBC(self, mode, data):
+        value = Subtract[(self.P & 0x01) << 16 | self.__A << 8 | mode(data)]
 
-            if self.__X < 0:
-                self.N = True
-            else:
-                self.N = False
+        self.__A = value & 0xff
+        self.P = self.P & 0x3c | value >> 8
 
-    def TAY(self, instruction):
-        if instruction == OpCode.op_tay[0]:
-            self.__Y = self.__A
+    def SEC(self, mode, data):
+        self.P |= Carry
 
-            print('TAY : ' + instruction)
+    def SED(self, mode, data):
+        self.P |= Decimal
 
-            if self.__Y == 0:
-                self.Z = True
-            else:
-                self.Z = False
+    def SEI(self, mode, data):
+        self.P |= Interrupt
 
-            if self.__Y < 0:
-                self.N = True
-            else:
-                self.N = False
+    def STA(self, mode, data):
+        self.WriteData(mode(data), self.__A)
 
-    def TSX(self, instruction):
-        if instruction == OpCode.op_tsx[0]:
-            self.__X = self.__S.pop()
+    def STX(self, mode, data):
+        self.WriteData(mode(data), self.__X)
 
-            print('TSX : ' + instruction)
+    def STY(self, mode, data):
+        self.WriteData(mode(data), self.__Y)
 
-            if self.__X == 0:
-                self.Z = True
-            else:
-                self.Z = False
+    def TAX(self, mode, data):
+        self.__X = self.__A
 
-            if self.__X < 0:
-                self.N = True
-            else:
-                self.N = False
+        self.P = self.P & 0x7d | NZ[self.__X]
 
-    def TXA(self, instruction):
-        if instruction == OpCode.op_txa[0]:
-            self.__A = self.__X
+    def TAY(self, mode, data):
+        self.__Y = self.__A
 
-            print('TXA : ' + instruction)
+        self.P = self.P & 0x7d | NZ[self.__Y]
 
-            if self.__A == 0:
-                self.Z = True
-            else:
-                self.Z = False
-            
-            if self.__A < 0:
-                self.N = True
-            else:
-                self.N = False
+    def TSX(self, mode, data):
+        self.__X = self.__S
 
-    def TXS(self, instruction):
-        if instruction == OpCode.op_txs[0]:
-            self.__S.append(self.__X)
+        self.P = self.P & 0x7d | NZ[self.__X]
 
-            print('TXS : ' + instruction)
+    def TXA(self, mode, data):
+        self.__A = self.__X
 
-    def TYA(self, instruction):
-        if instruction == OpCode.op_tya[0]:
-            self.__A = self.__Y
+        self.P = self.P & 0x7d | NZ[self.__A]
 
-            print('TYA : ' + instruction)
+    def TXS(self, mode, data):
+        self.__S = self.__X
 
-            if self.__A == 0:
-                self.Z = True
-            else:
-                self.Z = False
-            
-            if self.__A < 0:
-                self.N = True
-            else:
-                self.N = False
+    def TYA(self, mode, data):
+        self.__A = self.__Y
 
+        self.P = self.P & 0x7d | NZ[self.__A]
 
 if __name__ == '__main__':
     CPU = Cpu()
-    CPU.run()
+    CPU.run(max_instructions=19500)
+    CPU.PrintMem()
     CPU.debug()
-
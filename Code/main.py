@@ -2,4 +2,7 @@ import cpu
 
 if __name__ == '__main__':
     CPU = cpu.Cpu()
-    CPU.run()
+    stop = CPU.run(max_instructions=19500)
+    print(stop)
+    print('%.2f MHz' % (stop.cycles / stop.seconds / 1e6))
+    CPU.PrintMem()
@@ -0,0 +1,197 @@
+"""
+
+This file, mapper.py implements the cartridge boards which switch ROM banks.
+
+The CPU sees PRG ROM through two 16kB windows, $8000-$BFFF and $C000-$FFFF,
+and the PPU sees CHR through two 4kB windows, $0000-$0FFF and $1000-$1FFF.
+Each window is a memoryview of one bank of the cartridge (see cartridge.py),
+so a bank switch only rebinds an element of Prg or Chr, whatever the bank size.
+
+Switching a PRG window calls switch(window, bank), which lets the CPU swap its decode cache.
+PrgBank and ChrBank give the bank in each window, e.g. for caching decoded tiles by bank (see tiles.py).
+Writes to $8000-$FFFF go to Write(); State() and SetState() give the registers for snapshots.
+
+    0   NROM    no switching, 16kB PRG is mirrored in both windows
+    1   MMC1    serial registers for PRG mode and banks, CHR banks and mirroring
+    2   UxROM   16kB PRG at $8000, last bank fixed at $C000
+    3   CNROM   8kB CHR bank
+
+"""
+
+
+class NROM:
+    def __init__(self, cartridge, switch = None):
+        self.Switch = switch or (lambda window, bank: None)
+
+        self.PrgBanks = cartridge.PrgBanks
+
+        # Boards without CHR ROM have 8kB CHR RAM
+        if cartridge.ChrBanks:
+            chr = cartridge.Chr
+        else:
+            self.ChrRam = bytearray(0x2000)
+            chr = memoryview(self.ChrRam)
+
+        # 4kB CHR banks
+        self.ChrBanks = [chr[i:i + 0x1000] for i in range(0, len(chr), 0x1000)]
+
+        self.Mirroring = cartridge.Descriptor.mirroring
+
+        # Bank in each window
+        self.Prg = [self.PrgBanks[0], self.PrgBanks[-1]]
+        self.Chr = [self.ChrBanks[0], self.ChrBanks[1]]
+        self.PrgBank = [0, len(self.PrgBanks) - 1]
+        self.ChrBank = [0, 1]
+
+    def MapPrg(self, window, bank):
+        bank %= len(self.PrgBanks)
+
+        if self.PrgBank[window] != bank:
+            self.PrgBank[window] = bank
+            self.Prg[window] = self.PrgBanks[bank]
+            self.Switch(window, bank)
+
+    def MapChr(self, window, bank):
+        bank %= len(self.ChrBanks)
+
+        self.ChrBank[window] = bank
+        self.Chr[window] = self.ChrBanks[bank]
+
+    def Write(self, address, value):
+        pass
+
+    def State(self):
+        return b''
+
+    def SetState(self, state):
+        pass
+
+
+class UxROM(NROM):
+    def __init__(self, cartridge, switch = None):
+        super().__init__(cartridge, switch)
+
+        self.Bank = 0
+
+    def Write(self, address, value):
+        self.Bank = value
+        self.MapPrg(0, value)
+
+    def State(self):
+        return bytes([self.Bank])
+
+    def SetState(self, state):
+        self.Write(0x8000, state[0])
+
+
+class CNROM(NROM):
+    def __init__(self, cartridge, switch = None):
+        super().__init__(cartridge, switch)
+
+        self.Bank = 0
+
+    def Write(self, address, value):
+        self.Bank = value
+
+        # One 8kB bank is two 4kB ones
+        self.MapChr(0, value * 2)
+        self.MapChr(1, value * 2 + 1)
+
+    def State(self):
+        return bytes([self.Bank])
+
+    def SetState(self, state):
+        self.Write(0x8000, state[0])
+
+
+class MMC1(NROM):
+    def __init__(self, cartridge, switch = None):
+        super().__init__(cartridge, switch)
+
+        # Bits shifted in so far, lowest first, and how many
+        self.Shift = 0
+        self.Count = 0
+
+        # Control: mirroring (bits 0-1), PRG mode (bits 2-3), 4kB CHR mode (bit 4).
+        # Powers on in PRG mode 3, last bank fixed at $C000.
+        self.Control = 0x0c
+        self.ChrBank0 = 0
+        self.ChrBank1 = 0
+        self.Bank = 0
+
+        self.Update()
+
+    def Write(self, address, value):
+        # Bit 7 resets the shift register and goes back to PRG mode 3
+        if value & 0x80:
+            self.Shift = 0
+            self.Count = 0
+            self.Control |= 0x0c
+            self.Update()
+            return
+
+        self.Shift |= (value & 1) << self.Count
+        self.Count += 1
+
+        if self.Count < 5:
+            return
+
+        # The fifth write picks the register from bits 13-14 of its address
+        register = (address >> 13) & 3
+
+        if register == 0:
+            self.Control = self.Shift
+        elif register == 1:
+            self.ChrBank0 = self.Shift
+        elif register == 2:
+            self.ChrBank1 = self.Shift
+        else:
+            self.Bank = self.Shift & 0x0f
+
+        self.Shift = 0
+        self.Count = 0
+        self.Update()
+
+    def Update(self):
+        self.Mirroring = ('single0', 'single1', 'vertical', 'horizontal')[self.Control & 3]
+
+        mode = (self.Control >> 2) & 3
+
+        if mode < 2:
+            # 32kB at $8000, the low bit of the bank is ignored
+            self.MapPrg(0, self.Bank & 0x0e)
+            self.MapPrg(1, self.Bank | 0x01)
+        elif mode == 2:
+            self.MapPrg(0, 0)
+            self.MapPrg(1, self.Bank)
+        else:
+            self.MapPrg(0, self.Bank)
+            self.MapPrg(1, len(self.PrgBanks) - 1)
+
+        if self.Control & 0x10:
+            self.MapChr(0, self.ChrBank0)
+            self.MapChr(1, self.ChrBank1)
+        else:
+            # 8kB mode, the low bit of the bank is ignored
+            self.MapChr(0, self.ChrBank0 & 0x1e)
+            self.MapChr(1, self.ChrBank0 | 0x01)
+
+    def State(self):
+        return bytes([self.Shift, self.Count, self.Control, self.ChrBank0, self.ChrBank1, self.Bank])
+
+    def SetState(self, state):
+        self.Shift, self.Count, self.Control, self.ChrBank0, self.ChrBank1, self.Bank = state
+        self.Update()
+
+
+# Mapper classes by iNES mapper number
+Mappers = {0: NROM, 1: MMC1, 2: UxROM, 3: CNROM}
+
+
+def Create(cartridge, switch = None):
+    number = cartridge.Descriptor.mapper
+
+    if number not in Mappers:
+        raise ValueError('mapper %d is not supported' % number)
+
+    return Mappers[number](cartridge, switch)
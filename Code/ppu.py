@@ -0,0 +1,495 @@
+"""
+
+This file, ppu.py is made for representation of the PPU 2C02 in NES.
+
+The PPU does not run alongside the CPU dot by dot. It only works out where it is,
+from Cpu.Cycles (3 dots per CPU cycle), when something needs it:
+
+    - a register access renders the scanlines finished since the last one (CatchUp()),
+      so a write only changes how the rest of the frame looks
+    - vblank renders what is left of the frame, sets the vblank flag and raises NMI
+    - the pre-render line clears the flags and starts the next frame
+
+Vblank and the pre-render line are scheduler events (see scheduler.py), and so is the
+sprite 0 hit, worked out when the frame starts. Status only changes from events or register
+accesses, so idle loops polling $2002 can be skipped (see Cpu.Loop()).
+
+Scanlines are rendered several at a time with NumPy into Frame, a 256x240 array of
+palette indices (see screen.py), from the decoded tiles of tiles.py.
+
+1. Registers
+
+    $2000   Control     NMI enable (7), sprite size (5), background table (4), sprite table (3),
+                        VRAM increment (2), base nametable (0-1)
+    $2001   Mask        show sprites (4), show background (3), left 8 pixels (2, 1), grayscale (0)
+    $2002   Status      vblank (7), sprite 0 hit (6), sprite overflow (5)
+    $2003   OAM address
+    $2004   OAM data
+    $2005   scroll, X then Y
+    $2006   VRAM address, high byte then low
+    $2007   VRAM data
+
+$2005 and $2006 share one write toggle and the temporary address T,
+laid out as yyy NN YYYYY XXXXX (fine Y, nametable, coarse Y, coarse X).
+
+2. PPU Memory Map
+
+--------------------------------------- $4000
+    Palette, 32 bytes mirrored
+--------------------------------------- $3F00
+    Nametables, mirrored
+--------------------------------------- $3000
+    4 nametables of 1kB, folded into VRAM by the cartridge's mirroring
+--------------------------------------- $2000
+    Pattern tables, CHR windows of the mapper
+--------------------------------------- $0000
+
+"""
+
+import struct
+
+import numpy
+
+from tiles import Tiles
+
+
+# Dots per scanline and per frame
+Dots = 341
+FrameDots = 262 * Dots
+
+# Dots into the frame where vblank starts and where the pre-render line ends it
+VblankDot = 241 * Dots + 1
+PreRenderDot = 261 * Dots + 1
+
+# Offsets into VRAM of the four nametables, by mirroring
+Mirrors = {
+    'horizontal': (0, 0, 0x400, 0x400),
+    'vertical': (0, 0x400, 0, 0x400),
+    'single0': (0, 0, 0, 0),
+    'single1': (0x400, 0x400, 0x400, 0x400),
+    'four-screen': (0, 0x400, 0x800, 0xc00),
+}
+
+
+# Palette entries $10, $14, $18 and $1C are the same bytes as $00, $04, $08 and $0C
+def PaletteIndex(address):
+    address &= 0x1f
+
+    return address & 0x0f if address & 0x13 == 0x10 else address
+
+
+# Background Y, 0-479 over the two nametables one above the other, of a VRAM address
+def ScrollY(address):
+    return ((address >> 11) & 1) * 240 + ((address >> 5) & 31) * 8 + ((address >> 12) & 7)
+
+
+class Ppu:
+    def __init__(self, cpu):
+        self.Cpu = cpu
+        self.Mapper = cpu.Mapper
+        self.Tiles = Tiles(self.Mapper)
+
+        # Boards without CHR ROM let the PPU write the pattern tables
+        self.__ChrRam = getattr(self.Mapper, 'ChrRam', None)
+
+        # Nametables (4kB for four-screen boards), sprites and palette
+        self.Vram = bytearray(0x1000)
+        self.Oam = bytearray(0x100)
+        self.Palette = bytearray(0x20)
+
+        # Pages of VRAM and CHR RAM, and which of them were written since Clean(), as Bus keeps for RAM
+        self.Pages = [memoryview(memory)[i:i + 0x100]
+                      for memory in [self.Vram] + ([self.__ChrRam] if self.__ChrRam is not None else [])
+                      for i in range(0, len(memory), 0x100)]
+        self.Dirty = bytearray(len(self.Pages))
+
+        # The same memory, seen by NumPy for rendering
+        self.__VramArray = numpy.frombuffer(self.Vram, dtype=numpy.uint8)
+        self.__PaletteArray = numpy.frombuffer(self.Palette, dtype=numpy.uint8)
+
+        # Palette indices of the frame being drawn, and the number of frames finished
+        self.Frame = numpy.zeros((240, 256), dtype=numpy.uint8)
+        self.Frames = 0
+
+        self.Control = 0
+        self.Mask = 0
+        self.Status = 0
+        self.OamAddress = 0
+
+        # VRAM address, temporary address, fine X scroll and the write toggle of $2005 and $2006
+        self.__V = 0
+        self.__T = 0
+        self.__X = 0
+        self.__W = 0
+
+        # $2007 reads return the byte read before
+        self.__Buffer = 0
+
+        # The last byte written, read back from the write-only registers
+        self.__Latch = 0
+
+        # CPU cycle at dot 0, dot of line 0 of the current frame and the next line to render.
+        # Rendered lines follow on from background Y ScrollY at line Top.
+        self.__Origin = cpu.Cycles
+        self.__Start = 0
+        self.__Line = 0
+        self.__ScrollY = 0
+        self.__Top = 0
+
+        # Pending events by name
+        self.__Events = {}
+
+        self.Schedule()
+
+    ## Timing ##
+
+    def Dot(self):
+        return (self.Cpu.Cycles - self.__Origin) * 3
+
+    # Schedule callback at dot, at the first CPU cycle reaching it.
+    def At(self, name, dot, callback):
+        self.__Events[name] = self.Cpu.Events.Add(self.__Origin + (dot + 2) // 3, callback)
+
+    # Schedule the next vblank or pre-render line from the current dot, e.g. after SetState().
+    def Schedule(self):
+        for event in self.__Events.values():
+            self.Cpu.Events.Cancel(event)
+
+        self.__Events = {}
+
+        if self.Dot() < self.__Start + VblankDot:
+            self.At('vblank', self.__Start + VblankDot, self.Vblank)
+            self.Sprite0()
+        else:
+            self.At('pre-render', self.__Start + PreRenderDot, self.PreRender)
+
+    def Vblank(self, cycle):
+        self.CatchUp()
+
+        self.Status |= 0x80
+        self.Frames += 1
+
+        if self.Control & 0x80:
+            self.Cpu.Nmi()
+
+        self.At('pre-render', self.__Start + PreRenderDot, self.PreRender)
+
+    def PreRender(self, cycle):
+        self.Status &= 0x1f
+
+        self.__Start += FrameDots
+        self.__Line = 0
+        self.__ScrollY = ScrollY(self.__T)
+        self.__Top = 0
+
+        # The vertical part of T is copied to V while rendering
+        if self.Mask & 0x18:
+            self.__V = (self.__V & 0x041f) | (self.__T & 0x7be0)
+
+        self.At('vblank', self.__Start + VblankDot, self.Vblank)
+        self.Sprite0()
+
+    # Schedule the sprite 0 hit of this frame, the first opaque pixel of sprite 0 over
+    # an opaque background pixel, as it would be drawn with the registers as they are now.
+    def Sprite0(self):
+        if self.Mask & 0x18 != 0x18:
+            return
+
+        sprite = self.Sprite(0, 0, 240)
+
+        if sprite is None:
+            return
+
+        top, x, pixels, attributes = sprite
+        background, group = self.Background(top, top + len(pixels))
+
+        hits = (pixels != 0) & (background[:, x:x + pixels.shape[1]] != 0)
+
+        # Never at x = 255, nor in the left 8 pixels when either layer is clipped there
+        if x + pixels.shape[1] == 256:
+            hits[:, -1] = False
+
+        if self.Mask & 0x06 != 0x06 and x < 8:
+            hits[:, :8 - x] = False
+
+        rows, columns = hits.nonzero()
+
+        if len(rows):
+            dot = self.__Start + (top + rows[0]) * Dots + x + columns[0] + 1
+
+            if dot > self.Dot():
+                self.At('sprite 0', dot, self.Hit)
+
+    def Hit(self, cycle):
+        self.Status |= 0x40
+
+    ## Timing ##
+
+    ## Registers ##
+
+    def Read(self, address):
+        register = address & 7
+
+        if register == 2:
+            value = self.Status | (self.__Latch & 0x1f)
+
+            self.Status &= 0x7f
+            self.__W = 0
+
+            return value
+
+        if register == 4:
+            return self.Oam[self.OamAddress]
+
+        if register == 7:
+            address = self.__V & 0x3fff
+            self.__V = (self.__V + (32 if self.Control & 0x04 else 1)) & 0x7fff
+
+            # Palette reads are not buffered, the buffer gets the nametable byte underneath
+            if address >= 0x3f00:
+                self.__Buffer = self.ReadVram(address - 0x1000)
+
+                return self.Palette[PaletteIndex(address)]
+
+            value = self.__Buffer
+            self.__Buffer = self.ReadVram(address)
+
+            return value
+
+        return self.__Latch
+
+    def Write(self, address, value):
+        register = address & 7
+        self.__Latch = value
+
+        if register == 0:
+            self.CatchUp()
+
+            # Enabling NMI during vblank raises it at once
+            if value & 0x80 and not self.Control & 0x80 and self.Status & 0x80:
+                self.Cpu.Nmi()
+
+            self.Control = value
+            self.__T = (self.__T & 0x73ff) | ((value & 3) << 10)
+        elif register == 1:
+            self.CatchUp()
+            self.Mask = value
+        elif register == 3:
+            self.OamAddress = value
+        elif register == 4:
+            self.Oam[self.OamAddress] = value
+            self.OamAddress = (self.OamAddress + 1) & 0xff
+        elif register == 5:
+            self.CatchUp()
+
+            if not self.__W:
+                self.__T = (self.__T & 0x7fe0) | (value >> 3)
+                self.__X = value & 7
+            else:
+                self.__T = (self.__T & 0x0c1f) | ((value & 7) << 12) | ((value & 0xf8) << 2)
+
+            self.__W ^= 1
+        elif register == 6:
+            self.CatchUp()
+
+            if not self.__W:
+                self.__T = (self.__T & 0x00ff) | ((value & 0x3f) << 8)
+            else:
+                self.__T = (self.__T & 0x7f00) | value
+                self.__V = self.__T
+
+                # Mid-frame, the lines from the next one on follow on from the new address
+                line = (self.Dot() - self.__Start) // Dots
+
+                if self.Mask & 0x18 and 0 <= line < 240:
+                    self.__ScrollY = ScrollY(self.__V)
+                    self.__Top = line + 1
+
+            self.__W ^= 1
+        elif register == 7:
+            self.CatchUp()
+            self.WriteVram(self.__V & 0x3fff, value)
+            self.__V = (self.__V + (32 if self.Control & 0x04 else 1)) & 0x7fff
+
+    ## Registers ##
+
+    # Offset into VRAM of a nametable address, $2000-$3EFF.
+    def Nametable(self, address):
+        return Mirrors[self.Mapper.Mirroring][(address >> 10) & 3] + (address & 0x3ff)
+
+    def ReadVram(self, address):
+        if address < 0x2000:
+            return self.Mapper.Chr[address >> 12][address & 0xfff]
+
+        if address < 0x3f00:
+            return self.Vram[self.Nametable(address)]
+
+        return self.Palette[PaletteIndex(address)]
+
+    def WriteVram(self, address, value):
+        if address < 0x2000:
+            # CHR ROM cannot be written
+            if self.__ChrRam is not None:
+                self.Mapper.Chr[address >> 12][address & 0xfff] = value
+                self.Tiles.Write(address)
+
+                # Its pages follow the 16 of VRAM
+                self.Dirty[0x10 + (self.Mapper.ChrBank[address >> 12] << 4 | (address >> 8) & 0xf)] = 1
+        elif address < 0x3f00:
+            offset = self.Nametable(address)
+            self.Vram[offset] = value
+            self.Dirty[offset >> 8] = 1
+        else:
+            self.Palette[PaletteIndex(address)] = value & 0x3f
+
+    def Clean(self):
+        self.Dirty[:] = bytes(len(self.Dirty))
+
+    ## Rendering ##
+
+    # Render the lines finished by now.
+    def CatchUp(self):
+        line = min((self.Dot() - self.__Start) // Dots, 240)
+
+        if line > self.__Line:
+            self.Render(self.__Line, line)
+            self.__Line = line
+
+    # Render lines first <= line < last with the registers as they are.
+    def Render(self, first, last):
+        if not self.Mask & 0x18:
+            self.Frame[first:last] = self.Palette[0]
+            return
+
+        if self.Mask & 0x08:
+            background, group = self.Background(first, last)
+
+            if not self.Mask & 0x02:
+                background[:, :8] = 0
+
+            color = numpy.where(background != 0, group * 4 + background, 0)
+        else:
+            background = numpy.zeros((last - first, 256), dtype=numpy.uint8)
+            color = background
+
+        if self.Mask & 0x10:
+            # The lowest sprite with an opaque pixel wins, even when it is behind the background
+            layer = numpy.zeros((last - first, 256), dtype=numpy.uint8)
+            behind = numpy.zeros((last - first, 256), dtype=bool)
+
+            for index in range(63, -1, -1):
+                sprite = self.Sprite(index, first, last)
+
+                if sprite is None:
+                    continue
+
+                top, x, pixels, attributes = sprite
+                area = (slice(top - first, top - first + len(pixels)), slice(x, x + pixels.shape[1]))
+
+                opaque = pixels != 0
+
+                if not self.Mask & 0x04 and x < 8:
+                    opaque[:, :8 - x] = False
+
+                layer[area] = numpy.where(opaque, 0x10 | ((attributes & 3) << 2) | pixels, layer[area])
+                behind[area] = numpy.where(opaque, bool(attributes & 0x20), behind[area])
+
+            color = numpy.where((layer != 0) & ~(behind & (background != 0)), layer, color)
+
+        self.Frame[first:last] = self.__PaletteArray[color] & (0x30 if self.Mask & 0x01 else 0x3f)
+
+    # Background colors 0-3 of lines first <= line < last and their palette groups, both (lines, 256).
+    def Background(self, first, last):
+        vram = self.__VramArray
+
+        y = (self.__ScrollY + numpy.arange(first, last) - self.__Top) % 480
+        x = (((self.__T >> 10) & 1) * 256 + (self.__T & 31) * 8 + self.__X + numpy.arange(256)) % 512
+
+        base = numpy.array(Mirrors[self.Mapper.Mirroring])[(y // 240 * 2)[:, numpy.newaxis] + x // 256]
+        row = (y % 240)[:, numpy.newaxis]
+        column = x % 256
+
+        tile = vram[base + row // 8 * 32 + column // 8]
+        attribute = vram[base + 0x3c0 + row // 32 * 8 + column // 32]
+
+        # Two bits per 16x16 quarter of the 32x32 area
+        group = (attribute >> ((row & 16) // 4 + (column & 16) // 8)) & 3
+
+        return self.Tiles.Table((self.Control >> 4) & 1)[tile, row & 7, column & 7], group
+
+    # The rows of sprite index within lines first <= line < last:
+    # (first line, x, colors 0-3 as (rows, columns), attributes), or None when it has none there.
+    def Sprite(self, index, first, last):
+        y, tile, attributes, x = self.Oam[index * 4:index * 4 + 4]
+
+        # Sprites are drawn one line below their Y
+        y += 1
+        height = 16 if self.Control & 0x20 else 8
+
+        top = max(y, first)
+        bottom = min(y + height, last)
+
+        if top >= bottom:
+            return None
+
+        rows = numpy.arange(top - y, bottom - y)
+
+        if attributes & 0x80:
+            rows = height - 1 - rows
+
+        # 8x16 sprites take the table from bit 0 of the tile, and two tiles one above the other
+        if height == 16:
+            pixels = self.Tiles.Table(tile & 1)[(tile & 0xfe) + (rows >> 3), rows & 7]
+        else:
+            pixels = self.Tiles.Table((self.Control >> 3) & 1)[tile, rows]
+
+        if attributes & 0x40:
+            pixels = pixels[:, ::-1]
+
+        return top, x, pixels[:, :256 - x], attributes
+
+    ## Rendering ##
+
+    # State layout: registers, timing, then VRAM, OAM, palette and CHR RAM if the board has it
+    Header = struct.Struct('<BBBBHHBBBBqqHHHI')
+
+    # With memory=False, VRAM and CHR RAM (Pages) are left out like Cpu.snapshot() leaves out RAM.
+    def State(self, memory = True):
+        header = self.Header.pack(self.Control, self.Mask, self.Status, self.OamAddress,
+                                  self.__V, self.__T, self.__X, self.__W, self.__Buffer, self.__Latch,
+                                  self.__Origin, self.__Start, self.__Line, self.__ScrollY, self.__Top, self.Frames)
+
+        return b''.join([header] + self.Memories(memory))
+
+    # The memory in State(), in order
+    def Memories(self, memory = True):
+        if not memory:
+            return [self.Oam, self.Palette]
+
+        return [self.Vram, self.Oam, self.Palette] + ([self.__ChrRam] if self.__ChrRam is not None else [])
+
+    # The size of State(), for checking snapshots
+    def Size(self, memory = True):
+        return self.Header.size + sum(len(part) for part in self.Memories(memory))
+
+    # Restore State(), once Cpu.Cycles is restored as well.
+    def SetState(self, state, memory = True):
+        (self.Control, self.Mask, self.Status, self.OamAddress,
+         self.__V, self.__T, self.__X, self.__W, self.__Buffer, self.__Latch,
+         self.__Origin, self.__Start, self.__Line, self.__ScrollY, self.__Top, self.Frames) = self.Header.unpack_from(state)
+
+        offset = self.Header.size
+
+        for part in self.Memories(memory):
+            part[:] = state[offset:offset + len(part)]
+            offset += len(part)
+
+        if memory:
+            # Every page may have changed
+            self.Dirty[:] = b'\x01' * len(self.Dirty)
+
+        # Every tile may have changed, whether CHR RAM came with the state or was put back by the caller
+        if self.__ChrRam is not None:
+            self.Tiles = Tiles(self.Mapper)
+
+        self.Schedule()
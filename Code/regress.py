@@ -0,0 +1,168 @@
+"""
+
+This file, regress.py runs a directory of ROMs (or one ROM with many input scripts)
+on every core and prints one report.
+
+    python regress.py roms/                         every *.nes in roms/
+    python regress.py game.nes --scripts scripts/   game.nes once per script in scripts/
+
+Each ROM is read once, copied into a multiprocessing.shared_memory block,
+and the workers build their Cpu straight on top of that block.
+
+An input script is a text file of lines
+
+    <instruction count> <address> <value>
+
+Each line writes value to address once the CPU has executed that many instructions.
+Numbers may be written in any base int() understands (e.g. 0x4016). A # starts a comment.
+
+For each job the report gives the stop reason, instruction and cycle counts, and Cpu.Digest()
+of the final state. A job whose ROM crashes the CPU reports the exception as its reason.
+
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import cpu
+
+
+# Shared memory blocks a worker has attached to, by name
+Attached = {}
+
+
+def ReadScript(path):
+    events = []
+
+    with open(path) as file:
+        for line in file:
+            line = line.split('#')[0].split()
+
+            if line:
+                count, address, value = (int(field, 0) for field in line)
+                events.append((count, address, value))
+
+    events.sort()
+
+    return events
+
+
+# Run one job in a worker process and return its line of the report.
+def Job(rom, name, size, script, events, max_instructions, max_cycles, translate):
+    if name not in Attached:
+        Attached[name] = shared_memory.SharedMemory(name=name)
+
+    result = {'rom': rom, 'script': script}
+
+    try:
+        # Cpu prints the cartridge header and illegal opcodes
+        with contextlib.redirect_stdout(io.StringIO()):
+            CPU = cpu.Cpu(translate=translate, rom=Attached[name].buf[:size])
+
+            count = 0
+            stop = None
+
+            # max_cycles counts from power on, over the script and the rest of the run
+            def Left():
+                return None if max_cycles is None else max_cycles - CPU.Cycles
+
+            for at, address, value in events:
+                if at >= max_instructions:
+                    break
+
+                if at > count:
+                    stop = CPU.run(max_instructions=at - count, max_cycles=Left())
+                    count += stop.instructions
+
+                    # Out of cycles before the write
+                    if stop.reason != 'instructions':
+                        break
+
+                CPU.WriteData(address, value)
+
+            if stop is None or stop.reason == 'instructions':
+                stop = CPU.run(max_instructions=max_instructions - count, max_cycles=Left())
+                count += stop.instructions
+
+            result.update(reason=stop.reason, instructions=count,
+                          cycles=CPU.Cycles, pc=stop.pc, digest=CPU.Digest())
+    except Exception as error:
+        result.update(reason='error: %r' % error)
+
+    return result
+
+
+def Run(roms, scripts, max_instructions, max_cycles = None, translate = False, workers = None):
+    blocks = {}
+
+    try:
+        for rom in roms:
+            with open(rom, 'rb') as file:
+                image = file.read()
+
+            block = shared_memory.SharedMemory(create=True, size=len(image))
+            block.buf[:len(image)] = image
+            blocks[rom] = (block, len(image))
+
+        jobs = [(rom, script) for rom in roms for script in scripts]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(Job, rom, blocks[rom][0].name, blocks[rom][1],
+                                   script, ReadScript(script) if script else [],
+                                   max_instructions, max_cycles, translate)
+                       for rom, script in jobs]
+
+            return [future.result() for future in futures]
+    finally:
+        for block, size in blocks.values():
+            block.close()
+            block.unlink()
+
+
+def Report(results):
+    for result in results:
+        name = result['rom'] if result['script'] is None else result['rom'] + ' < ' + result['script']
+
+        if 'digest' in result:
+            print('%-40s %-12s %10d %12d  %s' % (name, result['reason'], result['instructions'],
+                                                 result['cycles'], result['digest']))
+        else:
+            print('%-40s %s' % (name, result['reason']))
+
+    failed = sum('digest' not in result for result in results)
+    print()
+    print('%d jobs, %d failed' % (len(results), failed))
+
+
+def Listing(path, suffix):
+    return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(suffix))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run ROMs in parallel and report their final states.')
+    parser.add_argument('rom', help='a ROM, or a directory of *.nes ROMs')
+    parser.add_argument('--scripts', help='directory of input scripts to run the ROM(s) with')
+    parser.add_argument('--instructions', type=int, default=19500)
+    parser.add_argument('--cycles', type=int)
+    parser.add_argument('--translate', action='store_true')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    roms = Listing(args.rom, '.nes') if os.path.isdir(args.rom) else [args.rom]
+    scripts = Listing(args.scripts, '') if args.scripts else [None]
+
+    results = Run(roms, scripts, args.instructions, args.cycles, args.translate, args.workers)
+    Report(results)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=1)
+
+    sys.exit(1 if any('digest' not in result for result in results) else 0)
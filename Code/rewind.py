@@ -0,0 +1,84 @@
+"""
+
+This file, rewind.py keeps a bounded ring of checkpoints to step a Cpu back in time.
+
+A checkpoint holds the registers (Cpu.snapshot(memory=False)) and, for every page of RAM,
+VRAM or CHR RAM written since the previous checkpoint, the 256 bytes that page held before.
+Only pages the bus and the PPU marked dirty are compared, so an idle frame costs next to nothing
+and memory use grows with what the program actually changes.
+
+    rewind = Rewind(CPU)
+    while ...:
+        CPU.run(max_cycles=29781)
+        rewind.Checkpoint()
+    rewind.Back(60)             # one second of frames earlier
+
+"""
+
+from collections import deque
+
+
+class Rewind:
+    def __init__(self, cpu, size = 600):
+        self.__Cpu = cpu
+        self.__Ring = deque(maxlen=size)
+
+        # Memory seen as pages with Pages, Dirty and Clean(): RAM on the bus, VRAM and CHR RAM in the PPU
+        self.__Memories = [cpu.Bus, cpu.Ppu]
+
+        # The pages as of the newest checkpoint
+        self.__Shadows = [[bytearray(page) for page in memory.Pages] for memory in self.__Memories]
+
+        for memory in self.__Memories:
+            memory.Clean()
+
+        self.__Ring.append((cpu.snapshot(memory=False), []))
+
+    def __len__(self):
+        return len(self.__Ring)
+
+    # Changes are (memory, page, bytes before), memory indexing self.__Memories.
+    def Checkpoint(self):
+        changes = []
+
+        for index, memory in enumerate(self.__Memories):
+            shadows = self.__Shadows[index]
+            page = memory.Dirty.find(1)
+
+            while page >= 0:
+                shadow = shadows[page]
+
+                if memory.Pages[page] != shadow:
+                    changes.append((index, page, bytes(shadow)))
+                    shadow[:] = memory.Pages[page]
+
+                page = memory.Dirty.find(1, page + 1)
+
+            memory.Clean()
+
+        self.__Ring.append((self.__Cpu.snapshot(memory=False), changes))
+
+    # Go back count checkpoints. Back(0) returns to the newest one.
+    def Back(self, count = 1):
+        if count >= len(self.__Ring):
+            raise ValueError('only %d checkpoints to go back' % (len(self.__Ring) - 1))
+
+        # Undo the writes since the newest checkpoint
+        for index, memory in enumerate(self.__Memories):
+            page = memory.Dirty.find(1)
+
+            while page >= 0:
+                memory.Pages[page][:] = self.__Shadows[index][page]
+                page = memory.Dirty.find(1, page + 1)
+
+        for i in range(count):
+            registers, changes = self.__Ring.pop()
+
+            for index, page, before in changes:
+                self.__Shadows[index][page][:] = before
+                self.__Memories[index].Pages[page][:] = before
+
+        for memory in self.__Memories:
+            memory.Clean()
+
+        self.__Cpu.restore(self.__Ring[-1][0])
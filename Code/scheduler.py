@@ -0,0 +1,82 @@
+"""
+
+This file, scheduler.py keeps the events devices want to happen at a given CPU cycle.
+
+Devices (the PPU raising NMI at vblank, a mapper or the APU raising IRQ) add an event
+for the cycle it is due instead of being polled, and the events wait in a heap ordered by cycle.
+Next is the cycle of the earliest one, so all the run loop has to do is compare
+Cpu.Cycles with a single integer; Run() then calls whatever is due.
+
+    events = cpu.Events
+    event = events.Add(cpu.Cycles + 29781, Vblank)
+    events.Cancel(event)                    # e.g. NMI was disabled before it came
+
+An event fires at the first instruction boundary at or after its cycle.
+An event without a callback only makes Cpu.run() stop there, which is how max_cycles works.
+
+"""
+
+import heapq
+import itertools
+
+
+# Next when nothing is scheduled, later than any cycle count
+Never = 1 << 62
+
+
+class Scheduler:
+    def __init__(self):
+        # [cycle, sequence, callback]; the sequence keeps events of the same cycle in the order they were added
+        self.__Heap = []
+        self.__Sequence = itertools.count()
+
+        self.Next = Never
+
+    def __len__(self):
+        return len(self.__Heap)
+
+    # Call callback(cycle) once the CPU reaches cycle, or None. Returns the event, for Cancel().
+    def Add(self, cycle, callback):
+        event = [cycle, next(self.__Sequence), callback]
+        heapq.heappush(self.__Heap, event)
+
+        if cycle < self.Next:
+            self.Next = cycle
+
+        return event
+
+    def Cancel(self, event):
+        heap = self.__Heap
+
+        # There are only ever a few events
+        if event in heap:
+            heap.remove(event)
+            heapq.heapify(heap)
+
+        self.Next = heap[0][0] if heap else Never
+
+    # Have run() come back to Run() by cycle without adding an event, e.g. to end a chunk of instructions early.
+    # Run() puts Next back.
+    def Due(self, cycle):
+        if cycle < self.Next:
+            self.Next = cycle
+
+    # Cancel every event calling callback, e.g. on restoring a snapshot.
+    def CancelAll(self, callback):
+        heap = self.__Heap
+        heap[:] = [event for event in heap if event[2] != callback]
+        heapq.heapify(heap)
+
+        self.Next = heap[0][0] if heap else Never
+
+    # Call the callbacks of every event due by cycle, including events they add which are due as well.
+    def Run(self, cycle):
+        heap = self.__Heap
+
+        while heap and heap[0][0] <= cycle:
+            due, sequence, callback = heapq.heappop(heap)
+
+            if callback is not None:
+                callback(due)
+
+        self.Next = heap[0][0] if heap else Never
@@ -0,0 +1,56 @@
+"""
+
+This file, screen.py puts frames on a pygame surface.
+
+A frame is 256x240 bytes, one NES palette index (0-63) per pixel, indexed [y, x].
+That is all the renderer writes; colors only come in when a frame is presented:
+the indices are looked up in Palette, a (256, 3) uint8 table, and the RGB pixels are
+written scaled straight into the surface's own memory (pygame.surfarray.pixels3d),
+without converting or copying a full-size image first.
+
+    frame = Frame()
+    display = pygame.display.set_mode((Width * 4, Height * 4))
+    ...
+    Present(frame, display)
+    pygame.display.update()
+
+"""
+
+import numpy
+import pygame
+
+
+Width = 256
+Height = 240
+
+# RGB of the 64 colors of the 2C02 PPU, repeated to 256 entries so any byte is a valid index
+Palette = numpy.tile(numpy.array([
+    (84, 84, 84), (0, 30, 116), (8, 16, 144), (48, 0, 136), (68, 0, 100), (92, 0, 48), (84, 4, 0), (60, 24, 0),
+    (32, 42, 0), (8, 58, 0), (0, 64, 0), (0, 60, 0), (0, 50, 60), (0, 0, 0), (0, 0, 0), (0, 0, 0),
+    (152, 150, 152), (8, 76, 196), (48, 50, 236), (92, 30, 228), (136, 20, 176), (160, 20, 100), (152, 34, 32), (120, 60, 0),
+    (84, 90, 0), (40, 114, 0), (8, 124, 0), (0, 118, 40), (0, 102, 120), (0, 0, 0), (0, 0, 0), (0, 0, 0),
+    (236, 238, 236), (76, 154, 236), (120, 124, 236), (176, 98, 236), (228, 84, 236), (236, 88, 180), (236, 106, 100), (212, 136, 32),
+    (160, 170, 0), (116, 196, 0), (76, 208, 32), (56, 204, 108), (56, 180, 204), (60, 60, 60), (0, 0, 0), (0, 0, 0),
+    (236, 238, 236), (168, 204, 236), (188, 188, 236), (212, 178, 236), (236, 174, 236), (236, 174, 212), (236, 180, 176), (228, 196, 144),
+    (204, 210, 120), (180, 222, 120), (168, 226, 144), (152, 226, 180), (160, 214, 228), (160, 162, 160), (0, 0, 0), (0, 0, 0),
+], dtype=numpy.uint8), (4, 1))
+
+
+def Frame():
+    return numpy.zeros((Height, Width), dtype=numpy.uint8)
+
+
+# Draw frame on surface, scaled by the largest whole factor that fits.
+def Present(frame, surface, palette = Palette):
+    scale = min(surface.get_width() // Width, surface.get_height() // Height)
+
+    # Surfaces are indexed [x, y]
+    rgb = palette[frame.T]
+
+    # Each frame pixel as a scale x scale block of the surface. Setting the shape
+    # raises rather than copies, so the writes always land in the surface.
+    pixels = pygame.surfarray.pixels3d(surface)[:Width * scale, :Height * scale]
+    blocks = pixels.view()
+    blocks.shape = (Width, scale, Height, scale, 3)
+
+    blocks[:] = rgb[:, numpy.newaxis, :, numpy.newaxis, :]
@@ -1,80 +1,40 @@
 import pygame
 import numpy
 
-def ReadTile():
-    tile = numpy.zeros((8, 8))
+from cartridge import Cartridge
+from tiles import Tiles
+import mapper
+import screen
 
-    for y in range(0, 8):
-        tmp = int(file.read(1).hex(), 16)
+# Palette indices of colors 0-3, black to white
+Grays = numpy.array([0x0f, 0x00, 0x10, 0x20], dtype=numpy.uint8)
 
-        for x in range(7, -1, -1):
-            if tmp % 2 == 1:
-                tile[y, x] = 1
-
-            tmp >>= 1
-
-    for y in range(0, 8):
-        tmp = int(file.read(1).hex(), 16)
-
-        for x in range(7, -1, -1):
-            if tmp % 2 == 1:
-                if tile[y, x] == 1:
-                    tile[y, x] = 3
-                else:
-                    tile[y, x] = 2
-
-            tmp >>= 1
-
-    return tile
-
-def ReadPatternTabel(screen):
-    for y in range(0, 16):
-        for x in range(0, 16):
-            tile = ReadTile()
-
-            for t_y in range(0, 8):
-                for t_x in range(0, 8):
-                    if tile[t_y, t_x] == 1:
-                        screen[x * 64 + t_x * 8 : x * 64 + t_x * 8 + 8,
-                                y * 64 + t_y * 8 : y * 64 + t_y * 8 + 8, :] = 64
-                    elif tile[t_y, t_x] == 2:
-                        screen[x * 64 + t_x * 8 : x * 64 + t_x * 8 + 8,
-                                y * 64 + t_y * 8 : y * 64 + t_y * 8 + 8, :] = 128
-                    elif tile[t_y, t_x] == 3:
-                        screen[x * 64 + t_x * 8 : x * 64 + t_x * 8 + 8,
-                                y * 64 + t_y * 8 : y * 64 + t_y * 8 + 8, :] = 192
+# Draw the 16x16 tiles of a pattern table (see tiles.py) into a 128x128 part of a frame (see screen.py).
+def ReadPatternTabel(frame, tiles):
+    # (tile row, tile column, y, x) to (y, x) of the whole table
+    frame[:, :] = Grays[tiles.reshape(16, 16, 8, 8).transpose(0, 2, 1, 3).reshape(128, 128)]
 
 pygame.init()
-display = pygame.display.set_mode((1024, 1024))
-
-file = open('super-mario-bros.nes', 'rb')
-file.read(16)
-file.read(32768)
+display = pygame.display.set_mode((screen.Width * 4, screen.Height * 4))
 
-screen1 = numpy.zeros((1024, 1024, 3))
-ReadPatternTabel(screen1)
+# CHR ROM is a view of the mapped file, nothing before it is read
+tiles = Tiles(mapper.Create(Cartridge('super-mario-bros.nes')))
 
-screen2 = numpy.zeros((1024, 1024, 3))
-ReadPatternTabel(screen2)
+# Both pattern tables side by side
+frame = screen.Frame()
+ReadPatternTabel(frame[0:128, 0:128], tiles.Table(0))
+ReadPatternTabel(frame[0:128, 128:256], tiles.Table(1))
 
 running = True
-i = 0
 
 while running:
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
-        
-        if i > 200:
-            i = 0
-        elif i > 100:
-            pygame.surfarray.blit_array(display, screen2)
-        else:
-            pygame.surfarray.blit_array(display, screen1)
 
-        pygame.display.update()
-        i += 1
+    screen.Present(frame, display)
+    pygame.display.update()
 
-        print(i)
+    pygame.time.wait(16)
 
 pygame.quit()
@@ -0,0 +1,75 @@
+"""
+
+This file, roms.py builds the small iNES images the tests run, in memory.
+
+    Program({0x8000: [0xe8, 0x4c, 0x00, 0x80]})     # INX; JMP $8000 on NROM
+    Random(seed)                                    # random instructions
+
+"""
+
+import contextlib
+import io
+import random
+
+from OpCode import OpCode
+from cpu import Cpu
+
+
+def Image(prg, chr = bytes(0x2000), mapper = 0, vertical = False):
+    header = bytes([len(prg) // 0x4000, len(chr) // 0x2000, (mapper & 0x0f) << 4 | vertical, mapper & 0xf0])
+
+    return b'NES\x1a' + header + bytes(8) + bytes(prg) + bytes(chr)
+
+
+# NROM with 32kB PRG holding code, a list of bytes by address, and the NMI, reset and IRQ vectors.
+def Program(code, nmi = 0x8000, reset = 0x8000, irq = 0x8000, chr = bytes(0x2000)):
+    prg = bytearray(0x8000)
+
+    for address, data in code.items():
+        prg[address - 0x8000:address - 0x8000 + len(data)] = bytes(data)
+
+    prg[0x7ffa:] = bytes([nmi & 0xff, nmi >> 8, reset & 0xff, reset >> 8, irq & 0xff, irq >> 8])
+
+    return Image(prg, chr)
+
+
+# (opcode, addressing mode) of every instruction in the dispatch table
+Instructions = [(int(code, 16), mode)
+                for name, codes in vars(OpCode).items() if name.startswith('op_')
+                for code, mode in zip(codes, getattr(OpCode, 'am' + name[2:]))]
+
+# Where random operands point: RAM, the stack, cartridge RAM and ROM
+Memory = [(0x0000, 0x0800), (0x0100, 0x0200), (0x6000, 0x8000), (0x8000, 0x10000)]
+
+
+# NROM filled with random instructions, operands within regions, a list of (first, last) address ranges.
+def Random(seed, regions = Memory):
+    generator = random.Random(seed)
+    prg = bytearray()
+
+    while len(prg) < 0x7ff0:
+        instruction, mode = generator.choice(Instructions)
+        length = OpCode.length[mode]
+        prg.append(instruction)
+
+        if length == 2:
+            # Jumps stay in the program
+            if instruction == 0x4c or instruction == 0x20:
+                address = generator.randrange(0x8000, 0xfff0)
+            else:
+                address = generator.randrange(*generator.choice(regions))
+
+            prg += bytes([address & 0xff, address >> 8])
+        elif length == 1:
+            prg.append(generator.randrange(256))
+
+    prg += bytes(0x8000 - len(prg))
+    prg[0x7ffc:0x7ffe] = b'\x00\x80'
+
+    return Image(prg)
+
+
+# A Cpu without the cartridge description it prints
+def Create(rom, **options):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return Cpu(rom=rom, **options)
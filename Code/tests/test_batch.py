@@ -0,0 +1,28 @@
+import pytest
+
+from batch import Batch
+from roms import Random, Create
+
+
+def Registers(cpu):
+    return cpu._Cpu__A, cpu._Cpu__X, cpu._Cpu__Y, cpu.P, cpu._Cpu__S, cpu._Cpu__PC, cpu.Cycles
+
+
+# Every instance of a batch steps exactly like Cpu
+@pytest.mark.parametrize('seed', range(20))
+def test_batch_matches_interpreter(seed):
+    rom = Random(seed)
+
+    cpu = Create(rom)
+    batch = Batch(3, rom=rom)
+
+    for i in range(1000):
+        cpu.step()
+        batch.step()
+
+        for k in range(batch.Count):
+            assert (batch.A[k], batch.X[k], batch.Y[k], batch.P[k], batch.S[k], batch.PC[k], batch.Cycles[k]) == Registers(cpu)
+
+    for k in range(batch.Count):
+        assert bytes(batch.Memory[k, :0x800]) == bytes(cpu.Bus.Ram)
+        assert bytes(batch.Memory[k, 0x6000:0x8000]) == bytes(cpu.Bus.CartRam)
@@ -0,0 +1,113 @@
+from batch import Batch
+from roms import Program, Create
+
+
+def test_pc_wraps_to_zero():
+    # JMP $FFFE onto two NOPs, which run on into RAM: INX / JMP $0000
+    rom = Program({0x8000: [0x4c, 0xfe, 0xff]}, irq=0xeaea)
+
+    for translate in (False, True):
+        cpu = Create(rom, translate=translate)
+        cpu.Bus.Ram[0:4] = bytes([0xe8, 0x4c, 0x00, 0x00])
+
+        stop = cpu.run(max_instructions=7)
+
+        assert stop.pc == 0x0000
+        assert stop.cycles == 3 + 2 + 2 + (2 + 3) * 2
+
+
+def test_indirect_jumps_stay_in_the_page():
+    # NOP / JMP ($FFFF) takes its low byte from $FFFF and its high byte from $FF00, not $0000
+    rom = Program({0x8000: [0xea, 0x6c, 0xff, 0xff], 0xff00: [0x12]}, irq=0x3400)
+
+    for translate in (False, True):
+        cpu = Create(rom, translate=translate)
+        cpu.Bus.Ram[0] = 0x56
+
+        assert cpu.run(max_instructions=2).pc == 0x1234
+
+    batch = Batch(1, rom=rom)
+    batch.Memory[0, 0] = 0x56
+    batch.run(2)
+
+    assert batch.PC[0] == 0x1234
+
+
+def test_bit():
+    # LDA #$01 / BIT $10 / PHP / LDA #$41 / BIT $10 / PHP / JMP, with $10 = $C0 then $7F
+    rom = Program({0x8000: [0xa9, 0x01, 0x24, 0x10, 0x08, 0xa9, 0x41, 0x24, 0x10, 0x08, 0x4c, 0x0a, 0x80]})
+
+    for memory in (0xc0, 0x7f):
+        results = set()
+
+        for translate in (False, True):
+            cpu = Create(rom, translate=translate)
+            cpu.Bus.Ram[0x10] = memory
+            cpu.run(max_instructions=7)
+            results.add(bytes(cpu.Bus.Ram[0x1fc:0x1fe]))
+
+        batch = Batch(1, rom=rom)
+        batch.Memory[0, 0x10] = memory
+        batch.run(7)
+        results.add(bytes(batch.Memory[0, 0x1fc:0x1fe]))
+
+        # The first BIT's status is pushed first, at $1FD
+        if memory == 0xc0:
+            assert results == {bytes([0xc0 | 0x34, 0xc0 | 0x36])}
+        else:
+            assert results == {bytes([0x40 | 0x34, 0x40 | 0x34])}
+
+
+def test_bit_waits_for_vblank():
+    # BIT $2002 / BPL back / JMP to itself
+    rom = Program({0x8000: [0x2c, 0x02, 0x20, 0x10, 0xfb, 0x4c, 0x05, 0x80]})
+
+    for translate in (False, True):
+        cpu = Create(rom, translate=translate)
+
+        assert cpu.run(until_pc=0x8005, max_cycles=30000).reason == 'pc'
+        assert cpu.Ppu.Frames == 1
+
+
+def test_rotates_go_through_the_carry():
+    rom = Program({0x8000: [
+        0x18, 0xa9, 0x80, 0x2a, 0x2a, 0x85, 0x22,   # CLC / LDA #$80 / ROL A / ROL A / STA $22
+        0x38, 0xa9, 0x09, 0x2a, 0x08,               # SEC / LDA #$09 / ROL A / PHP
+        0x6a, 0x08,                                 # ROR A / PHP
+        0x66, 0x20, 0x26, 0x20, 0x08,               # ROR $20 / ROL $20 / PHP
+        0x85, 0x21, 0x4c, 0x15, 0x80,               # STA $21 / JMP to itself
+    ]})
+
+    results = set()
+
+    for translate in (False, True):
+        cpu = Create(rom, translate=translate)
+        cpu.Bus.Ram[0x20] = 0x02
+        cpu.run(until_pc=0x8015)
+        results.add(bytes(cpu.Bus.Ram[0x1fb:0x1fe]) + bytes(cpu.Bus.Ram[0x20:0x23]))
+
+    batch = Batch(1, rom=rom)
+    batch.Memory[0, 0x20] = 0x02
+    batch.run(15)
+    results.add(bytes(batch.Memory[0, 0x1fb:0x1fe]) + bytes(batch.Memory[0, 0x20:0x23]))
+
+    # $80 rotated twice from C clear is 1; 9 rotated left with C set is $13 and leaves C clear
+    assert results == {bytes([0x35, 0x35, 0x34, 0x02, 0x09, 0x01])}
+
+
+# OAM DMA takes 513 cycles, and one more to line up when the write ends on an odd cycle,
+# the same whether STA $4014 ends a translated block or not
+def test_oam_dma_lines_up_on_even_cycles():
+    lengths = set()
+
+    # LDA $00 or NOP, then LDA #$04 / STA $4014 / INX and JMP to itself
+    for first in ([0xa5, 0x00], [0xea]):
+        rom = Program({0x8000: first + [0xa9, 0x04, 0x8d, 0x14, 0x40, 0xe8, 0x4c, 0x00, 0x90], 0x9000: [0x4c, 0x00, 0x90]})
+        cycles = (3 if len(first) == 2 else 2) + 2 + 4 + 2 + 3
+
+        stops = {Create(rom, translate=translate).run(until_pc=0x9000)[:4] for translate in (False, True)}
+
+        assert len(stops) == 1
+        lengths.add(stops.pop()[2] - cycles)
+
+    assert lengths == {513, 514}
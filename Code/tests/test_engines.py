@@ -0,0 +1,65 @@
+import pytest
+
+from roms import Program, Random, Memory, Create
+
+
+def Run(rom, translate, budgets):
+    cpu = Create(rom, translate=translate)
+    stops = [cpu.run(**budget)[:4] for budget in budgets]
+
+    return stops, cpu.Digest()
+
+
+# Translated blocks must leave the machine exactly as interpreting does
+@pytest.mark.parametrize('seed', range(40))
+def test_translate_matches_interpreter(seed):
+    rom = Random(seed)
+    budgets = [dict(max_instructions=2000), dict(max_cycles=3001), dict(max_instructions=777, max_cycles=5000)]
+
+    assert Run(rom, True, budgets) == Run(rom, False, budgets)
+
+
+# A block cut short by the end of a chunk is interpreted, without translating the rest of it again
+def test_interpreted_blocks_are_not_translated_again():
+    rom = Program({0x8000: [0xe8] * 60 + [0x4c, 0x00, 0x80]})
+
+    cpu = Create(rom, translate=True)
+    reference = Create(rom)
+
+    for i in range(200):
+        assert cpu.run(max_cycles=50)[:4] == reference.run(max_cycles=50)[:4]
+
+    assert cpu.Digest() == reference.Digest()
+    assert [pc for pc, block in cpu._Cpu__Blocks.items() if block] == [0x8000]
+
+
+# Operands reaching the PPU and APU registers as well; the PPU times everything by Cpu.Cycles
+@pytest.mark.parametrize('seed', range(20))
+def test_translate_matches_interpreter_on_io(seed):
+    rom = Random(seed, Memory + [(0x2000, 0x2008), (0x4000, 0x4020)])
+    budgets = [dict(max_instructions=2000), dict(max_cycles=3001), dict(max_instructions=777, max_cycles=5000)]
+
+    assert Run(rom, True, budgets) == Run(rom, False, budgets)
+
+
+# Each access to a PPU register happens at the cycle of its instruction, wherever it is in a block
+def test_io_is_at_the_cycle_of_the_instruction():
+    # 60 x INX, STA $2001, then LDA #$20 / STA $11 / LDY #1 / STA ($10),Y reaching $2001 and INX, JMP back
+    code = [0xe8] * 60 + [0x8d, 0x01, 0x20, 0xa9, 0x20, 0x85, 0x11, 0xa0, 0x01, 0x91, 0x10] + [0xe8] * 4
+    rom = Program({0x8000: code + [0x4c, 0x00, 0x80]})
+    accesses = {}
+
+    for translate in (False, True):
+        cpu = Create(rom, translate=translate)
+        accesses[translate] = []
+        write = cpu.Bus.Writers[0x20]
+
+        def Write(address, value, cpu=cpu, write=write, accesses=accesses[translate]):
+            accesses.append((address, cpu.Cycles))
+            write(address, value)
+
+        cpu.Bus.Map(0x20, 0x40, cpu.Bus.Readers[0x20], Write)
+        cpu.run(max_cycles=2000)
+
+    assert accesses[True] == accesses[False]
+    assert {address for address, cycle in accesses[True]} == {0x2001}
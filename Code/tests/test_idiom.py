@@ -0,0 +1,116 @@
+import random
+
+import pytest
+
+from tracer import RingTrace
+from roms import Image, Program, Create
+
+
+# Random fill and copy loops over RAM, cartridge RAM, ROM and PPU registers (where they must not run at once),
+# counting up or down with X or Y from various starting values, with NMI (INC $05 / RTI) firing in between.
+def Loops(seed):
+    generator = random.Random(seed)
+    prg = bytearray(0x8000)
+    code = [0x58]
+
+    def Address():
+        return generator.choice([0x0200, 0x0300, 0x07f0, 0x0780, 0x1000, 0x6000, 0x7f80, 0x2000,
+                                 0x8000 + generator.randrange(0x7000), generator.randrange(0x800), 0x00f0])
+
+    for i in range(12):
+        register = generator.choice('XY')
+        code += [0xa9, generator.randrange(256)]
+        code += [0xa2 if register == 'X' else 0xa0, generator.choice([0, 1, 0x80, 0xff, generator.randrange(256)])]
+
+        # Moves the loop around in the bank, so it may cross a page
+        if generator.random() < 0.5:
+            code.append(0xea)
+
+        head = len(code)
+        step = {'X': (0xe8, 0xca), 'Y': (0xc8, 0x88)}[register][generator.random() < 0.5]
+
+        if generator.random() < 0.5:
+            target = Address()
+            code += [0x9d if register == 'X' else 0x99, target & 0xff, target >> 8, step]
+        else:
+            source, target = Address(), Address()
+            code += [0xbd if register == 'X' else 0xb9, source & 0xff, source >> 8]
+            code += [0x9d if register == 'X' else 0x99, target & 0xff, target >> 8, step]
+
+        code += [0xd0, (head - len(code) - 2) & 0xff]
+
+    end = 0x8000 + len(code)
+    code += [0x4c, end & 0xff, end >> 8]
+
+    prg[:len(code)] = bytes(code)
+    prg[0x7ff0:0x7ff3] = bytes([0xe6, 0x05, 0x40])
+    prg[0x7ffa:] = bytes([0xf0, 0xff, 0x00, 0x80, 0xf0, 0xff])
+
+    return Image(prg)
+
+
+def Run(seed, translate, trace):
+    cpu = Create(Loops(seed), translate=translate, trace=trace)
+
+    def Frame(cycle):
+        cpu.Nmi()
+        cpu.Events.Add(cycle + 2000 + seed, Frame)
+
+    cpu.Events.Add(1500 + seed * 7, Frame)
+
+    spans = []
+    span = cpu.Bus.Span
+
+    def Count(address, count):
+        spans.append(address)
+        return span(address, count)
+
+    cpu.Bus.Span = Count
+
+    budgets = [dict(max_instructions=1000), dict(max_cycles=5000), dict(max_instructions=5000, max_cycles=20000),
+               dict(max_instructions=3), dict(max_instructions=20000)]
+    stops = [cpu.run(**budget)[:4] for budget in budgets]
+
+    return stops, cpu.Digest(), len(spans)
+
+
+# Loops run at once end with the same instructions, cycles and state as running each pass traced
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('translate', [False, True])
+def test_idioms_are_exact(seed, translate):
+    fast = Run(seed, translate, None)
+    slow = Run(seed, translate, RingTrace())
+
+    assert fast[:2] == slow[:2]
+    assert slow[2] == 0
+
+
+def test_idioms_run():
+    assert sum(Run(seed, False, None)[2] for seed in range(20)) > 20
+
+
+# Counting down from 0, the passes go over X = 0, 255, ... 1, so the last LDA reads $0301
+@pytest.mark.parametrize('translate', [False, True])
+def test_copy_down_from_zero(translate):
+    # LDX #0 / LDA $0300,X / STA $0400,X / DEX / BNE back to the LDA / JMP to itself
+    rom = Program({0x8000: [0xa2, 0x00, 0xbd, 0x00, 0x03, 0x9d, 0x00, 0x04, 0xca, 0xd0, 0xf7, 0x4c, 0x0b, 0x80]})
+    results = []
+
+    for trace in (None, RingTrace()):
+        cpu = Create(rom, translate=translate, trace=trace)
+        cpu.Bus.Ram[0x300:0x400] = bytes(range(0x40, 0x100)) + bytes(range(0x40))
+        spans = []
+        span = cpu.Bus.Span
+
+        def Count(address, count):
+            spans.append(address)
+            return span(address, count)
+
+        cpu.Bus.Span = Count
+
+        assert cpu.run(max_instructions=5000).pc == 0x800b
+        results.append((cpu.snapshot(), len(spans) > 0))
+
+    assert results[0][0] == results[1][0]
+    assert results[0][1] and not results[1][1]
+    assert results[0][0][9] == 0x41
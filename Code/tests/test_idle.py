@@ -0,0 +1,80 @@
+import pytest
+
+from tracer import RingTrace
+from roms import Program, Create
+
+
+# Each waits in a loop until the NMI handler (INC $10 / RTI) or the PPU changes something
+Loops = {
+    # JMP to itself
+    'jump': {0x8000: [0xa9, 0x80, 0x8d, 0x00, 0x20, 0x4c, 0x05, 0x80]},
+    # LDA $10 / BEQ back, then clear $10, count in $12 and wait again
+    'poll': {0x8000: [0xa9, 0x80, 0x8d, 0x00, 0x20,
+                      0xa5, 0x10, 0xf0, 0xfc, 0xa9, 0x00, 0x85, 0x10, 0xe6, 0x12, 0x4c, 0x05, 0x80]},
+    # BIT $2002 / BPL back, count in $12
+    'vblank': {0x8000: [0x2c, 0x02, 0x20, 0x10, 0xfb, 0xe6, 0x12, 0x4c, 0x00, 0x80]},
+    # LDA $2002 / AND #$40 / BEQ back, waiting for the sprite 0 hit that never comes
+    'and': {0x8000: [0xad, 0x02, 0x20, 0x29, 0x40, 0xf0, 0xf9, 0xe6, 0x12, 0x4c, 0x00, 0x80]},
+}
+
+# The last ones end in all sorts of places, e.g. while an interrupt is taken
+Budgets = ([dict(max_cycles=29781 * 5 + 7), dict(max_instructions=12345), dict(max_cycles=100000, max_instructions=50000)] +
+           [dict(max_cycles=997)] * 200 + [dict(max_instructions=333)] * 200)
+
+
+def Run(loop, translate, skip):
+    code = dict(Loops[loop])
+    code[0x8100] = [0xe6, 0x10, 0x40]
+
+    cpu = Create(Program(code, nmi=0x8100), translate=translate, trace=None if skip else RingTrace())
+    cpu.SkipIdle = skip
+
+    reads = []
+    read = cpu.Bus.Readers[0x20]
+
+    def Count(address):
+        reads.append(address)
+        return read(address)
+
+    cpu.Bus.Map(0x20, 0x40, Count, cpu.Bus.Writers[0x20])
+
+    stops = [cpu.run(**budget)[:4] for budget in Budgets]
+
+    return stops, cpu.Digest(), len(reads)
+
+
+# Skipping changes nothing but the time taken: same stops, cycles and state as running every pass traced
+@pytest.mark.parametrize('loop', Loops)
+@pytest.mark.parametrize('translate', [False, True])
+def test_skipping_is_exact(loop, translate):
+    skipped = Run(loop, translate, True)
+    run = Run(loop, translate, False)
+
+    assert skipped[:2] == run[:2]
+
+    # Most of the polling of the PPU was skipped
+    if loop in ('vblank', 'and'):
+        assert skipped[2] < run[2] // 20
+
+
+# A budget ending while an NMI is taken stops after the same instruction either way
+@pytest.mark.parametrize('translate', [False, True])
+def test_budget_ending_in_an_interrupt(translate):
+    # LDA $10 / BEQ back, count in $12; the NMI handler is INC $10 / RTI
+    rom = Program({0x8000: [0xa5, 0x10, 0xf0, 0xfc, 0xa9, 0x00, 0x85, 0x10, 0xe6, 0x12, 0x4c, 0x00, 0x80],
+                   0x8100: [0xe6, 0x10, 0x40]}, nmi=0x8100)
+    results = []
+
+    for skip in (False, True):
+        cpu = Create(rom, translate=translate, trace=None if skip else RingTrace())
+        cpu.SkipIdle = skip
+
+        def Frame(cycle, cpu=cpu):
+            cpu.Nmi()
+            cpu.Events.Add(cycle + 29781, Frame)
+
+        cpu.Events.Add(29781, Frame)
+
+        results.append((cpu.run(max_cycles=29781 * 8 + 5)[:4], cpu.Digest()))
+
+    assert results[0] == results[1]
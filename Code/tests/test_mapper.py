@@ -0,0 +1,153 @@
+import pytest
+
+import mapper
+from cartridge import Cartridge
+from roms import Image, Create
+
+
+Banks = 8
+
+
+# Bank k has a subroutine at $8000 adding k * 3 + 1 to $20 and counting its calls in $30 + k.
+# The last bank, fixed at $C000, switches each other bank in with switch (a list of bytes taking the bank in A)
+# and calls it, then jumps to itself at $C0xx.
+def Build(number, switch):
+    prg = bytearray(Banks * 0x4000)
+
+    for bank in range(Banks - 1):
+        code = [0xa9, bank * 3 + 1, 0x18, 0x65, 0x20, 0x85, 0x20, 0xe6, 0x30 + bank, 0x60]
+        prg[bank * 0x4000:bank * 0x4000 + len(code)] = bytes(code)
+
+    # LDX #0 / TXA / switch / JSR $8000 / INX / CPX #7 / BNE back to TXA / JMP to itself
+    loop = [0x8a] + switch + [0x20, 0x00, 0x80, 0xe8, 0xe0, Banks - 1]
+    code = [0xa2, 0x00] + loop + [0xd0, -(len(loop) + 2) & 0xff]
+    end = 0xc000 + len(code)
+    code += [0x4c, end & 0xff, end >> 8]
+
+    fixed = (Banks - 1) * 0x4000
+    prg[fixed:fixed + len(code)] = bytes(code)
+    prg[-4:-2] = b'\x00\xc0'
+
+    return Image(prg, bytes(4 * 0x2000) if number != 2 else b'', mapper=number), end
+
+
+Boards = {
+    # STA $8000
+    'UxROM': Build(2, [0x8d, 0x00, 0x80]),
+    # The bank one bit at a time: (STA $E000 / LSR A) four times, STA $E000
+    'MMC1': Build(1, [0x8d, 0x00, 0xe0, 0x4a] * 4 + [0x8d, 0x00, 0xe0]),
+}
+
+
+@pytest.mark.parametrize('board', Boards)
+@pytest.mark.parametrize('translate', [False, True])
+def test_bank_switching_runs_each_bank(board, translate):
+    rom, end = Boards[board]
+    cpu = Create(rom, translate=translate)
+
+    assert cpu.run(until_pc=end, max_instructions=10000).reason == 'pc'
+
+    assert bytes(cpu.Bus.Ram[0x30:0x30 + Banks - 1]) == bytes([1] * (Banks - 1))
+    assert cpu.Bus.Ram[0x20] == sum(bank * 3 + 1 for bank in range(Banks - 1))
+    assert cpu.Mapper.PrgBank == [Banks - 2, Banks - 1]
+
+
+@pytest.mark.parametrize('board', Boards)
+def test_snapshots_restore_the_banks(board):
+    rom, end = Boards[board]
+    cpu = Create(rom, translate=True)
+
+    cpu.run(max_instructions=150)
+    snapshot = cpu.snapshot()
+    banks = list(cpu.Mapper.PrgBank)
+    cpu.run(until_pc=end, max_instructions=10000)
+    digest = cpu.Digest()
+
+    cpu.restore(snapshot)
+    assert cpu.Mapper.PrgBank == banks
+
+    cpu.run(until_pc=end, max_instructions=10000)
+    assert cpu.Digest() == digest
+
+
+def Mmc1(rom):
+    return mapper.Create(Cartridge(rom))
+
+
+# Five writes of one bit each, lowest first
+def Serial(board, address, value):
+    for i in range(5):
+        board.Write(address, (value >> i) & 1)
+
+
+def test_mmc1_registers():
+    board = Mmc1(Boards['MMC1'][0])
+
+    # Powers on with the last bank fixed at $C000
+    assert board.PrgBank == [0, Banks - 1]
+
+    # PRG mode 2: first bank fixed at $8000, 4kB CHR banks, vertical mirroring
+    Serial(board, 0x8000, 0x1a)
+    Serial(board, 0xe000, 5)
+    Serial(board, 0xa000, 3)
+    Serial(board, 0xc000, 6)
+
+    assert board.PrgBank == [0, 5]
+    assert board.ChrBank == [3, 6]
+    assert board.Mirroring == 'vertical'
+
+    # 32kB mode ignores the low bit of the bank, 8kB CHR mode that of the CHR bank
+    Serial(board, 0x8000, 0x03)
+
+    assert board.PrgBank == [4, 5]
+    assert board.ChrBank == [2, 3]
+    assert board.Mirroring == 'horizontal'
+
+    # A write with bit 7 resets the shift register and goes back to PRG mode 3
+    board.Write(0x8000, 1)
+    board.Write(0x8000, 0x80)
+
+    assert board.PrgBank == [5, Banks - 1]
+
+    state = board.State()
+    other = Mmc1(Boards['MMC1'][0])
+    other.SetState(state)
+
+    assert (other.PrgBank, other.ChrBank, other.Mirroring) == (board.PrgBank, board.ChrBank, board.Mirroring)
+
+
+def test_uxrom_and_cnrom_registers():
+    board = mapper.Create(Cartridge(Boards['UxROM'][0]))
+    board.Write(0x8000, 3)
+
+    assert board.PrgBank == [3, Banks - 1]
+
+    cnrom = mapper.Create(Cartridge(Image(bytes(0x8000), bytes(4 * 0x2000), mapper=3)))
+    cnrom.Write(0x8000, 2)
+
+    assert cnrom.ChrBank == [4, 5]
+
+
+# On UxROM, bank 0 switches bank 1 in under itself with store, then runs on: INX / INX in bank 0,
+# INY / INY at the same address in bank 1, then JMP $C000 to the fixed bank.
+@pytest.mark.parametrize('store', [
+    [0x8d, 0x00, 0x80],                                 # STA $8000
+    [0x9d, 0x00, 0x80],                                 # STA $8000,X
+    [0xa0, 0x00, 0x91, 0x10],                           # LDY #0 / STA ($10),Y
+])
+@pytest.mark.parametrize('translate', [False, True])
+def test_switching_the_bank_running(store, translate):
+    prg = bytearray(3 * 0x4000)
+
+    # LDA #$80 / STA $11 / LDA #1 / store
+    code = [0xa9, 0x80, 0x85, 0x11, 0xa9, 0x01] + store
+    prg[:len(code) + 5] = bytes(code + [0xe8, 0xe8, 0x4c, 0x00, 0xc0])
+    prg[0x4000 + len(code):0x4000 + len(code) + 5] = bytes([0xc8, 0xc8, 0x4c, 0x00, 0xc0])
+    prg[0x8000:0x8003] = bytes([0x4c, 0x00, 0xc0])
+    prg[-4:-2] = b'\x00\x80'
+
+    cpu = Create(Image(prg, b'', mapper=2), translate=translate)
+
+    assert cpu.run(until_pc=0xc000, max_instructions=100).reason == 'pc'
+    assert cpu.Mapper.PrgBank == [1, 2]
+    assert (cpu._Cpu__X, cpu._Cpu__Y) == (0, 2)
@@ -0,0 +1,37 @@
+from multiprocessing import shared_memory
+
+import pytest
+
+from regress import Job
+from roms import Program
+
+
+# Each job of the report, for a ROM in shared memory like Run() makes
+def Report(rom, events, max_instructions, max_cycles):
+    block = shared_memory.SharedMemory(create=True, size=len(rom))
+
+    try:
+        block.buf[:len(rom)] = rom
+
+        return Job('test.nes', block.name, len(rom), 'script', events, max_instructions, max_cycles, False)
+    finally:
+        block.close()
+        block.unlink()
+
+
+# INX / JMP back, 5 cycles a pass
+Rom = Program({0x8000: [0xe8, 0x4c, 0x00, 0x80]})
+
+
+@pytest.mark.parametrize('at', [100, 100000])
+def test_cycles_hold_over_the_script(at):
+    result = Report(Rom, [(at, 0x10, 1)], 10 ** 6, 1000)
+
+    assert result['reason'] == 'cycles'
+    assert 1000 <= result['cycles'] < 1010
+
+
+def test_script_writes():
+    result = Report(Rom, [(100, 0x10, 1)], 1000, None)
+
+    assert (result['reason'], result['instructions'], result['cycles']) == ('instructions', 1000, 2500)
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from rewind import Rewind
+from roms import Program, Random, Create
+
+
+def Check(rom, translate, seed, step = dict(max_instructions=100)):
+    cpu = Create(rom, translate=translate)
+    rewind = Rewind(cpu, size=8)
+    snapshots = [cpu.snapshot()]
+
+    for i in range(20):
+        cpu.run(**step)
+        rewind.Checkpoint()
+        snapshots.append(cpu.snapshot())
+
+    # Some way past the newest checkpoint
+    cpu.run(max_instructions=37)
+
+    generator = random.Random(seed)
+
+    while len(rewind) > 1:
+        count = generator.randrange(len(rewind))
+        rewind.Back(count)
+        del snapshots[len(snapshots) - count:]
+
+        assert cpu.snapshot() == snapshots[-1]
+
+        cpu.run(max_instructions=5)
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('translate', [False, True])
+def test_back_restores_checkpoints(seed, translate):
+    Check(Random(seed), translate, seed)
+
+
+def test_back_with_the_ppu_running():
+    # NMI on, the handler counts frames in $10
+    rom = Program({0x8000: [0xa9, 0x80, 0x8d, 0x00, 0x20, 0xe8, 0x4c, 0x05, 0x80],
+                   0x8100: [0xe6, 0x10, 0x40]}, nmi=0x8100)
+
+    Check(rom, False, 0, dict(max_cycles=10000))
+
+
+# Writes the pattern tables (CHR RAM) from $1C00 on, then the nametables over and over through $2006 / $2007,
+# one byte a pass, with X as the value and one more for every page
+def test_back_restores_vram():
+    rom = Program({0x8000: [
+        0xa9, 0x1c, 0x85, 0x11,             # LDA #$1C / STA $11
+        0xa5, 0x11, 0x8d, 0x06, 0x20,       # LDA $11 / STA $2006
+        0xa5, 0x10, 0x8d, 0x06, 0x20,       # LDA $10 / STA $2006
+        0x8e, 0x07, 0x20, 0xe8,             # STX $2007 / INX
+        0xe6, 0x10, 0xd0, 0x09,             # INC $10 / BNE to the JMP
+        0xe6, 0x11, 0xe8, 0xa5, 0x11,       # INC $11 / INX / LDA $11
+        0x29, 0x2f, 0x85, 0x11,             # AND #$2F / STA $11
+        0x4c, 0x04, 0x80,
+    ]}, chr=b'')
+
+    # Within CHR RAM, then on over the nametables
+    for cycles in (1000, 10000):
+        for translate in (False, True):
+            Check(rom, translate, 0, dict(max_cycles=cycles))
+
+
+# Checkpoints leave memory to the pages they keep
+def test_checkpoints_leave_out_memory():
+    cpu = Create(Program({0x8000: [0x4c, 0x00, 0x80]}, chr=b''))
+
+    assert len(cpu.snapshot(memory=False)) < 0x200
+
+
+def test_back_too_far():
+    cpu = Create(Random(0))
+    rewind = Rewind(cpu, size=4)
+
+    for i in range(10):
+        cpu.run(max_instructions=10)
+        rewind.Checkpoint()
+
+    assert len(rewind) == 4
+
+    with pytest.raises(ValueError):
+        rewind.Back(4)
@@ -0,0 +1,107 @@
+import pytest
+
+from scheduler import Scheduler, Never
+from roms import Program, Create
+
+
+def test_events_run_in_order():
+    events = Scheduler()
+    calls = []
+
+    events.Add(20, lambda cycle: calls.append(('b', cycle)))
+    events.Add(10, lambda cycle: calls.append(('a', cycle)))
+    events.Add(20, lambda cycle: calls.append(('c', cycle)))
+    cancelled = events.Add(15, lambda cycle: calls.append(('x', cycle)))
+
+    assert events.Next == 10
+
+    events.Cancel(cancelled)
+    events.Run(9)
+    assert calls == [] and events.Next == 10
+
+    # Events added by a callback run as well when they are due
+    events.Add(12, lambda cycle: events.Add(cycle + 1, lambda cycle: calls.append(('d', cycle))))
+    events.Run(25)
+
+    assert calls == [('a', 10), ('d', 13), ('b', 20), ('c', 20)]
+    assert events.Next == Never and len(events) == 0
+
+
+def test_cancel_all():
+    events = Scheduler()
+    calls = []
+
+    def Call(cycle):
+        calls.append(cycle)
+
+    for cycle in (5, 1, 9):
+        events.Add(cycle, Call)
+
+    events.Add(7, None)
+    events.CancelAll(Call)
+
+    assert events.Next == 7 and len(events) == 1
+
+    events.Run(100)
+    assert calls == []
+
+
+# CLI, then INX in a loop; NMI handler INC $10 / RTI, IRQ handler INC $11 / STA $6000 (acknowledge) / RTI
+Handlers = Program({0x8000: [0x58, 0xe8, 0x4c, 0x01, 0x80],
+                    0x8100: [0xe6, 0x10, 0x40],
+                    0x8200: [0xe6, 0x11, 0x8d, 0x00, 0x60, 0x40]}, nmi=0x8100, irq=0x8200)
+
+
+def Machine(translate):
+    cpu = Create(Handlers, translate=translate)
+
+    def Frame(cycle):
+        cpu.Nmi()
+        cpu.Events.Add(cycle + 29781, Frame)
+
+    cpu.Events.Add(29781, Frame)
+
+    # An IRQ held from cycle 1000 until the handler acknowledges it
+    cpu.Events.Add(1000, lambda cycle: cpu.SetIrq(1))
+    write = cpu.Bus.Writers[0x60]
+
+    def Acknowledge(address, value):
+        cpu.SetIrq(1, False)
+        write(address, value)
+
+    cpu.Bus.Writers[0x60] = Acknowledge
+
+    return cpu
+
+
+@pytest.mark.parametrize('translate', [False, True])
+def test_interrupts(translate):
+    cpu = Machine(translate)
+    stop = cpu.run(max_cycles=29781 * 10 + 100)
+
+    assert stop.reason == 'cycles'
+    assert cpu.Bus.Ram[0x10] == 10
+    assert cpu.Bus.Ram[0x11] == 1
+
+
+def test_interrupts_are_taken_at_the_same_instruction():
+    results = []
+
+    for translate in (False, True):
+        cpu = Machine(translate)
+        stops = [cpu.run(max_cycles=12345)[:4] for i in range(30)]
+        results.append((stops, cpu.Digest()))
+
+    assert results[0] == results[1]
+
+
+def test_irq_waits_for_cli():
+    # SEI / LDA #1 / CLI / INX / INX / JMP to itself; the IRQ handler saves X in $12
+    cpu = Create(Program({0x8000: [0x78, 0xa9, 0x01, 0x58, 0xe8, 0xe8, 0x4c, 0x06, 0x80],
+                          0x8200: [0x86, 0x12, 0x4c, 0x02, 0x82]}, irq=0x8200))
+    cpu.SetIrq(1)
+
+    # Taken after the instruction following CLI
+    cpu.run(until_pc=0x8202)
+
+    assert cpu.Bus.Ram[0x12] == 1
@@ -0,0 +1,92 @@
+import pytest
+
+from roms import Program, Random, Create
+
+
+# NMI on: LDA #$80 / STA $2000 / CLI / INX / JMP back to INX; the NMI handler is INC $10 / RTI,
+# the IRQ handler INC $11 / RTI
+Interrupts = Program({0x8000: [0xa9, 0x80, 0x8d, 0x00, 0x20, 0x58, 0xe8, 0x4c, 0x06, 0x80],
+                      0x8100: [0xe6, 0x10, 0x40],
+                      0x8200: [0xe6, 0x11, 0x40]}, nmi=0x8100, irq=0x8200)
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('translate', [False, True])
+def test_restore_continues_the_same(seed, translate):
+    rom = Random(seed)
+    cpu = Create(rom, translate=translate)
+
+    cpu.run(max_instructions=500)
+    snapshot = cpu.snapshot()
+    cpu.run(max_instructions=1000)
+
+    # Into the same machine and into a new one
+    other = Create(rom, translate=not translate)
+
+    for target in (cpu, other):
+        target.restore(snapshot)
+        assert target.snapshot() == snapshot
+
+        target.run(max_instructions=1000)
+        assert target.Digest() == cpu.Digest()
+
+
+def test_restore_with_the_ppu_running():
+    cpu = Create(Interrupts)
+    cpu.run(max_cycles=29781 * 3 + 1234)
+    snapshot = cpu.snapshot()
+    cpu.run(max_cycles=29781 * 2)
+
+    other = Create(Interrupts, translate=True)
+    other.restore(snapshot)
+    other.run(max_cycles=29781 * 2)
+
+    assert other.Digest() == cpu.Digest()
+    assert other.Bus.Ram[0x10] == 5
+
+
+def test_restore_drops_pending_interrupts():
+    cpu = Create(Interrupts)
+    cpu.run(max_instructions=4)
+    snapshot = cpu.snapshot()
+
+    cpu.Nmi()
+    cpu.SetIrq(1)
+    cpu.restore(snapshot)
+    cpu.run(max_instructions=100)
+
+    assert cpu.Bus.Ram[0x10:0x12] == b'\x00\x00'
+
+
+def test_restore_keeps_its_own_interrupts():
+    cpu = Create(Interrupts)
+    cpu.run(max_instructions=4)
+    cpu.Nmi()
+    cpu.SetIrq(1)
+    snapshot = cpu.snapshot()
+
+    other = Create(Interrupts)
+    other.restore(snapshot)
+
+    # NMI first, then the IRQ as I is clear
+    other.run(max_instructions=4)
+
+    assert other.Bus.Ram[0x10:0x12] == b'\x01\x01'
+
+
+def test_restore_rejects_other_snapshots():
+    cpu = Create(Random(0))
+    snapshot = cpu.snapshot()
+
+    with pytest.raises(ValueError):
+        Create(Random(1)).restore(snapshot)
+
+    with pytest.raises(ValueError):
+        cpu.restore(snapshot[:-1])
+
+    with pytest.raises(ValueError):
+        cpu.restore(b'NESS' + snapshot[4:5].replace(bytes([cpu.Version]), bytes([cpu.Version - 1])) + snapshot[5:])
+
+    # The short snapshot left memory alone
+    cpu.restore(cpu.snapshot(memory=False))
+    assert cpu.snapshot() == snapshot
@@ -0,0 +1,60 @@
+"""
+
+This file, tiles.py decodes CHR tiles and keeps them decoded for the renderer.
+
+A tile is 16 bytes, 8 rows of the low bit plane then 8 rows of the high one,
+with the leftmost pixel in bit 7. Decoded, it is an 8x8 uint8 array of colors 0-3.
+
+Tiles keeps the decoded tiles of every 4kB CHR bank the mapper (see mapper.py) has,
+by (bank, tile index), so a bank switch only picks another bank's tiles.
+CHR ROM never changes, and a write to CHR RAM only marks its tile to be decoded again.
+
+    tiles = Tiles(mapper)
+    tiles.Table(0)              # (256, 8, 8) tiles of the pattern table at $0000
+    tiles.Write(0x1234)         # after writing CHR RAM at PPU address $1234
+
+"""
+
+import numpy
+
+
+# Decode every tile of CHR memory (a bank, a pattern table or any bytes-like object) at once
+# into a (tiles, 8, 8) array.
+def ReadTiles(chr):
+    planes = numpy.unpackbits(numpy.frombuffer(chr, dtype=numpy.uint8).reshape(-1, 2, 8, 1), axis=3)
+
+    return planes[:, 0] | (planes[:, 1] << 1)
+
+
+class Tiles:
+    def __init__(self, mapper):
+        self.Mapper = mapper
+
+        # Decoded tiles by bank, None until the bank is first used,
+        # and the tiles of each bank written since they were decoded
+        self.__Decoded = [None] * len(mapper.ChrBanks)
+        self.__Stale = [set() for bank in mapper.ChrBanks]
+
+    # Tiles of the bank in CHR window 0 ($0000) or 1 ($1000).
+    def Table(self, window):
+        bank = self.Mapper.ChrBank[window]
+        tiles = self.__Decoded[bank]
+
+        if tiles is None:
+            tiles = self.__Decoded[bank] = ReadTiles(self.Mapper.ChrBanks[bank])
+            self.__Stale[bank].clear()
+        elif self.__Stale[bank]:
+            stale = sorted(self.__Stale[bank])
+            chr = numpy.frombuffer(self.Mapper.ChrBanks[bank], dtype=numpy.uint8).reshape(256, 16)
+
+            tiles[stale] = ReadTiles(chr[stale])
+            self.__Stale[bank].clear()
+
+        return tiles
+
+    # CHR RAM at PPU address ($0000-$1FFF) was written.
+    def Write(self, address):
+        bank = self.Mapper.ChrBank[(address >> 12) & 1]
+
+        if self.__Decoded[bank] is not None:
+            self.__Stale[bank].add((address >> 4) & 0xff)
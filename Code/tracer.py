@@ -0,0 +1,93 @@
+"""
+
+This file, tracer.py is made for tracing the instructions executed by Cpu.
+
+Pass one of the sinks below as Cpu(trace=...). Without one, Cpu does not trace at all.
+
+(1) RingTrace
+    Keeps the last N instructions in memory.
+    Nothing is formatted until Lines() is called, e.g. after a crash.
+
+(2) FileTrace
+    Writes every instruction to a file (or any object with write()).
+    Records are buffered and formatted in chunks, not one print() per instruction.
+
+A record is (PC, opcode, operand, A, X, Y), taken before the instruction is executed.
+
+"""
+
+from collections import deque
+
+from OpCode import OpCode
+
+
+Mnemonics = ['???'] * 256
+Lengths = [0] * 256
+
+for name, codes in vars(OpCode).items():
+    if name.startswith('op_'):
+        for code, mode in zip(codes, getattr(OpCode, 'am' + name[2:])):
+            Mnemonics[int(code, 16)] = name[3:].upper()
+            Lengths[int(code, 16)] = OpCode.length[mode]
+
+
+def Format(record):
+    pc, instruction, data, a, x, y = record
+
+    if Lengths[instruction] == 2:
+        operand = '%04x' % data
+    elif Lengths[instruction] == 1:
+        operand = '%02x' % data
+    else:
+        operand = ''
+
+    return '%04x  %s : %02x %-4s  A:%02x X:%02x Y:%02x' % (pc, Mnemonics[instruction], instruction, operand, a, x, y)
+
+
+class RingTrace:
+    def __init__(self, size = 1024):
+        self.__Records = deque(maxlen=size)
+
+    def Record(self, pc, instruction, data, a, x, y):
+        self.__Records.append((pc, instruction, data, a, x, y))
+
+    def Lines(self):
+        return [Format(record) for record in self.__Records]
+
+    def Flush(self):
+        pass
+
+    def Close(self):
+        pass
+
+
+class FileTrace:
+    def __init__(self, file, chunk = 4096):
+        if isinstance(file, str):
+            self.__File = open(file, 'w')
+            self.__Owned = True
+        else:
+            self.__File = file
+            self.__Owned = False
+
+        self.__Chunk = chunk
+        self.__Records = []
+
+    def Record(self, pc, instruction, data, a, x, y):
+        self.__Records.append((pc, instruction, data, a, x, y))
+
+        if len(self.__Records) >= self.__Chunk:
+            self.Flush()
+
+    def Flush(self):
+        if self.__Records:
+            self.__File.write('\n'.join(Format(record) for record in self.__Records) + '\n')
+            self.__Records = []
+
+    def Close(self):
+        self.Flush()
+
+        if self.__Owned:
+            self.__File.close()
+        else:
+            self.__File.flush()